@@ -0,0 +1,125 @@
+import os
+import random
+import socket
+import tempfile
+from pathlib import Path
+
+from connections import ConnectionSnapshot
+from logger import log_message
+from reservations import FileLock
+
+# Ports handed out by default: below the Linux (32768+) and Windows (49152+)
+# ephemeral ranges, so the OS does not pick them for outgoing connections.
+# Override with PORTMASTER_PORT_RANGE, e.g. "40000-41000".
+DEFAULT_RANGE = (20000, 32767)
+# Directory of per-port lock files shared by every allocating process
+DEFAULT_LEASE_DIR = Path(os.environ.get('PORTMASTER_LEASE_DIR', Path(tempfile.gettempdir()) / "portmaster-leases"))
+
+
+def default_range():
+    spec = os.environ.get('PORTMASTER_PORT_RANGE')
+    if not spec:
+        return DEFAULT_RANGE
+    start, _, end = spec.partition('-')
+    return int(start), int(end or start)
+
+
+class PortLease:
+    """Ports allocated by allocate_ports, each held by a lock file until released.
+
+    Other allocators skip a leased port, whichever process they run in. The
+    locks belong to this process, so a crashed holder frees its ports.
+    Iterates over the ports; use it as a context manager or call release().
+    """
+
+    def __init__(self, ports, locks):
+        self.ports = ports
+        self._locks = locks
+
+    def __iter__(self):
+        return iter(self.ports)
+
+    def __len__(self):
+        return len(self.ports)
+
+    def __getitem__(self, index):
+        return self.ports[index]
+
+    @property
+    def active(self):
+        return any(lock.locked for lock in self._locks)
+
+    def release(self):
+        for lock in self._locks:
+            lock.release()
+        if self.ports:
+            log_message(f"Released lease on ports {', '.join(map(str, self.ports))}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __repr__(self):
+        return f"PortLease({self.ports})"
+
+
+def _bindable(port, protocol):
+    """True if nothing on this host (including sockets the snapshot cannot see) holds the port"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if protocol == 'TCP' else socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # tolerate TIME_WAIT, as servers do
+        sock.bind(('127.0.0.1', port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def allocate_ports(count=1, port_range=None, protocol='TCP', exclude=(), lease_dir=None, snapshot=None):
+    """Lease ``count`` free ports from ``port_range`` (inclusive start, end) in one call.
+
+    Candidates are checked against a single socket-table snapshot, then
+    each is claimed with a non-blocking lock on ``<lease_dir>/<port>.lock``
+    and confirmed with a bind probe. Scanning starts at a random offset so
+    parallel workers rarely contend for the same lock. Raises RuntimeError
+    if the range cannot supply ``count`` ports; nothing stays leased then.
+    """
+    if count < 1:
+        raise ValueError("Count must be at least 1")
+    if protocol not in ('TCP', 'UDP'):
+        raise ValueError("Protocol must be TCP or UDP")
+    start, end = port_range or default_range()
+    if not 1 <= start <= end <= 65535:
+        raise ValueError(f"Invalid port range {start}-{end}")
+    lease_dir = Path(lease_dir or DEFAULT_LEASE_DIR)
+    lease_dir.mkdir(parents=True, exist_ok=True)
+    if snapshot is None:
+        snapshot = ConnectionSnapshot.capture()
+    exclude = set(exclude)
+
+    ports, locks = [], []
+    size = end - start + 1
+    offset = random.randrange(size)
+    for i in range(size):
+        port = start + (offset + i) % size
+        if port in exclude or snapshot.in_use(port):
+            continue
+        lock = FileLock(lease_dir / f"{port}.lock", blocking=False)
+        try:
+            lock.acquire()
+        except BlockingIOError:
+            continue  # leased by another worker
+        if not _bindable(port, protocol):
+            lock.release()
+            continue
+        ports.append(port)
+        locks.append(lock)
+        if len(ports) == count:
+            log_message(f"Leased {protocol} ports {', '.join(map(str, ports))} from {start}-{end}")
+            return PortLease(ports, locks)
+    for lock in locks:
+        lock.release()
+    raise RuntimeError(f"Only {len(ports)} of {count} free ports available in {start}-{end}")
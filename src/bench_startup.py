@@ -0,0 +1,101 @@
+"""Measure how much time each CLI subcommand spends importing modules.
+
+Each command is run in a fresh interpreter under ``python -X importtime``
+(in-process, with the fake firewall and a throwaway log file). The best of
+``--repeat`` runs is compared against the command's budget, and the run
+fails if a command loads a module it has no use for (ZeroMQ, PyQt) or
+exits with an error (a command that crashes early imports little).
+
+    python bench_startup.py [--repeat N] [--scale F]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+CLI = Path(__file__).resolve().parent / "cli.py"
+
+# name: (arguments, import-time budget in milliseconds)
+COMMANDS = {
+    'help': (['--help'], 60),  # '<command> --help' entries time parsing and the imports it pulls in
+    'check-port': (['check-port', '1'], 150),
+    'check-ports': (['check-ports', '1-1024'], 150),
+    'list': (['list'], 150),
+    'rules': (['rules'], 150),
+    'reconcile': (['reconcile', '--dry-run'], 150),
+    'server-stats': (['server-stats'], 150),
+    'kill-port': (['kill-port', '--help'], 60),
+    'start-server': (['start-server', '--help'], 60),
+    'bench-port': (['bench-port', '--help'], 60),
+    'bench-zmq': (['bench-zmq', '--help'], 60),
+    'sim-zmq': (['sim-zmq', '--help'], 60),
+    'reserve-many': (['reserve-many', '--help'], 60),
+    'save': (['save', '--help'], 60),
+    'gui': (['gui', '--help'], 60),
+}
+# Modules only the zeromq simulation and the GUI need
+FORBIDDEN = ('zmq', 'PyQt6')
+
+
+def import_profile(args, log_file):
+    """Run cli.py once; return (milliseconds spent importing, names of imported modules, exit code)"""
+    env = dict(os.environ, PORTMASTER_LOG_FILE=log_file)
+    cmd = [sys.executable, '-X', 'importtime', str(CLI), '--no-daemon', '--firewall', 'fake'] + args
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    total_us, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name[1:]  # nested imports are indented further
+        modules.add(name.strip())
+        if not name.startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000, modules, result.returncode
+
+
+def run(repeat=3, scale=1.0, commands=None):
+    """Profile every command; return a list of (name, best ms, budget ms, forbidden modules loaded, exit code).
+
+    The exit code is the first non-zero one seen across the runs, else 0.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "bench_log.txt")
+        for name in commands or COMMANDS:
+            args, budget = COMMANDS[name]
+            best, loaded, returncode = None, set(), 0
+            for _ in range(repeat):
+                ms, modules, rc = import_profile(args, log_file)
+                best = ms if best is None else min(best, ms)
+                loaded |= {module for module in modules if module.split('.')[0] in FORBIDDEN}
+                returncode = returncode or rc
+            results.append((name, best, budget * scale, sorted(loaded), returncode))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup import-time benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per command; the fastest counts")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget, e.g. for slow machines")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'Command':<14}{'Imports (ms)':>14}{'Budget (ms)':>14}  Status")
+    for name, ms, budget, loaded, returncode in run(args.repeat, args.scale):
+        status = "ok"
+        if ms > budget:
+            status = "OVER BUDGET"
+        if loaded:
+            status = f"loads {', '.join(loaded)}"
+        if returncode:
+            status = f"exited with {returncode}"
+        failed = failed or status != "ok"
+        print(f"{name:<14}{ms:>14.1f}{budget:>14.0f}  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
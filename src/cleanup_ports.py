@@ -1,47 +1,73 @@
+import os
 import psutil
 import time
-import subprocess # <-- Add this import
-from datetime import datetime
-from core import PortManagerCore
+from core import PortManagerCore, PROJECT_ROOT
+from logger import log_message
 
-def log(message, log_file=r"E:\S.I.M.O.N\thalamus\portmaster\cleanup_log.txt"):
+CLEANUP_LOG_FILE = os.environ.get('PORTMASTER_CLEANUP_LOG', PROJECT_ROOT / "cleanup_log.txt")
+
+def log(message, log_file=CLEANUP_LOG_FILE):
     """Log message to cleanup_log.txt"""
-    with open(log_file, 'a') as f:
-        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    log_message(message, log_file)
+
+def wait_for_time_wait(core, ports, timeout=30, interval=0.5):
+    """Poll until no socket on ``ports`` is in TIME_WAIT; return the ports still lingering at the deadline"""
+    deadline = time.monotonic() + timeout
+    while True:
+        snapshot = core.snapshot()
+        lingering = [port for port in ports
+                     if any(conn.status == psutil.CONN_TIME_WAIT for conn in snapshot.owners(port))]
+        if not lingering or time.monotonic() >= deadline:
+            return lingering
+        time.sleep(interval)
+
+def cleanup_ports(ports=[8081, 8082, 8083, 49152], firewall=None, timeout=5, wait_timeout=30, core=None,
+                  log_file=CLEANUP_LOG_FILE):
+    """Clean up specified ports by terminating processes and clearing firewall rules.
 
-def cleanup_ports(ports=[8081, 8082, 8083, 49152]):
-    """Clean up specified ports by terminating processes and clearing firewall rules"""
-    core = PortManagerCore()
+    Runs on ``core`` if given, otherwise on a new PortManagerCore that logs
+    to ``log_file`` (cleanup_log.txt by default) like the cleanup itself.
+    """
+    if core is None:
+        core = PortManagerCore(firewall=firewall, log_file=log_file)
+    log(f"Starting cleanup for ports {', '.join(map(str, ports))}", log_file)
+
+    # One socket table scan covers every port
+    owners = {}
+    snapshot = core.snapshot()
     for port in ports:
-        log(f"Starting cleanup for port {port}")
-        try:
-            # Terminate processes using the port
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr and conn.laddr.port == port and conn.pid:
-                    try:
-                        process = psutil.Process(conn.pid)
-                        process.terminate()
-                        process.wait(timeout=5)
-                        log(f"Terminated process {conn.pid} using port {port}")
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired) as e:
-                        log(f"Failed to terminate process {conn.pid} using port {port}: {str(e)}")
-            
-            # Clear firewall rules
-            for protocol in ['TCP', 'UDP']:
-                rule_name = f"Portmaster_{protocol}_{port}"
-                cmd = ['netsh', 'advfirewall', 'firewall', 'delete', 'rule', f'name={rule_name}']
-                result = subprocess.run(cmd, capture_output=True, text=True) # This line needs the import
-                if result.returncode == 0 and "Ok" in result.stdout:
-                    log(f"Cleared firewall rule {rule_name}")
-                else:
-                    log(f"No firewall rule {rule_name} found or failed to clear: {result.stderr}")
-            
-            log(f"Cleanup completed for port {port}")
-        except Exception as e:
-            log(f"Cleanup failed for port {port}: {str(e)}")
-    
-    time.sleep(30)  # Allow TIME_WAIT to clear
-    log("Cleanup completed for all ports")
+        for conn in snapshot.owners(port):
+            if conn.pid:
+                owners.setdefault(conn.pid, set()).add(port)
+    if owners:
+        results = core.terminate_processes(owners, timeout=timeout)
+        for pid, (outcome, detail) in results.items():
+            used = ', '.join(map(str, sorted(owners[pid])))
+            if outcome == 'failed':
+                log(f"Failed to terminate process {pid} using port(s) {used}: {detail}", log_file)
+            else:
+                log(f"{outcome.capitalize()} process {pid} using port(s) {used}", log_file)
+
+    # Delete the rules that cover these ports in a single firewall batch;
+    # range rules are split so the ports outside the cleanup stay blocked.
+    try:
+        adds, found = core.clear_plan(ports, refresh=True)
+        if found:
+            ok, error = core.firewall.apply(delete=found, add=adds)
+            if ok:
+                log(f"Cleared firewall rules {', '.join(found)}", log_file)
+            else:
+                log(f"Failed to clear firewall rules {', '.join(found)}: {error}", log_file)
+        else:
+            log("No Portmaster firewall rules found for these ports", log_file)
+    except Exception as e:
+        log(f"Clearing firewall rules failed: {str(e)}", log_file)
+
+    lingering = wait_for_time_wait(core, ports, timeout=wait_timeout)
+    if lingering:
+        log(f"Ports still in TIME_WAIT after {wait_timeout}s: {', '.join(map(str, lingering))}", log_file)
+    log("Cleanup completed for all ports", log_file)
+    return lingering
 
 if __name__ == "__main__":
-    cleanup_ports()
\ No newline at end of file
+    cleanup_ports()
@@ -1,39 +1,123 @@
 import argparse
-from core import PortManagerCore
+import json
+import os
+import socket
+import time
+
+# core (psutil) is imported only when a command runs in-process, and the GUI
+# (PyQt) only for the gui command, so forwarded calls start quickly. The
+# daemon talks over a Unix socket, so it is only loaded where AF_UNIX exists.
+DAEMON_AVAILABLE = hasattr(socket, 'AF_UNIX')
+
+# Commands that always run in this process
+LOCAL_COMMANDS = {'watch', 'daemon', 'gui', 'bench-port', 'bench-zmq', 'sim-zmq'}
 
 def main():
     parser = argparse.ArgumentParser(description="Portmaster CLI")
     parser.add_argument('--yes', '-y', action='store_true', help="Auto-confirm actions")
+    parser.add_argument('--backend', choices=['psutil', 'procnet', 'auto'],
+                        help="Connection enumeration backend (default psutil; procnet reads /proc/net directly on Linux)")
+    parser.add_argument('--firewall', choices=['netsh', 'nftables', 'fake'],
+                        help="Firewall backend (default netsh; fake keeps rules in memory: a dry run)")
+    parser.add_argument('--log-file', help="Log file path (default: port_logs.txt next to core.py)")
+    parser.add_argument('--socket', help="Daemon socket path (default: $PORTMASTER_SOCKET or portmaster.sock next to cli.py)")
+    parser.add_argument('--no-daemon', action='store_true', help="Run in this process even if a daemon is running")
     subparsers = parser.add_subparsers(dest='command', required=True)
 
+    # Graphical interface
+    subparsers.add_parser('gui', help="Open the Portmaster GUI (requires PyQt6)")
+
+    # Resident daemon
+    parser_daemon = subparsers.add_parser('daemon', help="Run a resident daemon that answers CLI calls from warm caches")
+    parser_daemon.add_argument('--snapshot-ttl', type=float, default=1.0, help="Seconds a socket-table scan is reused")
+    parser_daemon.add_argument('--stop', action='store_true', help="Stop the running daemon")
+
     # List connections
-    subparsers.add_parser('list', help="List active network connections")
+    parser_list = subparsers.add_parser('list', help="List active network connections")
+    parser_list.add_argument('--port', type=int, help="Only connections on this local port")
+    parser_list.add_argument('--pid', type=int, help="Only connections owned by this PID")
+    parser_list.add_argument('--proto', choices=['TCP', 'UDP'], help="Only this protocol")
+    parser_list.add_argument('--state', help="Only this state, e.g. LISTEN or ESTABLISHED")
+    parser_list.add_argument('--process', help="Only processes whose name contains this text")
+    parser_list.add_argument('--remote', help="Only this remote host, host:port or :port")
+    parser_list.add_argument('--limit', type=int, help="Stop after this many rows")
+    parser_list.add_argument('--json', action='store_true', help="Print the rows as JSON")
+
+    # Watch connections
+    parser_watch = subparsers.add_parser('watch', help="Stream connection changes as they happen")
+    parser_watch.add_argument('--interval', type=float, default=1.0, help="Seconds between scans")
+    parser_watch.add_argument('--count', type=int, help="Stop after this many scans")
+    parser_watch.add_argument('--json', action='store_true', help="Print one JSON object per event")
 
     # Check port
     parser_check = subparsers.add_parser('check-port', help="Check if a port is in use")
     parser_check.add_argument('port', help="Port number to check")
 
+    # Check many ports at once
+    parser_check_many = subparsers.add_parser('check-ports', help="Check a list or range of ports in one scan")
+    parser_check_many.add_argument('ports', nargs='+', help="Ports and ranges, e.g. 8000-9000,9443")
+    parser_check_many.add_argument('--json', action='store_true', help="Print a JSON map of port to owners")
+
     # Kill process
-    parser_kill = subparsers.add_parser('kill', help="Kill a process by PID")
-    parser_kill.add_argument('pid', help="PID to terminate")
+    parser_kill = subparsers.add_parser('kill', help="Kill one or more processes by PID")
+    parser_kill.add_argument('pid', nargs='+', help="PIDs to terminate")
+    parser_kill_port = subparsers.add_parser('kill-port', help="Kill every process that owns the given ports")
+    parser_kill_port.add_argument('ports', nargs='+', help="Ports and ranges, e.g. 8000-8010 9443")
+    parser_kill_port.add_argument('--timeout', type=float, default=5, help="Seconds to wait before killing stragglers")
 
     # Block port
-    parser_block = subparsers.add_parser('block', help="Block a port using firewall")
-    parser_block.add_argument('port', help="Port number to block")
+    parser_block = subparsers.add_parser('block', help="Block a port, list or range using firewall")
+    parser_block.add_argument('port', help="Port, list or range to block, e.g. 8000-9000,9443")
     parser_block.add_argument('protocol', choices=['TCP', 'UDP'], help="Protocol to block")
 
     # Unblock port
-    parser_unblock = subparsers.add_parser('unblock', help="Unblock a port")
-    parser_unblock.add_argument('port', help="Port number to unblock")
+    parser_unblock = subparsers.add_parser('unblock', help="Unblock a port, list or range")
+    parser_unblock.add_argument('port', help="Port, list or range to unblock")
     parser_unblock.add_argument('protocol', choices=['TCP', 'UDP'], help="Protocol to unblock")
 
+    # Firewall rules
+    parser_rules = subparsers.add_parser('rules', help="List Portmaster firewall rules from one ruleset dump")
+    parser_rules.add_argument('--json', action='store_true', help="Print the rules as JSON")
+    parser_rules.add_argument('--port', type=int, help="Only rules covering this port (range rules included)")
+    parser_reconcile = subparsers.add_parser('reconcile', help="Make firewall allow rules match the reservations")
+    parser_reconcile.add_argument('--dry-run', action='store_true', help="Only print the rules that would change")
+
     # Start server
-    parser_start = subparsers.add_parser('start-server', help="Start a server on a port")
-    parser_start.add_argument('port', help="Port number for server")
+    parser_start = subparsers.add_parser('start-server', help="Start listeners on a port, list or range")
+    parser_start.add_argument('port', help="Port, list or range for the listeners")
     parser_start.add_argument('protocol', choices=['TCP', 'UDP'], help="Protocol for server")
+    parser_start.add_argument('--mode', choices=['sink', 'echo', 'discard'], default='sink',
+                              help="sink reads and counts, echo sends data back, discard drops it")
+    parser_start.add_argument('--workers', type=int, default=1, help="Serve each port from N processes via SO_REUSEPORT")
 
     # Stop server
-    subparsers.add_parser('stop-server', help="Stop the running server")
+    parser_stop = subparsers.add_parser('stop-server', help="Stop listeners (all of them if no port is given)")
+    parser_stop.add_argument('port', nargs='?', help="Port, list or range to stop")
+    parser_stop.add_argument('--protocol', choices=['TCP', 'UDP'], help="Only stop this protocol")
+    parser_bench = subparsers.add_parser('bench-port', help="Load-test a localhost port and report latency percentiles")
+    parser_bench.add_argument('port', help="Port to drive traffic at (on 127.0.0.1)")
+    parser_bench.add_argument('protocol', choices=['TCP', 'UDP'], help="Protocol to use")
+    parser_bench.add_argument('--concurrency', type=int, default=8, help="Parallel connections/senders")
+    parser_bench.add_argument('--payload', type=int, default=64, help="Bytes per request")
+    parser_bench.add_argument('--duration', type=float, default=5.0, help="Seconds to run")
+    parser_bench.add_argument('--no-echo', action='store_true', help="Only send (for sink/discard listeners)")
+    parser_bench.add_argument('--serve', action='store_true', help="Start an echo listener on the port for the run")
+    parser_bench.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser_zmq = subparsers.add_parser('bench-zmq', help="Measure ZeroMQ PUB/SUB throughput over localhost")
+    parser_zmq.add_argument('--port', type=int, help="Port to bind the publisher to (default: a random free port)")
+    parser_zmq.add_argument('--sizes', default="64,1024,16384,131072", help="Comma-separated payload sizes in bytes")
+    parser_zmq.add_argument('--counts', '--count', default="5000", help="Comma-separated messages per size")
+    parser_zmq.add_argument('--hwm', type=int, default=100000, help="Send/receive high-water mark")
+    parser_zmq.add_argument('--batch', type=int, default=1, help="Payloads per multipart message")
+    parser_zmq.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser_sim = subparsers.add_parser('sim-zmq', help="Run the ZeroMQ PUB/SUB check on many ports concurrently")
+    parser_sim.add_argument('ports', help="Port(s) to check, e.g. 5555 or 5555-5560,6000")
+    parser_sim.add_argument('--workers', type=int, default=8, help="Checks to run at once")
+    parser_sim.add_argument('--timeout', type=float, default=2.0, help="Seconds each check may take")
+    parser_sim.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser_stats = subparsers.add_parser('server-stats', help="Show per-listener connection and throughput counters")
+    parser_stats.add_argument('port', nargs='?', type=int, help="Only this port")
+    parser_stats.add_argument('--json', action='store_true', help="Print the counters as JSON")
 
     # Reserve port
     parser_reserve = subparsers.add_parser('reserve', help="Reserve a port for an executable")
@@ -45,23 +129,136 @@ def main():
     parser_release = subparsers.add_parser('release', help="Release a reserved port")
     parser_release.add_argument('port', help="Port number to release")
 
+    # Reserve / release many ports
+    parser_reserve_many = subparsers.add_parser('reserve-many', help="Reserve a list or range of ports in one batch")
+    parser_reserve_many.add_argument('ports', help="Ports and ranges, e.g. 8000-8010,9443")
+    parser_reserve_many.add_argument('protocol', choices=['TCP', 'UDP'], help="Protocol to reserve")
+    parser_reserve_many.add_argument('--exe-path', required=True, help="Path to executable")
+
+    parser_release_many = subparsers.add_parser('release-many', help="Release a list or range of reserved ports in one batch")
+    parser_release_many.add_argument('ports', help="Ports and ranges, e.g. 8000-8010,9443")
+
     # Save connections
     parser_save = subparsers.add_parser('save', help="Save connections to a file")
     parser_save.add_argument('filename', help="Output file path")
+    parser_save.add_argument('--format', choices=['text', 'csv', 'jsonl'], default='text', help="Output format")
 
     args = parser.parse_args()
-    core = PortManagerCore()
+    if args.command == 'gui':
+        from gui import main as run_gui
+        run_gui()
+        return
+
+    if args.command == 'daemon' and not DAEMON_AVAILABLE:
+        print("Error: The daemon needs Unix domain sockets, which this platform lacks")
+        exit(1)
+    if DAEMON_AVAILABLE:
+        from daemon import DEFAULT_SOCKET, DaemonClient, DaemonError, RemoteCore
+        args.socket = args.socket or str(DEFAULT_SOCKET)
+
+    core = None
+    remote = False
+    # Forward to a running daemon unless this call needs its own backends
+    if (DAEMON_AVAILABLE and args.command not in LOCAL_COMMANDS and not args.no_daemon and
+            not (args.backend or args.firewall or args.log_file)):
+        client = DaemonClient.connect(args.socket)
+        if client is not None and not client.alive():
+            client.close()  # stale or wedged daemon: run in this process instead
+            client = None
+        if client is not None:
+            core = RemoteCore(client)
+            remote = True
+            # The daemon resolves paths against its own working directory
+            for name in ('filename', 'exe_path'):
+                if getattr(args, name, None):
+                    setattr(args, name, os.path.abspath(getattr(args, name)))
+    if core is None:
+        from core import PortManagerCore
+        core = PortManagerCore(backend=args.backend, log_file=args.log_file, firewall=args.firewall)
 
-    if args.command == 'list':
-        print(core.list_connections())
+    if not remote:
+        run_command(args, core, remote)
+        return
+    try:
+        run_command(args, core, remote)
+    except DaemonError as e:
+        # Not retried in-process: the daemon may already have carried the command out
+        print(f"Error: Daemon call failed: {str(e)}")
+        exit(1)
+
+def run_command(args, core, remote):
+    """Carry out the parsed command on ``core`` (in-process, or a RemoteCore when ``remote``)"""
+    if args.command == 'daemon':
+        from daemon import DaemonClient, DaemonError, PortmasterDaemon
+        if args.stop:
+            client = DaemonClient.connect(args.socket)
+            if client is None:
+                print("Error: No daemon running")
+                exit(1)
+            try:
+                print(client.call('shutdown'))
+            except DaemonError as e:
+                print(f"Error: {str(e)}")
+                exit(1)
+            exit(0)
+        daemon = PortmasterDaemon(core, args.socket, snapshot_ttl=args.snapshot_ttl)
+        try:
+            daemon.bind()
+        except (RuntimeError, OSError) as e:
+            print(f"Error: {str(e)}")
+            exit(1)
+        print(f"Portmaster daemon listening on {args.socket}", flush=True)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == 'list':
+        rows = core.list_connections(port=args.port, pid=args.pid, protocol=args.proto, state=args.state,
+                                     process=args.process, remote=args.remote, limit=args.limit)
+        if args.json:
+            print(json.dumps(rows))
+        else:
+            print(f"{'Protocol':<10}{'Local Address':<25}{'Remote Address':<25}{'Status':<15}{'PID':<10}Process Name")
+            for row in rows:
+                print(f"{row['Protocol']:<10}{row['Local Address']:<25}{row['Remote Address']:<25}"
+                      f"{row['Status']:<15}{row['PID']:<10}{row['Process Name']}")
+
+    elif args.command == 'watch':
+        markers = {'added': '+', 'removed': '-', 'changed': '~'}
+        try:
+            for event in core.watch(interval=args.interval, count=args.count):
+                if args.json:
+                    print(json.dumps(event), flush=True)
+                    continue
+                status = event['Status']
+                if event['Event'] == 'changed':
+                    status = f"{event['Previous Status']} -> {status}"
+                print(f"{markers[event['Event']]} {event['Protocol']:<4} {event['Local Address']:<25}"
+                      f"{event['Remote Address']:<25}{status:<25}{event['PID']} ({event['Process Name']})", flush=True)
+        except KeyboardInterrupt:
+            pass
 
     elif args.command == 'check-port':
         output, rc = core.check_port(args.port)
         print(output)
         exit(rc)
 
+    elif args.command == 'check-ports':
+        output, rc = core.check_ports(args.ports, as_json=args.json)
+        print(output)
+        exit(rc)
+
     elif args.command == 'kill':
-        output, rc = core.kill_process(args.pid, confirm=args.yes)
+        if len(args.pid) == 1:
+            output, rc = core.kill_process(args.pid[0], confirm=args.yes)
+        else:
+            output, rc = core.kill_processes(args.pid, confirm=args.yes)
+        print(output)
+        exit(rc)
+
+    elif args.command == 'kill-port':
+        output, rc = core.kill_port(args.ports, confirm=args.yes, timeout=args.timeout)
         print(output)
         exit(rc)
 
@@ -75,13 +272,69 @@ def main():
         print(output)
         exit(rc)
 
-    elif args.command == 'start-server':
-        output, rc = core.start_server(args.port, args.protocol, confirm=args.yes)
+    elif args.command == 'rules':
+        output, rc = core.list_firewall_rules(as_json=args.json, port=args.port)
         print(output)
         exit(rc)
 
+    elif args.command == 'reconcile':
+        output, rc = core.reconcile(dry_run=args.dry_run, confirm=args.yes)
+        print(output)
+        exit(rc)
+
+    elif args.command == 'start-server':
+        output, rc = core.start_server(args.port, args.protocol, confirm=args.yes, mode=args.mode, workers=args.workers)
+        print(output, flush=True)
+        if rc == 0 and not remote:
+            # In-process listeners live only as long as this command; serve until Ctrl-C
+            print("Serving; press Ctrl-C to stop", flush=True)
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+            print(core.server_stats()[0])
+            core.stop_server(confirm=True)
+        exit(rc)
+
     elif args.command == 'stop-server':
-        output, rc = core.stop_server(confirm=args.yes)
+        output, rc = core.stop_server(args.port, args.protocol, confirm=args.yes)
+        print(output)
+        exit(rc)
+
+    elif args.command == 'bench-port':
+        output, rc = core.bench_port(args.port, args.protocol, concurrency=args.concurrency, payload=args.payload,
+                                     duration=args.duration, echo=not args.no_echo, serve=args.serve,
+                                     as_json=args.json)
+        print(output)
+        exit(rc)
+
+    elif args.command == 'bench-zmq':
+        from zeromq_sim import benchmark_zeromq_pub_sub, format_benchmark
+        try:
+            sizes = [int(size) for size in args.sizes.split(',')]
+            counts = [int(count) for count in args.counts.split(',')]
+            results = benchmark_zeromq_pub_sub(args.port, sizes=sizes, counts=counts, hwm=args.hwm,
+                                               batch=args.batch)
+        except Exception as e:
+            print(f"Error: ZeroMQ benchmark failed: {str(e)}")
+            exit(1)
+        print(json.dumps(results) if args.json else format_benchmark(results))
+        exit(0)
+
+    elif args.command == 'sim-zmq':
+        from core import parse_ports
+        from zeromq_sim import format_simulations, simulate_many
+        try:
+            results = simulate_many(parse_ports(args.ports), workers=args.workers, timeout=args.timeout)
+        except Exception as e:
+            print(f"Error: ZeroMQ simulation failed: {str(e)}")
+            exit(1)
+        print(json.dumps(results) if args.json else format_simulations(results))
+        exit(1 if any("Error" in r for r in results) else 0)
+
+    elif args.command == 'server-stats':
+        output, rc = core.server_stats(args.port, as_json=args.json)
         print(output)
         exit(rc)
 
@@ -95,8 +348,18 @@ def main():
         print(output)
         exit(rc)
 
+    elif args.command == 'reserve-many':
+        output, rc = core.reserve_many(args.ports, args.protocol, args.exe_path, confirm=args.yes)
+        print(output)
+        exit(rc)
+
+    elif args.command == 'release-many':
+        output, rc = core.release_many(args.ports, confirm=args.yes)
+        print(output)
+        exit(rc)
+
     elif args.command == 'save':
-        output, rc = core.save_connections(args.filename)
+        output, rc = core.save_connections(args.filename, fmt=args.format)
         print(output)
         exit(rc)
 
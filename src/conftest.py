@@ -2,6 +2,18 @@ import pytest
 from unittest.mock import MagicMock, mock_open
 from core import PortManagerCore
 
+@pytest.fixture(autouse=True)
+def log_file(tmp_path, monkeypatch):
+    """Send default log output to the test's tmp_path instead of the tracked port_logs.txt.
+
+    Also exported as PORTMASTER_LOG_FILE, so CLI and helper processes the test
+    starts write there too.
+    """
+    path = tmp_path / "port_logs.txt"
+    monkeypatch.setattr('logger.DEFAULT_LOG_FILE', path)
+    monkeypatch.setenv('PORTMASTER_LOG_FILE', str(path))
+    return path
+
 @pytest.fixture
 def mock_core(mocker):
     """Fixture to create a mocked instance of PortManagerCore."""
@@ -19,4 +31,23 @@ def mock_core(mocker):
     core = PortManagerCore()
     # Mock the internal logger to prevent file I/O
     mocker.patch.object(core, 'log')
-    return core
\ No newline at end of file
+    return core
+
+@pytest.fixture
+def free_ports():
+    """Lease free ports for the test: ``ports = free_ports(3)``.
+
+    Leases are shared with every other process allocating ports, so tests
+    running in parallel workers never get the same port.
+    """
+    from allocator import allocate_ports
+
+    leases = []
+
+    def lease(count=1, protocol='TCP'):
+        leases.append(allocate_ports(count, protocol=protocol))
+        return leases[-1].ports
+
+    yield lease
+    for held in leases:
+        held.release()
@@ -0,0 +1,449 @@
+import os
+import socket
+import psutil
+from collections import OrderedDict, namedtuple
+
+Address = namedtuple('Address', ['ip', 'port'])
+
+# Kernel TCP state codes as they appear in the `st` column of /proc/net/tcp
+TCP_STATES = {
+    '01': psutil.CONN_ESTABLISHED,
+    '02': psutil.CONN_SYN_SENT,
+    '03': psutil.CONN_SYN_RECV,
+    '04': psutil.CONN_FIN_WAIT1,
+    '05': psutil.CONN_FIN_WAIT2,
+    '06': psutil.CONN_TIME_WAIT,
+    '07': psutil.CONN_CLOSE,
+    '08': psutil.CONN_CLOSE_WAIT,
+    '09': psutil.CONN_LAST_ACK,
+    '0A': psutil.CONN_LISTEN,
+    '0B': psutil.CONN_CLOSING,
+}
+
+
+def protocol_of(conn):
+    """Return 'TCP' or 'UDP' for a connection row"""
+    return 'TCP' if conn.type == socket.SOCK_STREAM else 'UDP'
+
+
+class PsutilBackend:
+    """Enumerate connections with psutil.net_connections (all platforms)"""
+    name = 'psutil'
+
+    def connections(self):
+        return psutil.net_connections(kind='inet')
+
+
+class ProcNetConnection:
+    """A /proc/net row shaped like psutil's sconn, with a lazily resolved PID"""
+    __slots__ = ('family', 'type', 'laddr', 'raddr', 'status', 'inode', '_resolver')
+
+    def __init__(self, family, type, laddr, raddr, status, inode, resolver):
+        self.family = family
+        self.type = type
+        self.laddr = laddr
+        self.raddr = raddr
+        self.status = status
+        self.inode = inode
+        self._resolver = resolver
+
+    @property
+    def pid(self):
+        return self._resolver.pid(self.inode)
+
+    def __repr__(self):
+        return f"ProcNetConnection(type={self.type}, laddr={self.laddr}, raddr={self.raddr}, status={self.status!r})"
+
+
+class InodeResolver:
+    """Map socket inodes to PIDs by walking /proc/<pid>/fd on first use.
+
+    The walk stops as soon as every inode of the enumeration has been seen,
+    and never happens at all if nobody asks for a PID.
+    """
+
+    def __init__(self, root='/proc'):
+        self.root = root
+        self.wanted = set()
+        self._pids = None
+
+    def pid(self, inode):
+        if inode == '0':
+            return None
+        if self._pids is None:
+            self._pids = self._walk()
+        return self._pids.get(inode)
+
+    def _walk(self):
+        pids = {}
+        remaining = set(self.wanted)
+        remaining.discard('0')
+        for entry in os.scandir(self.root):
+            if not remaining:
+                break
+            if not entry.name.isdigit():
+                continue
+            fd_dir = os.path.join(entry.path, 'fd')
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue  # process exited or belongs to another user
+            for fd in fds:
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith('socket:['):
+                    inode = target[8:-1]
+                    if inode in remaining:
+                        pids[inode] = int(entry.name)
+                        remaining.discard(inode)
+        return pids
+
+
+def _decode_address(field, family):
+    """Decode a hex ``ADDR:PORT`` field from /proc/net into an Address"""
+    ip_hex, port_hex = field.split(':')
+    raw = bytes.fromhex(ip_hex)
+    # The kernel prints each 32-bit word of the address in host (little-endian) order
+    raw = b''.join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    return Address(socket.inet_ntop(family, raw), int(port_hex, 16))
+
+
+class ProcNetBackend:
+    """Linux fast path that parses /proc/net/{tcp,tcp6,udp,udp6} directly.
+
+    Port-only queries never pay for mapping sockets to processes; the
+    inode to PID walk runs only when a row's ``pid`` is first read.
+    """
+    name = 'procnet'
+    TABLES = (
+        ('tcp', socket.AF_INET, socket.SOCK_STREAM),
+        ('tcp6', socket.AF_INET6, socket.SOCK_STREAM),
+        ('udp', socket.AF_INET, socket.SOCK_DGRAM),
+        ('udp6', socket.AF_INET6, socket.SOCK_DGRAM),
+    )
+
+    def __init__(self, root='/proc'):
+        self.root = root
+
+    @classmethod
+    def available(cls, root='/proc'):
+        return os.path.exists(os.path.join(root, 'net', 'tcp'))
+
+    def connections(self):
+        resolver = InodeResolver(self.root)
+        rows = []
+        for table, family, sock_type in self.TABLES:
+            try:
+                f = open(os.path.join(self.root, 'net', table))
+            except OSError:
+                continue  # e.g. IPv6 disabled
+            with f:
+                next(f, None)  # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10:
+                        continue
+                    laddr = _decode_address(fields[1], family)
+                    raddr = _decode_address(fields[2], family)
+                    if not raddr.port:
+                        raddr = ()
+                    if sock_type == socket.SOCK_STREAM:
+                        status = TCP_STATES.get(fields[3], psutil.CONN_NONE)
+                    else:
+                        status = psutil.CONN_NONE
+                    inode = fields[9]
+                    resolver.wanted.add(inode)
+                    rows.append(ProcNetConnection(family, sock_type, laddr, raddr, status, inode, resolver))
+        return rows
+
+
+BACKENDS = {'psutil': PsutilBackend, 'procnet': ProcNetBackend}
+
+
+def get_backend(name=None):
+    """Return a connection backend by name ('psutil', 'procnet' or 'auto').
+
+    psutil is the default. 'procnet' and 'auto' fall back to psutil when
+    /proc/net is not available.
+    """
+    if name is None or name == 'psutil':
+        return PsutilBackend()
+    if name not in ('auto', 'procnet'):
+        raise ValueError(f"Unknown connection backend: {name}")
+    if ProcNetBackend.available():
+        return ProcNetBackend()
+    return PsutilBackend()
+
+
+class ConnectionSnapshot:
+    """Point-in-time copy of the socket table, indexed for O(1) lookups.
+
+    Build one per scan with ``ConnectionSnapshot.capture()`` and ask it as
+    many port/PID questions as needed instead of re-enumerating the socket
+    table for each one.
+    """
+
+    def __init__(self, connections):
+        self.connections = []
+        self.by_port = {}
+        self.by_state = {}
+        self.listening = set()
+        self._by_pid = None
+        self._keyed = None
+        for conn in connections:
+            if not conn.laddr:
+                continue
+            self.connections.append(conn)
+            port = conn.laddr.port
+            self.by_port.setdefault(port, []).append(conn)
+            self.by_state.setdefault((protocol_of(conn), conn.status), []).append(conn)
+            if conn.status == psutil.CONN_LISTEN:
+                self.listening.add(port)
+
+    @classmethod
+    def capture(cls, backend=None):
+        """Take a snapshot of all inet connections"""
+        return cls((backend or PsutilBackend()).connections())
+
+    @property
+    def by_pid(self):
+        # Built on first use so that backends with lazy PIDs only resolve
+        # them when a caller actually needs them.
+        if self._by_pid is None:
+            self._by_pid = {}
+            for conn in self.connections:
+                self._by_pid.setdefault(conn.pid, []).append(conn)
+        return self._by_pid
+
+    def __len__(self):
+        return len(self.connections)
+
+    def owners(self, port):
+        """Connections whose local port is ``port``"""
+        return self.by_port.get(port, [])
+
+    def in_use(self, port):
+        return port in self.by_port
+
+    def is_listening(self, port):
+        return port in self.listening
+
+    def pid_on_port(self, port, pid):
+        """True if ``pid`` has a socket bound to ``port``"""
+        return any(conn.pid == pid for conn in self.by_port.get(port, ()))
+
+    def for_pid(self, pid):
+        return self.by_pid.get(pid, [])
+
+    def with_state(self, protocol, status):
+        return self.by_state.get((protocol, status), [])
+
+    def select(self, port=None, pid=None, protocol=None, state=None, remote=None):
+        """Connections matching every given filter, in scan order.
+
+        ``port`` is the local port; ``remote`` is "host", "host:port" or
+        ":port". The narrowest index supplies the candidates and the other
+        filters are cheap attribute checks, so nothing is formatted here.
+        """
+        if state is not None:
+            state = state.upper()
+        candidates = [self.connections]
+        if port is not None:
+            candidates.append(self.owners(port))
+        if pid is not None:
+            candidates.append(self.for_pid(pid))
+        if state is not None and protocol is not None:
+            candidates.append(self.with_state(protocol, state))
+        rows = min(candidates, key=len)
+        checks = []
+        if port is not None:
+            checks.append(lambda conn: conn.laddr.port == port)
+        if pid is not None:
+            checks.append(lambda conn: conn.pid == pid)
+        if protocol is not None:
+            checks.append(lambda conn: protocol_of(conn) == protocol)
+        if state is not None:
+            checks.append(lambda conn: conn.status == state)
+        if remote is not None:
+            checks.append(remote_matcher(remote))
+        if not checks:
+            return list(rows)
+        return [conn for conn in rows if all(check(conn) for check in checks)]
+
+    def keyed(self):
+        """Map each connection's key (see connection_key) to the connection"""
+        if self._keyed is None:
+            self._keyed = {connection_key(conn): conn for conn in self.connections}
+        return self._keyed
+
+
+def remote_matcher(spec):
+    """Predicate for a remote filter given as host, host:port, [v6]:port or :port"""
+    host, port = spec, None
+    if spec.startswith('['):
+        host, _, rest = spec[1:].partition(']')
+        port = rest[1:] or None
+    elif spec.count(':') == 1:
+        host, port = spec.split(':')
+    host = host or None
+    port = int(port) if port else None
+
+    def match(conn):
+        if not conn.raddr:
+            return False
+        return (host is None or conn.raddr.ip == host) and (port is None or conn.raddr.port == port)
+    return match
+
+
+class ConnectionRecord:
+    """Compact connection row holding raw fields; addresses are formatted on display"""
+    __slots__ = ('protocol', 'local_ip', 'local_port', 'remote_ip', 'remote_port',
+                 'status', 'pid', 'process_name')
+    FIELDS = ("Protocol", "Local Address", "Remote Address", "Status", "PID", "Process Name")
+
+    def __init__(self, protocol, local_ip, local_port, remote_ip=None, remote_port=None,
+                 status=psutil.CONN_NONE, pid=None, process_name=None):
+        self.protocol = protocol
+        self.local_ip = local_ip
+        self.local_port = local_port
+        self.remote_ip = remote_ip
+        self.remote_port = remote_port
+        self.status = status
+        self.pid = pid
+        self.process_name = process_name
+
+    @classmethod
+    def from_conn(cls, conn, process_name=None):
+        raddr = conn.raddr
+        return cls(protocol_of(conn), conn.laddr.ip, conn.laddr.port,
+                   raddr.ip if raddr else None, raddr.port if raddr else None,
+                   conn.status, conn.pid, process_name)
+
+    @property
+    def local_address(self):
+        return f"{self.local_ip}:{self.local_port}"
+
+    @property
+    def remote_address(self):
+        if self.remote_ip is None:
+            return "N/A"
+        return f"{self.remote_ip}:{self.remote_port}"
+
+    @property
+    def display_status(self):
+        return self.status if self.protocol == 'TCP' else 'N/A'
+
+    def values(self):
+        """Display values in FIELDS order"""
+        return (self.protocol, self.local_address, self.remote_address,
+                self.display_status, self.pid or 0, self.process_name)
+
+    def as_dict(self):
+        """The dict shape returned by PortManagerCore.list_connections"""
+        return dict(zip(self.FIELDS, self.values()))
+
+    def __repr__(self):
+        return f"ConnectionRecord({self.as_dict()!r})"
+
+
+def connection_key(conn):
+    """Hashable identity of a connection: socket type and both endpoints.
+
+    The owning PID is deliberately left out so diffing never forces lazy
+    backends to resolve PIDs.
+    """
+    return (conn.type, conn.laddr.ip, conn.laddr.port, tuple(conn.raddr) if conn.raddr else ())
+
+
+class ConnectionDiff:
+    """Connections added, removed and changed state between two snapshots"""
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed  # list of (previous, current) pairs
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+
+def diff_snapshots(previous, current):
+    """Compare two snapshots by connection key"""
+    before = previous.keyed()
+    after = current.keyed()
+    added = [conn for key, conn in after.items() if key not in before]
+    removed = [conn for key, conn in before.items() if key not in after]
+    changed = [(before[key], conn) for key, conn in after.items()
+               if key in before and before[key].status != conn.status]
+    return ConnectionDiff(added, removed, changed)
+
+
+class ProcessCache:
+    """Bounded LRU of process names keyed by (PID, create time).
+
+    Keying on create time as well as PID means a recycled PID misses the
+    cache instead of reporting the name of the process that used it before.
+    Checking the create time costs a psutil.Process lookup, so callers that
+    pass the snapshot they are working from only pay it once per PID per
+    snapshot: repeat lookups against the same snapshot are answered from
+    memory.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._snapshot = None
+        self._current = {}  # pid -> name, already checked against self._snapshot
+        self.hits = 0
+        self.misses = 0
+
+    def name(self, pid, snapshot=None):
+        """Return the name of ``pid``, or 'N/A' if it cannot be inspected"""
+        if not pid:
+            return "System Idle Process"
+        if snapshot is not None:
+            if snapshot is not self._snapshot:
+                self._snapshot, self._current = snapshot, {}
+            elif pid in self._current:
+                self.hits += 1
+                return self._current[pid]
+        name = self._lookup(pid)
+        if snapshot is not None:
+            self._current[pid] = name
+        return name
+
+    def _lookup(self, pid):
+        try:
+            process = psutil.Process(pid)
+            key = (pid, process.create_time())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            name = process.name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return "N/A"
+        self.misses += 1
+        self._entries[key] = name
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return name
+
+    def names(self, pids, snapshot=None):
+        """Resolve each distinct PID once and return a {pid: name} map"""
+        return {pid: self.name(pid, snapshot) for pid in set(pids)}
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        self._entries.clear()
+        self._snapshot, self._current = None, {}
+        self.hits = 0
+        self.misses = 0
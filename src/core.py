@@ -1,61 +1,184 @@
-import subprocess
 import psutil
 import socket
 import os
 import json
 import time
-import zmq
-from datetime import datetime
 from pathlib import Path
+from export import EXPORT_FORMATS
+from reservations import open_store
+from firewall import RULE_PREFIX, FirewallRule, get_firewall_backend, port_ranges, rule_name
+from logger import get_log_writer, log_message
+from connections import ConnectionRecord, ConnectionSnapshot, ProcessCache, diff_snapshots, get_backend
 
 # Define the root of the project as the directory containing this file.
 PROJECT_ROOT = Path(__file__).resolve().parent
 
+def parse_ports(spec):
+    """Expand a port spec such as "8000-9000,9443" into a sorted list of ports.
+
+    Accepts a string of comma-separated ports and ranges or an iterable of
+    ports/specs. Raises ValueError on malformed or out-of-range entries.
+    """
+    if isinstance(spec, (int, str)):
+        spec = [spec]
+    ports = set()
+    for item in spec:
+        for part in str(item).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                if '-' in part:
+                    start, end = (int(bound) for bound in part.split('-', 1))
+                else:
+                    start = end = int(part)
+            except ValueError:
+                raise ValueError(f"Port must be an integer: {part}") from None
+            if start > end:
+                raise ValueError(f"Invalid port range {part}")
+            if not (1 <= start <= 65535 and 1 <= end <= 65535):
+                raise ValueError(f"Port must be an integer between 1 and 65535: {part}")
+            ports.update(range(start, end + 1))
+    if not ports:
+        raise ValueError("No ports given")
+    return sorted(ports)
+
+def compress_ports(ports):
+    """Collapse sorted ports into the fewest (start, end) runs"""
+    ranges = []
+    for port in ports:
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return [(start, end) for start, end in ranges]
+
+def format_ranges(ranges):
+    """Format (start, end) runs as a port spec, e.g. 8000-9000,9443"""
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
 class PortManagerCore:
-    def __init__(self, config_file=None):
+    def __init__(self, config_file=None, backend=None, log_file=None, firewall=None):
         # If no config file is provided, default to one in the project directory.
         if config_file is None:
             self.config_file = PROJECT_ROOT / "port_reservations.json"
         else:
             self.config_file = Path(config_file) # Handle user-provided paths
+        # JSON by default; a .db/.sqlite config file selects the SQLite store.
+        self.reservations = open_store(self.config_file)
 
-        self.server_socket = None
-        # The log file is now relative to the project directory.
-        self.log_file = PROJECT_ROOT / "port_logs.txt"
+        # Connection enumeration backend: a backend instance or a name
+        # accepted by get_backend ('psutil', 'procnet' or 'auto').
+        self.backend = get_backend(backend) if backend is None or isinstance(backend, str) else backend
+        # Firewall backend: an instance or a name accepted by get_firewall_backend
+        # ('netsh', 'nftables' or 'fake').
+        self.firewall = get_firewall_backend(firewall) if firewall is None or isinstance(firewall, str) else firewall
+        self._server = None  # ServerEngine, created on the first start_server
+        # Process names survive across listings; recycled PIDs are detected
+        # by the cache key, so entries never go stale.
+        self.process_cache = ProcessCache()
+        # Seconds a snapshot may be reused; None rescans on every call. The
+        # daemon sets this so bursts of queries share one scan.
+        self.snapshot_ttl = None
+        self._snapshot = None
+        # Messages are queued and appended in batches by a shared background writer.
+        # The default file is looked up now, not at import, so it can be redirected.
+        self.logger = get_log_writer(log_file)
+        self.log_file = self.logger.path
 
     def log(self, message):
-        """Log message to port_logs.txt"""
-        with open(self.log_file, 'a') as f:
-            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+        """Queue a message for the log file (port_logs.txt by default)"""
+        self.logger.write(message)
 
-    def list_connections(self):
-        """List active network connections as structured data."""
+    def snapshot(self):
+        """Take an indexed snapshot of the current socket table, reusing one younger than snapshot_ttl"""
+        if self.snapshot_ttl and self._snapshot and time.monotonic() - self._snapshot[0] < self.snapshot_ttl:
+            return self._snapshot[1]
+        snapshot = ConnectionSnapshot.capture(self.backend)
+        if self.snapshot_ttl:
+            self._snapshot = (time.monotonic(), snapshot)
+        return snapshot
+
+    def invalidate_snapshot(self):
+        """Drop the reusable snapshot, e.g. after killing processes or binding ports"""
+        self._snapshot = None
+
+    def list_records(self, **filters):
+        """List active network connections as compact ConnectionRecord rows (see iter_records for filters)"""
         try:
-            connections = []
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr:
-                    process_name = "System Idle Process"
-                    if conn.pid:
-                        try:
-                            process_name = psutil.Process(conn.pid).name()
-                        except (psutil.NoSuchProcess, psutil.AccessDenied):
-                            process_name = "N/A"
-                    
-                    conn_data = {
-                        "Protocol": 'TCP' if conn.type == socket.SOCK_STREAM else 'UDP',
-                        "Local Address": f"{conn.laddr.ip}:{conn.laddr.port}",
-                        "Remote Address": f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else "N/A",
-                        "Status": conn.status if conn.type == socket.SOCK_STREAM else 'N/A',
-                        "PID": conn.pid or 0,
-                        "Process Name": process_name
-                    }
-                    connections.append(conn_data)
-            self.log(f"Listed {len(connections)} connections")
-            return connections
+            records = list(self.iter_records(**filters))
+            self.log(f"Listed {len(records)} connections")
+            return records
         except Exception as e:
             self.log(f"List connections failed: {str(e)}")
             raise
 
+    def iter_records(self, port=None, pid=None, protocol=None, state=None, remote=None, process=None, limit=None):
+        """Yield ConnectionRecord rows one at a time, resolving each PID's name once.
+
+        The socket filters (local ``port``, ``pid``, ``protocol``, ``state``,
+        ``remote``) are applied on the raw snapshot, so process names are only
+        looked up for rows that pass them. ``process`` is a case-insensitive
+        substring of the process name; at most ``limit`` rows are produced.
+        """
+        if limit is not None and limit <= 0:
+            return
+        snapshot = self.snapshot()
+        rows = snapshot.select(port=port, pid=pid, protocol=protocol, state=state, remote=remote)
+        wanted = process.lower() if process else None
+        names = {}
+        count = 0
+        for conn in rows:
+            if conn.pid not in names:
+                names[conn.pid] = self.process_cache.name(conn.pid, snapshot)
+            if wanted is not None and wanted not in names[conn.pid].lower():
+                continue
+            yield ConnectionRecord.from_conn(conn, names[conn.pid])
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def list_connections(self, **filters):
+        """List active network connections as structured data."""
+        return [record.as_dict() for record in self.list_records(**filters)]
+
+    def cache_stats(self):
+        """Return hit/miss counters of the process-name cache"""
+        return self.process_cache.stats()
+
+    def watch(self, interval=1.0, count=None):
+        """Yield added/removed/changed connection events, one scan per interval.
+
+        Each event is a dict with an "Event" key ('added', 'removed' or
+        'changed') plus the usual connection fields. Runs until ``count``
+        intervals have passed, or forever if ``count`` is None.
+        """
+        previous = self.snapshot()
+        next_scan = time.monotonic()
+        scans = 0
+        while count is None or scans < count:
+            next_scan += interval
+            time.sleep(max(0.0, next_scan - time.monotonic()))
+            current = self.snapshot()
+            diff = diff_snapshots(previous, current)
+            scans += 1
+            if diff:
+                self.log(f"Watch: {len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed")
+            for conn in diff.added:
+                yield self._event('added', conn, current)
+            for conn in diff.removed:
+                yield self._event('removed', conn, current)
+            for old, new in diff.changed:
+                event = self._event('changed', new, current)
+                event["Previous Status"] = old.status
+                yield event
+            previous = current
+
+    def _event(self, kind, conn, snapshot):
+        event = {"Event": kind}
+        event.update(ConnectionRecord.from_conn(conn, self.process_cache.name(conn.pid, snapshot)).as_dict())
+        return event
+
     def check_port(self, port):
         """Check if a port is in use"""
         try:
@@ -63,10 +186,12 @@ class PortManagerCore:
             if not 1 <= port <= 65535:
                 self.log(f"Invalid port {port}: must be 1-65535")
                 return f"Error: Port must be an integer between 1 and 65535", 1
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr and conn.laddr.port == port:
-                    self.log(f"Port {port} in use by PID {conn.pid}")
-                    return f"Port {port} is in use by PID {conn.pid} ({psutil.Process(conn.pid).name()})", 0
+            snapshot = self.snapshot()
+            owners = snapshot.owners(port)
+            if owners:
+                conn = owners[0]
+                self.log(f"Port {port} in use by PID {conn.pid}")
+                return f"Port {port} is in use by PID {conn.pid} ({self.process_cache.name(conn.pid, snapshot)})", 0
             self.log(f"Port {port} is not in use")
             return f"Port {port} is not in use", 0
         except ValueError:
@@ -76,6 +201,42 @@ class PortManagerCore:
             self.log(f"Check port {port} failed: {str(e)}")
             return f"Error: Failed to check port {port}: {str(e)}", 1
 
+    def port_owners(self, ports):
+        """Map each port to the connections bound to it, answered from a single scan"""
+        snapshot = self.snapshot()
+        owners = {port: snapshot.owners(port) for port in ports}
+        names = self.process_cache.names((conn.pid for conns in owners.values() for conn in conns), snapshot)
+        result = {}
+        for port, conns in owners.items():
+            records = (ConnectionRecord.from_conn(conn, names[conn.pid]) for conn in conns)
+            result[port] = [{"Protocol": r.protocol, "Status": r.display_status,
+                             "PID": r.pid or 0, "Process Name": r.process_name} for r in records]
+        return result
+
+    def check_ports(self, ports, as_json=False):
+        """Check a list or range of ports (e.g. "8000-9000,9443") in one pass"""
+        try:
+            ports = parse_ports(ports)
+        except ValueError as e:
+            self.log(f"Invalid port spec {ports}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        try:
+            owners = self.port_owners(ports)
+            in_use = sum(1 for conns in owners.values() if conns)
+            self.log(f"Checked {len(ports)} ports: {in_use} in use")
+            if as_json:
+                return json.dumps({str(port): conns for port, conns in owners.items()}), 0
+            lines = [f"{'Port':<8}{'State':<8}Owners"]
+            for port, conns in owners.items():
+                owner_text = ", ".join(
+                    f"{c['PID']} ({c['Process Name']}) {c['Protocol']} {c['Status']}" for c in conns)
+                lines.append(f"{port:<8}{'in use' if conns else 'free':<8}{owner_text}".rstrip())
+            lines.append(f"{in_use} of {len(ports)} ports in use")
+            return "\n".join(lines), 0
+        except Exception as e:
+            self.log(f"Check ports failed: {str(e)}")
+            return f"Error: Failed to check ports: {str(e)}", 1
+
     def kill_process(self, pid, confirm=False):
         """Kill a process by PID"""
         try:
@@ -87,162 +248,436 @@ class PortManagerCore:
                 self.log(f"PID {pid} does not exist")
                 return f"Error: PID {pid} does not exist", 1
             if confirm:
-                process = psutil.Process(pid)
-                process.terminate()
-                process.wait(timeout=5)
-                self.log(f"Terminated process {pid} ({process.name()})")
-                return f"Terminated process {pid}", 0
+                outcome, detail = self.terminate_processes([pid])[pid]
+                if outcome == 'terminated':
+                    return f"Terminated process {pid}", 0
+                if outcome == 'killed':
+                    return f"Killed process {pid} (it ignored terminate)", 0
+                return f"Error: Failed to terminate PID {pid}: {detail}", 1
             else:
                 self.log(f"Kill process {pid} requires confirmation")
                 return "Confirmation required (use -y flag or input 'y')", 2
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired) as e:
-            self.log(f"Kill process {pid} failed: {str(e)}")
-            return f"Error: Failed to terminate PID {pid}: {str(e)}", 1
         except ValueError:
             self.log(f"Invalid PID format: {pid}")
             return "Error: PID must be an integer", 1
 
+    def terminate_processes(self, pids, timeout=5, kill_timeout=3):
+        """Terminate every PID at once, wait on them together and kill stragglers.
+
+        Returns {pid: (outcome, detail)} where outcome is 'terminated',
+        'killed' or 'failed'. The whole call takes at most about
+        ``timeout + kill_timeout`` seconds however many PIDs are given.
+        Portmaster's own PID is reported as failed and never signalled.
+        """
+        results, processes = {}, {}
+        names = {}
+        for pid in dict.fromkeys(pids):
+            if pid == os.getpid():
+                # e.g. the daemon, or a listener its ServerEngine serves
+                results[pid] = ('failed', "is Portmaster itself; use stop-server to close its listeners")
+                continue
+            try:
+                process = psutil.Process(pid)
+                try:
+                    names[pid] = process.name()
+                except psutil.AccessDenied:
+                    names[pid] = "N/A"
+                process.terminate()
+                processes[process] = pid
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                results[pid] = ('failed', str(e))
+        gone, alive = psutil.wait_procs(list(processes), timeout=timeout)
+        for process in gone:
+            pid = processes[process]
+            results[pid] = ('terminated', names[pid])
+        stragglers = []
+        for process in alive:
+            try:
+                process.kill()
+                stragglers.append(process)
+            except psutil.NoSuchProcess:
+                stragglers.append(process)  # exited between the wait and the kill
+            except psutil.AccessDenied as e:
+                results[processes[process]] = ('failed', str(e))
+        if stragglers:
+            killed, alive = psutil.wait_procs(stragglers, timeout=kill_timeout)
+            for process in killed:
+                pid = processes[process]
+                results[pid] = ('killed', names[pid])
+            for process in alive:
+                results[processes[process]] = ('failed', f"still running {timeout + kill_timeout}s after terminate")
+        for pid, (outcome, detail) in results.items():
+            if outcome == 'failed':
+                self.log(f"Kill process {pid} failed: {detail}")
+            else:
+                self.log(f"{outcome.capitalize()} process {pid} ({detail})")
+        return results
+
+    def kill_processes(self, pids, confirm=False, timeout=5):
+        """Terminate several PIDs concurrently and report the outcome for each"""
+        try:
+            pids = list(dict.fromkeys(int(pid) for pid in pids))
+        except ValueError:
+            self.log(f"Invalid PID format: {pids}")
+            return "Error: PID must be an integer", 1
+        if not pids:
+            return "Error: No PIDs given", 1
+        if 0 in pids:
+            self.log("Cannot terminate system process (PID 0)")
+            return "Error: Cannot terminate system process or invalid PID", 1
+        if not confirm:
+            self.log(f"Kill processes {', '.join(map(str, pids))} requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        return self._kill_report(self.terminate_processes(pids, timeout=timeout))
+
+    def kill_port(self, ports, confirm=False, timeout=5):
+        """Terminate every process that owns one of ``ports``, resolved from one snapshot"""
+        try:
+            ports = parse_ports(ports)
+        except ValueError as e:
+            self.log(f"Invalid port spec {ports}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        snapshot = self.snapshot()
+        owners = {}
+        for port in ports:
+            for conn in snapshot.owners(port):
+                if conn.pid:
+                    owners.setdefault(conn.pid, set()).add(port)
+        spec = format_ranges(compress_ports(ports))
+        if owners.pop(os.getpid(), None):
+            # e.g. a listener the daemon serves; stop-server closes it without killing us
+            self.log(f"Not terminating Portmaster's own process {os.getpid()} on port(s) {spec}")
+            if not owners:
+                return f"Only Portmaster itself owns port(s) {spec}; use stop-server to close its listeners", 1
+        if not owners:
+            self.log(f"No process owns port(s) {spec}")
+            return f"No process owns port(s) {spec}", 0
+        if not confirm:
+            self.log(f"Kill owners of port(s) {spec} requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        return self._kill_report(self.terminate_processes(owners, timeout=timeout), owners)
+
+    @staticmethod
+    def _kill_report(results, owners=None):
+        lines = []
+        for pid, (outcome, detail) in results.items():
+            ports = f" on port(s) {format_ranges(compress_ports(sorted(owners[pid])))}" if owners else ""
+            lines.append(f"PID {pid}{ports}: {outcome} ({detail})")
+        failed = sum(outcome == 'failed' for outcome, _ in results.values())
+        lines.append(f"{len(results) - failed} of {len(results)} processes stopped")
+        return "\n".join(lines), 1 if failed else 0
+
+    @staticmethod
+    def _describe_ports(protocol, ranges):
+        spec = format_ranges(ranges)
+        if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+            return f"{protocol} port {spec}"
+        return f"{protocol} ports {spec}"
+
+    def _block_rules(self, protocol, ranges):
+        """One block rule per contiguous run of ports"""
+        return [FirewallRule(rule_name(protocol, spec), 'block', protocol, spec)
+                for spec in (format_ranges([run]) for run in ranges)]
+
     def block_port(self, port, protocol, confirm=False):
-        """Block a port using firewall rules"""
+        """Block a port, list or range (e.g. "8000-9000,9443") with the fewest firewall rules"""
+        try:
+            ranges = compress_ports(parse_ports(port))
+        except ValueError as e:
+            self.log(f"Invalid port spec {port}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        if protocol not in ['TCP', 'UDP']:
+            self.log(f"Invalid protocol: {protocol}")
+            return f"Error: Protocol must be TCP or UDP", 1
+        target = self._describe_ports(protocol, ranges)
         try:
-            port = int(port)
-            if not 1 <= port <= 65535:
-                self.log(f"Invalid port {port}: must be 1-65535")
-                return f"Error: Port must be an integer between 1 and 65535", 1
-            if protocol not in ['TCP', 'UDP']:
-                self.log(f"Invalid protocol: {protocol}")
-                return f"Error: Protocol must be TCP or UDP", 1
             if confirm:
-                rule_name = f"Portmaster_{protocol}_{port}"
-                cmd = ['netsh', 'advfirewall', 'firewall', 'add', 'rule', f'name={rule_name}',
-                       'dir=in', 'action=block', f'protocol={protocol}', f'localport={port}']
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode == 0:
-                    self.log(f"Blocked {protocol} port {port}")
-                    return f"Blocked {protocol} port {port}", 0
+                ok, error = self.firewall.apply(add=self._block_rules(protocol, ranges))
+                if ok:
+                    self.log(f"Blocked {target}")
+                    return f"Blocked {target}", 0
                 else:
-                    self.log(f"Failed to block {protocol} port {port}: {result.stderr}")
-                    return f"Error: Failed to block {protocol} port {port}: {result.stderr}", 1
+                    self.log(f"Failed to block {target}: {error}")
+                    return f"Error: Failed to block {target}: {error}", 1
             else:
-                self.log(f"Block {protocol} port {port} requires confirmation")
+                self.log(f"Block {target} requires confirmation")
                 return "Confirmation required (use -y flag or input 'y')", 2
-        except ValueError:
-            self.log(f"Invalid port format: {port}")
-            return "Error: Port must be an integer", 1
         except Exception as e:
-            self.log(f"Block {protocol} port {port} failed: {str(e)}")
-            return f"Error: Failed to block {protocol} port {port}: {str(e)}", 1
+            self.log(f"Block {target} failed: {str(e)}")
+            return f"Error: Failed to block {target}: {str(e)}", 1
+
+    def clear_plan(self, ports, protocols=('TCP', 'UDP'), actions=None, refresh=False):
+        """Plan taking ``ports`` out of the Portmaster rules that cover them.
+
+        Returns ``(add, delete)``: the names of every Portmaster rule for
+        ``protocols`` (and ``actions``, if given) that includes one of the
+        ports, and block rules re-covering the rest of each deleted block
+        range. Apply both in one batch.
+        """
+        wanted = set(ports)
+        adds, deletes = [], []
+        for rule in self.firewall.inventory(refresh=refresh).portmaster_rules():
+            if rule.protocol not in protocols or (actions is not None and rule.action not in actions):
+                continue
+            rule_ports = {p for low, high in port_ranges(rule.ports) for p in range(low, high + 1)}
+            if rule_ports & wanted and rule.name not in deletes:
+                deletes.append(rule.name)
+                if rule.action == 'block':
+                    adds += self._block_rules(rule.protocol, compress_ports(sorted(rule_ports - wanted)))
+        return adds, deletes
 
     def unblock_port(self, port, protocol, confirm=False):
-        """Unblock a port by removing firewall rule"""
+        """Unblock a port, list or range, splitting range rules that are only partly unblocked"""
         try:
-            port = int(port)
-            if not 1 <= port <= 65535:
-                self.log(f"Invalid port {port}: must be 1-65535")
-                return f"Error: Port must be an integer between 1 and 65535", 1
-            if protocol not in ['TCP', 'UDP']:
-                self.log(f"Invalid protocol: {protocol}")
-                return f"Error: Protocol must be TCP or UDP", 1
-            if confirm:
-                rule_name = f"Portmaster_{protocol}_{port}"
-                cmd = ['netsh', 'advfirewall', 'firewall', 'delete', 'rule', f'name={rule_name}']
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode == 0 and "Ok" in result.stdout:
-                    self.log(f"Unblocked {protocol} port {port}")
-                    return f"Unblocked {protocol} port {port}", 0
-                else:
-                    self.log(f"Failed to unblock {protocol} port {port}: {result.stderr}")
-                    return f"Error: Failed to unblock {protocol} port {port}: {result.stderr}", 1
-            else:
-                self.log(f"Unblock {protocol} port {port} requires confirmation")
-                return "Confirmation required (use -y flag or input 'y')", 2
-        except ValueError:
-            self.log(f"Invalid port format: {port}")
-            return "Error: Port must be an integer", 1
+            ports = parse_ports(port)
+        except ValueError as e:
+            self.log(f"Invalid port spec {port}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        if protocol not in ['TCP', 'UDP']:
+            self.log(f"Invalid protocol: {protocol}")
+            return f"Error: Protocol must be TCP or UDP", 1
+        ranges = compress_ports(ports)
+        spec = format_ranges(ranges)
+        target = self._describe_ports(protocol, ranges)
+        if not confirm:
+            self.log(f"Unblock {target} requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        try:
+            if len(ranges) == 1:
+                # Common case: the spec names exactly one existing rule
+                ok, error = self.firewall.apply(delete=[rule_name(protocol, spec)])
+                if ok:
+                    self.log(f"Unblocked {target}")
+                    return f"Unblocked {target}", 0
+            # Otherwise split every block rule that overlaps the spec
+            adds, deletes = self.clear_plan(ports, [protocol], actions=['block'])
+            if not deletes:
+                self.log(f"No Portmaster rule blocks {target}")
+                return f"Error: Failed to unblock {target}: no Portmaster rule blocks it", 1
+            ok, error = self.firewall.apply(delete=deletes, add=adds)
+            if ok:
+                self.log(f"Unblocked {target} ({len(deletes)} rules removed, {len(adds)} re-added)")
+                return f"Unblocked {target}", 0
+            self.log(f"Failed to unblock {target}: {error}")
+            return f"Error: Failed to unblock {target}: {error}", 1
         except Exception as e:
-            self.log(f"Unblock {protocol} port {port} failed: {str(e)}")
-            return f"Error: Failed to unblock {protocol} port {port}: {str(e)}", 1
+            self.log(f"Unblock {target} failed: {str(e)}")
+            return f"Error: Failed to unblock {target}: {str(e)}", 1
+
+    def blocking_rules(self, port, protocol):
+        """Portmaster block rules covering ``port``, including range rules"""
+        return [rule for rule in self.firewall.inventory().for_port(protocol, int(port))
+                if rule.action == 'block' and rule.name.startswith(RULE_PREFIX)]
 
     def check_firewall_rule(self, rule_name):
         """Check if a firewall rule exists"""
         try:
-            cmd = ['netsh', 'advfirewall', 'firewall', 'show', 'rule', f'name={rule_name}']
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-            self.log(f"Checked firewall rule {rule_name}: {'Found' if 'Rule Name' in result.stdout else 'Not found'}")
-            return rule_name in result.stdout and "Rule Name:" in result.stdout
+            found = self.firewall.rule_exists(rule_name)
+            self.log(f"Checked firewall rule {rule_name}: {'Found' if found else 'Not found'}")
+            return found
         except Exception as e:
             self.log(f"Check firewall rule {rule_name} failed: {str(e)}")
             return False
 
-    def start_server(self, port, protocol, confirm=False):
-        """Start a server on a specified port"""
+    def list_firewall_rules(self, as_json=False, port=None):
+        """List Portmaster firewall rules (optionally only those covering ``port``) from a single ruleset dump"""
         try:
-            port = int(port)
-            if not 1 <= port <= 65535:
-                self.log(f"Invalid port {port}: must be 1-65535")
-                return f"Error: Port must be an integer between 1 and 65535", 1
-            if protocol not in ['TCP', 'UDP']:
-                self.log(f"Invalid protocol: {protocol}")
-                return f"Error: Protocol must be TCP or UDP", 1
-            if confirm:
-                if self.bind_and_verify(port, protocol):
-                    self.log(f"Started server on {protocol} port {port}")
-                    return f"Started server on {protocol} port {port}", 0
-                else:
-                    self.log(f"Failed to bind {protocol} port {port}")
-                    return f"Error: Failed to bind {protocol} port {port}", 1
+            inventory = self.firewall.inventory(refresh=True)
+            if port is None:
+                rules = inventory.portmaster_rules()
             else:
-                self.log(f"Start server on {protocol} port {port} requires confirmation")
+                rules = [rule for protocol in ('TCP', 'UDP') for rule in inventory.for_port(protocol, int(port))
+                         if rule.name.startswith(RULE_PREFIX)]
+            self.log(f"Listed {len(rules)} firewall rules")
+            if as_json:
+                return json.dumps([{"Name": r.name, "Action": r.action, "Protocol": r.protocol,
+                                    "Ports": r.ports, "Program": r.program} for r in rules]), 0
+            lines = [f"{'Name':<35}{'Action':<8}{'Protocol':<10}{'Ports':<15}Program"]
+            lines += [f"{r.name:<35}{r.action:<8}{r.protocol:<10}{r.ports:<15}{r.program or ''}".rstrip() for r in rules]
+            return "\n".join(lines), 0
+        except Exception as e:
+            self.log(f"List firewall rules failed: {str(e)}")
+            return f"Error: Failed to list firewall rules: {str(e)}", 1
+
+    def reconcile_plan(self):
+        """Diff the reservations against the installed Portmaster allow rules.
+
+        Returns ``(add, delete)``: the rules missing from the firewall and the
+        names of stale, altered or duplicated rules. Block rules are not touched.
+        """
+        desired = {}
+        for port, entry in self.reservations.load().items():
+            rule = self._allow_rule(entry['protocol'], port, entry['exe_path'])
+            desired[rule.name] = rule
+        installed = {}
+        for rule in self.firewall.inventory(refresh=True).portmaster_rules():
+            if rule.action == 'allow':
+                installed.setdefault(rule.name, []).append(rule)
+
+        def same(rule, wanted):
+            return ((rule.protocol, rule.ports) == (wanted.protocol, wanted.ports) and
+                    (not self.firewall.supports_program or rule.program == wanted.program))
+
+        delete = [name for name, rules in installed.items()
+                  if name not in desired or len(rules) > 1 or not same(rules[0], desired[name])]
+        stale = set(delete)
+        add = [rule for name, rule in desired.items() if name not in installed or name in stale]
+        return add, delete
+
+    def reconcile(self, dry_run=False, confirm=False):
+        """Make the firewall match the reservation store with one batch of adds and deletes"""
+        try:
+            add, delete = self.reconcile_plan()
+            if not add and not delete:
+                self.log("Reconcile: firewall matches reservations")
+                return "Firewall rules match reservations", 0
+            lines = [f"- {name}" for name in sorted(delete)]
+            lines += [f"+ {rule.name} ({' '.join(filter(None, [rule.action, rule.protocol, rule.ports, rule.program]))})"
+                      for rule in sorted(add, key=lambda r: r.name)]
+            summary = f"{len(add)} to add, {len(delete)} to delete"
+            if dry_run:
+                self.log(f"Reconcile dry run: {summary}")
+                return "\n".join(lines + [summary]), 0
+            if not confirm:
+                self.log("Reconcile requires confirmation")
                 return "Confirmation required (use -y flag or input 'y')", 2
-        except ValueError:
-            self.log(f"Invalid port format: {port}")
-            return "Error: Port must be an integer", 1
+            ok, error = self.firewall.apply(add=add, delete=delete)
+            if not ok:
+                self.log(f"Reconcile failed: {error}")
+                return f"Error: Failed to reconcile firewall rules: {error}", 1
+            self.log(f"Reconciled firewall rules: {len(add)} added, {len(delete)} deleted")
+            return "\n".join(lines + [f"Reconciled: {len(add)} added, {len(delete)} deleted"]), 0
         except Exception as e:
-            self.log(f"Start server on {protocol} port {port} failed: {str(e)}")
-            return f"Error: Failed to start server on {protocol} port {port}: {str(e)}", 1
+            self.log(f"Reconcile failed: {str(e)}")
+            return f"Error: Failed to reconcile firewall rules: {str(e)}", 1
 
-    def stop_server(self, confirm=False):
-        """Stop the running server"""
+    @property
+    def server(self):
+        """The ServerEngine running this core's listeners"""
+        if self._server is None:
+            from server import ServerEngine
+            self._server = ServerEngine()
+        return self._server
+
+    def start_server(self, port, protocol, confirm=False, mode='sink', workers=1):
+        """Start listeners on a port, list or range; mode is echo, sink or discard"""
+        try:
+            ports = parse_ports(port)
+        except ValueError as e:
+            self.log(f"Invalid port spec {port}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        if protocol not in ['TCP', 'UDP']:
+            self.log(f"Invalid protocol: {protocol}")
+            return f"Error: Protocol must be TCP or UDP", 1
+        target = self._describe_ports(protocol, compress_ports(ports))
+        if not confirm:
+            self.log(f"Start server on {target} requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        started = []
+        try:
+            for p in ports:
+                started.append(self.server.start(p, protocol, mode=mode, workers=int(workers)))
+            self.invalidate_snapshot()
+            snapshot = self.snapshot()
+            missing = [l.port for l in started if not snapshot.pid_on_port(l.port, os.getpid())]
+            if missing:
+                raise OSError(f"port {format_ranges(compress_ports(missing))} not bound by this process")
+        except Exception as e:
+            for listener in started:
+                self.server.stop(listener.port, protocol)
+            self.log(f"Start server on {target} failed: {str(e)}")
+            return f"Error: Failed to start server on {target}: {str(e)}", 1
+        detail = f"{mode}" + (f", {workers} workers" if int(workers) > 1 else "")
+        self.log(f"Started server on {target} ({detail})")
+        return f"Started server on {target} ({detail})", 0
+
+    def stop_server(self, port=None, protocol=None, confirm=False):
+        """Stop the listeners on ``port`` (every listener if no port is given)"""
         if not confirm:
             self.log("Stop server requires confirmation")
             return "Confirmation required (use -y flag or input 'y')", 2
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-                self.server_socket = None
-                self.log("Stopped server")
-                return "Stopped server", 0
-            except Exception as e:
-                self.log(f"Stop server failed: {str(e)}")
-                return f"Error: Failed to stop server: {str(e)}", 1
-        else:
+        try:
+            ports = None if port is None else parse_ports(port)
+        except ValueError as e:
+            return f"Error: {str(e)}", 1
+        if self._server is None or not self._server.listeners:
             self.log("No server running")
             return "Error: No server running", 1
+        try:
+            stopped = []
+            for p in ports or [None]:
+                stopped += self.server.stop(p, protocol)
+        except Exception as e:
+            self.log(f"Stop server failed: {str(e)}")
+            return f"Error: Failed to stop server: {str(e)}", 1
+        if not stopped:
+            self.log(f"No server running on port {port}")
+            return f"Error: No server running on port {port}", 1
+        names = ", ".join(f"{l.protocol} {l.port}" for l in stopped)
+        self.log(f"Stopped server on {names}")
+        return f"Stopped server on {names}", 0
+
+    def server_stats(self, port=None, as_json=False):
+        """Per-listener connection and throughput counters"""
+        stats = self._server.stats(port) if self._server is not None else []
+        if as_json:
+            return json.dumps(stats), 0
+        if not stats:
+            return "No server running", 0
+        lines = [f"{'Port':<8}{'Proto':<7}{'Mode':<9}{'Workers':<9}{'Conns':<8}{'Active':<8}"
+                 f"{'Datagrams':<11}{'Bytes In':<14}{'Bytes Out':<14}MB/s In"]
+        lines += [f"{s['Port']:<8}{s['Protocol']:<7}{s['Mode']:<9}{s['Workers']:<9}{s['Connections']:<8}{s['Active']:<8}"
+                  f"{s['Datagrams']:<11}{s['Bytes In']:<14}{s['Bytes Out']:<14}{s['MB/s In']}" for s in stats]
+        return "\n".join(lines), 0
+
+    def bench_port(self, port, protocol='TCP', concurrency=8, payload=64, duration=5.0, echo=True, serve=False,
+                   as_json=False):
+        """Load-test a local port and report throughput and p50/p95/p99 connect/round-trip latency.
+
+        With ``serve`` an echo listener is started on the port for the run.
+        """
+        from loadgen import run_load
+        try:
+            port = int(port)
+            if not 1 <= port <= 65535:
+                return "Error: Port must be an integer between 1 and 65535", 1
+        except ValueError:
+            return "Error: Port must be an integer", 1
+        try:
+            if serve:
+                self.server.start(port, protocol, mode='echo', host='127.0.0.1')
+            try:
+                result = run_load(port, protocol, concurrency=int(concurrency), payload=int(payload),
+                                  duration=float(duration), echo=echo)
+            finally:
+                if serve:
+                    self.server.stop(port, protocol)
+        except (OSError, ValueError) as e:
+            self.log(f"Benchmark of {protocol} port {port} failed: {str(e)}")
+            return f"Error: Failed to benchmark {protocol} port {port}: {str(e)}", 1
+        summary = result.summary()
+        self.log(f"Benchmarked {protocol} port {port}: {summary['Requests/s']} req/s, "
+                 f"RTT p99 {summary['RTT p99']} ms, {summary['Errors']} errors")
+        if as_json:
+            return json.dumps(summary), 0
+
+        def ms(value):
+            return "-" if value is None else f"{value:.3f}"
+        lines = [
+            f"{protocol} port {port}: {summary['Concurrency']} workers, {summary['Payload']} byte payload, "
+            f"{summary['Duration']}s",
+            f"Requests: {summary['Requests']} ({summary['Requests/s']}/s, {summary['MB/s']} MB/s), "
+            f"errors: {summary['Errors']}, lost: {summary['Lost']}",
+            f"{'Latency (ms)':<14}{'p50':>10}{'p95':>10}{'p99':>10}",
+        ]
+        if protocol == 'TCP':
+            lines.append(f"{'Connect':<14}" + "".join(f"{ms(summary[f'Connect p{p}']):>10}" for p in (50, 95, 99)))
+        lines.append(f"{'Round trip':<14}" + "".join(f"{ms(summary[f'RTT p{p}']):>10}" for p in (50, 95, 99)))
+        return "\n".join(lines), 0
 
     def bind_and_verify(self, port, protocol):
         """Bind a port and verify it's bound"""
-        try:
-            if protocol == 'TCP':
-                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.server_socket.bind(('0.0.0.0', port))
-                self.server_socket.listen(1)
-            else:  # UDP
-                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.server_socket.bind(('0.0.0.0', port))
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr and conn.laddr.port == port and conn.pid == os.getpid():
-                    return True
-            self.server_socket.close()
-            self.server_socket = None
-            return False
-        except Exception as e:
-            self.log(f"Bind and verify {protocol} port {port} failed: {str(e)}")
-            if self.server_socket:
-                self.server_socket.close()
-                self.server_socket = None
-            return False
+        return self.start_server(port, protocol, confirm=True)[1] == 0
 
     def reserve_port(self, port, protocol, exe_path, confirm=False):
         """Reserve a port for a specific executable"""
@@ -258,21 +693,12 @@ class PortManagerCore:
                 self.log(f"Executable path {exe_path} does not exist")
                 return f"Error: Executable path {exe_path} does not exist", 1
             if confirm:
-                rule_name = f"Portmaster_{protocol}_{port}"
-                cmd = ['netsh', 'advfirewall', 'firewall', 'add', 'rule', f'name={rule_name}',
-                       'dir=in', 'action=allow', f'protocol={protocol}', f'localport={port}',
-                       f'program={exe_path}']
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode != 0:
-                    self.log(f"Failed to reserve {protocol} port {port}: {result.stderr}")
-                    return f"Error: Failed to reserve {protocol} port {port}: {result.stderr}", 1
-                config = {}
-                if os.path.exists(self.config_file):
-                    with open(self.config_file, 'r') as f:
-                        config = json.load(f)
-                config[str(port)] = {'protocol': protocol, 'exe_path': exe_path}
-                with open(self.config_file, 'w') as f:
-                    json.dump(config, f)
+                ok, error = self.firewall.apply(add=[self._allow_rule(protocol, port, exe_path)])
+                if not ok:
+                    self.log(f"Failed to reserve {protocol} port {port}: {error}")
+                    return f"Error: Failed to reserve {protocol} port {port}: {error}", 1
+                with self.reservations.transaction() as config:
+                    config[str(port)] = {'protocol': protocol, 'exe_path': exe_path}
                 self.log(f"Reserved {protocol} port {port} for {exe_path}")
                 return f"Reserved {protocol} port {port}", 0
             else:
@@ -293,23 +719,17 @@ class PortManagerCore:
                 self.log(f"Invalid port {port}: must be 1-65535")
                 return f"Error: Port must be an integer between 1 and 65535", 1
             if confirm:
-                config = {}
-                if os.path.exists(self.config_file):
-                    with open(self.config_file, 'r') as f:
-                        config = json.load(f)
-                if str(port) not in config:
+                reservation = self.reservations.get(port)
+                if reservation is None:
                     self.log(f"Port {port} is not reserved")
                     return f"Error: Port {port} is not reserved", 1
-                protocol = config[str(port)]['protocol']
-                rule_name = f"Portmaster_{protocol}_{port}"
-                cmd = ['netsh', 'advfirewall', 'firewall', 'delete', 'rule', f'name={rule_name}']
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode != 0:
-                    self.log(f"Failed to release {protocol} port {port}: {result.stderr}")
-                    return f"Error: Failed to release {protocol} port {port}: {result.stderr}", 1
-                del config[str(port)]
-                with open(self.config_file, 'w') as f:
-                    json.dump(config, f)
+                protocol = reservation['protocol']
+                ok, error = self.firewall.apply(delete=[rule_name(protocol, port)])
+                if not ok:
+                    self.log(f"Failed to release {protocol} port {port}: {error}")
+                    return f"Error: Failed to release {protocol} port {port}: {error}", 1
+                with self.reservations.transaction() as config:
+                    config.pop(str(port), None)
                 self.log(f"Released {protocol} port {port}")
                 return f"Released {protocol} port {port}", 0
             else:
@@ -322,26 +742,100 @@ class PortManagerCore:
             self.log(f"Release port {port} failed: {str(e)}")
             return f"Error: Failed to release port {port}: {str(e)}", 1
 
-    def save_connections(self, filename):
-        """Save connections to a file"""
+    @staticmethod
+    def _allow_rule(protocol, port, exe_path):
+        return FirewallRule(rule_name(protocol, port), 'allow', protocol, port, exe_path)
+
+    def reserve_many(self, ports, protocol, exe_path, confirm=False):
+        """Reserve a list or range of ports for one executable with a single firewall batch.
+
+        Everything is validated before anything is changed. If the firewall
+        batch or the config write fails, the rules that were added are
+        removed again and the config is left untouched.
+        """
         try:
-            connections_data = self.list_connections()
-            count = len(connections_data)
-            
-            header = f"{'Protocol':<10}{'Local Address':<25}{'Remote Address':<25}{'Status':<15}{'PID':<10}{'Process Name'}\n"
-            divider = "=" * 120 + "\n"
-            
-            content = ""
-            for conn in connections_data:
-                content += f"{conn['Protocol']:<10}{conn['Local Address']:<25}{conn['Remote Address']:<25}{conn['Status']:<15}{conn['PID']:<10}{conn['Process Name']}\n"
+            ports = parse_ports(ports)
+        except ValueError as e:
+            self.log(f"Invalid port spec {ports}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        if protocol not in ['TCP', 'UDP']:
+            self.log(f"Invalid protocol: {protocol}")
+            return f"Error: Protocol must be TCP or UDP", 1
+        if not os.path.exists(exe_path):
+            self.log(f"Executable path {exe_path} does not exist")
+            return f"Error: Executable path {exe_path} does not exist", 1
+        reserved = [port for port in ports if port in self.reservations]
+        if reserved:
+            self.log(f"Reserve many: ports already reserved: {reserved}")
+            return f"Error: Ports already reserved: {', '.join(map(str, reserved))}", 1
+        if not confirm:
+            self.log(f"Reserve {len(ports)} {protocol} ports requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        ok = False
+        try:
+            ok, error = self.firewall.apply(add=[self._allow_rule(protocol, port, exe_path) for port in ports])
+            if not ok:
+                raise RuntimeError(error)
+            with self.reservations.transaction() as config:
+                for port in ports:
+                    config[str(port)] = {'protocol': protocol, 'exe_path': exe_path}
+        except Exception as e:
+            if ok or not self.firewall.atomic:
+                self.firewall.apply(delete=[rule_name(protocol, port) for port in ports])
+            self.log(f"Reserve {len(ports)} {protocol} ports failed, rolled back: {str(e)}")
+            return f"Error: Failed to reserve {len(ports)} {protocol} ports (rolled back): {str(e)}", 1
+        self.log(f"Reserved {len(ports)} {protocol} ports for {exe_path}")
+        return f"Reserved {len(ports)} {protocol} ports", 0
 
+    def release_many(self, ports, confirm=False):
+        """Release a list or range of reserved ports with a single firewall batch.
+
+        On failure the released rules are re-created and the config is left
+        untouched.
+        """
+        try:
+            ports = parse_ports(ports)
+        except ValueError as e:
+            self.log(f"Invalid port spec {ports}: {str(e)}")
+            return f"Error: {str(e)}", 1
+        reservations = {port: self.reservations.get(port) for port in ports}
+        missing = [port for port, entry in reservations.items() if entry is None]
+        if missing:
+            self.log(f"Release many: ports not reserved: {missing}")
+            return f"Error: Ports not reserved: {', '.join(map(str, missing))}", 1
+        if not confirm:
+            self.log(f"Release {len(ports)} ports requires confirmation")
+            return "Confirmation required (use -y flag or input 'y')", 2
+        deletes = [rule_name(entry['protocol'], port) for port, entry in reservations.items()]
+        restore = [self._allow_rule(entry['protocol'], port, entry['exe_path']) for port, entry in reservations.items()]
+        ok = False
+        try:
+            ok, error = self.firewall.apply(delete=deletes)
+            if not ok:
+                raise RuntimeError(error)
+            with self.reservations.transaction() as config:
+                for port in ports:
+                    config.pop(str(port), None)
+        except Exception as e:
+            if ok:
+                self.firewall.apply(add=restore)
+            elif not self.firewall.atomic:
+                # Delete whatever is left, then re-add everything: the rules end up
+                # exactly as they were before, whichever deletes succeeded.
+                self.firewall.apply(delete=deletes, add=restore)
+            self.log(f"Release {len(ports)} ports failed, rolled back: {str(e)}")
+            return f"Error: Failed to release {len(ports)} ports (rolled back): {str(e)}", 1
+        self.log(f"Released {len(ports)} ports")
+        return f"Released {len(ports)} ports", 0
+
+    def save_connections(self, filename, fmt='text'):
+        """Save connections to a file as text, csv or jsonl, streaming rows as they are enumerated"""
+        if fmt not in EXPORT_FORMATS:
+            self.log(f"Invalid export format: {fmt}")
+            return f"Error: Format must be one of {', '.join(EXPORT_FORMATS)}", 1
+        try:
             with open(filename, 'w') as f:
-                f.write("Portmaster Network Connections\n")
-                f.write(divider)
-                f.write(header)
-                f.write(divider)
-                f.write(content)
-                
+                count = EXPORT_FORMATS[fmt](f).export(self.iter_records())
             self.log(f"Saved {count} connections to {filename}")
             return f"Saved {count} connections to {filename}", 0
         except Exception as e:
@@ -352,90 +846,38 @@ def find_free_port():
     """
     Find and return a free port and its socket to prevent TIME_WAIT issues.
     Caller is responsible for closing the socket after use.
+
+    The port is only protected while that socket is open; parallel workers
+    that need ports which stay theirs until they are done should use
+    allocator.allocate_ports, which leases them across processes.
     """
-    log_file = PROJECT_ROOT / "port_logs.txt"
     max_attempts = 5
+    # One scan serves every attempt; a freshly assigned ephemeral port only
+    # needs checking against sockets that already existed.
+    snapshot = ConnectionSnapshot.capture()
     for attempt in range(max_attempts):
+        s = None
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             s.bind(('127.0.0.1', 0))  # Binding to port 0 asks the OS for an ephemeral port
             port = s.getsockname()[1]  # Get the port that was assigned
             # Verify port is not in LISTEN state
-            if not any(conn.laddr.port == port and conn.status == 'LISTEN' for conn in psutil.net_connections(kind='inet')):
-                with open(log_file, 'a') as f:
-                    f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Found free port {port} on attempt {attempt + 1}\n")
+            if not snapshot.is_listening(port):
+                log_message(f"Found free port {port} on attempt {attempt + 1}")
                 return port, s
             s.close()
-            with open(log_file, 'a') as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Port {port} already in use, trying another\n")
+            log_message(f"Port {port} already in use, trying another")
         except Exception as e:
-            with open(log_file, 'a') as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Error finding port on attempt {attempt + 1}: {str(e)}\n")
+            log_message(f"Error finding port on attempt {attempt + 1}: {str(e)}")
             if s:
                 s.close()
     raise RuntimeError("Failed to find a free port after multiple attempts")
 
-def simulate_zeromq_pub_sub(pub_port, sub_port=None, test_mode=False, temp_socket=None):
-    """Simulate ZeroMQ PUB-SUB binding and connection"""
-    log_file = PROJECT_ROOT / "port_logs.txt"
-    context = zmq.Context()
-    pub_socket = context.socket(zmq.PUB)
-    sub_socket = context.socket(zmq.SUB)
-    max_retries = 3
-    retry_delay = 0.5  # seconds
-    try:
-        pub_socket.setsockopt(zmq.LINGER, 0)
-        for attempt in range(max_retries):
-            try:
-                pub_socket.bind(f"tcp://*:{pub_port}")
-                if temp_socket:
-                    temp_socket.close()  # Close the temporary socket after successful bind
-                with open(log_file, 'a') as f:
-                    f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Bound PUB socket to tcp://*:{pub_port} on attempt {attempt + 1}\n")
-                break
-            except zmq.error.ZMQError as e:
-                if "Address in use" in str(e) and attempt < max_retries - 1:
-                    with open(log_file, 'a') as f:
-                        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Bind failed for port {pub_port}: {str(e)}, retrying after {retry_delay}s\n")
-                    time.sleep(retry_delay)
-                    continue
-                raise  # Raise the error if retries are exhausted
-        else:
-            raise RuntimeError(f"Failed to bind PUB socket to port {pub_port} after {max_retries} attempts")
-
-        sub_port = sub_port or pub_port
-        sub_socket.setsockopt(zmq.SUBSCRIBE, b"")
-        sub_socket.setsockopt(zmq.LINGER, 0)
-        sub_socket.connect(f"tcp://localhost:{sub_port}")
-        with open(log_file, 'a') as f:
-            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Connected SUB socket to tcp://localhost:{sub_port}\n")
-        
-        time.sleep(0.2)
-        pub_socket.send(b"Test message")
-        poller = zmq.Poller()
-        poller.register(sub_socket, zmq.POLLIN)
-        events = dict(poller.poll(2000))
-        if sub_socket in events and events[sub_socket] == zmq.POLLIN:
-            message = sub_socket.recv()
-            with open(log_file, 'a') as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Received message: {message.decode()}\n")
-            if message != b"Test message":
-                raise RuntimeError("Failed to receive correct message")
-        else:
-            raise RuntimeError("Failed to receive message")
-        
-        if test_mode:
-            time.sleep(0.1)  # Reduced sleep for tests
-            with open(log_file, 'a') as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Extended PUB socket lifetime for test\n")
-    except zmq.error.ZMQError as e:
-        with open(log_file, 'a') as f:
-            f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - ZeroMQ error: {str(e)}\n")
-        raise
-    finally:
-        pub_socket.close()
-        sub_socket.close()
-        context.term()
-        if not test_mode:
-            time.sleep(30)
\ No newline at end of file
+def __getattr__(name):
+    # The ZeroMQ simulation lives in zeromq_sim so that importing core
+    # (and every CLI command) does not load libzmq.
+    if name in ('simulate_zeromq_pub_sub', 'benchmark_zeromq_pub_sub'):
+        import zeromq_sim
+        return getattr(zeromq_sim, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,186 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+
+# Default socket location; override with the PORTMASTER_SOCKET environment variable.
+DEFAULT_SOCKET = Path(os.environ.get('PORTMASTER_SOCKET', Path(__file__).resolve().parent / "portmaster.sock"))
+
+# Core methods the daemon will run on behalf of clients
+RPC_METHODS = frozenset([
+    'list_connections', 'cache_stats', 'check_port', 'check_ports', 'kill_process', 'kill_processes',
+    'kill_port', 'block_port', 'unblock_port', 'check_firewall_rule', 'list_firewall_rules', 'reconcile',
+    'start_server', 'stop_server', 'server_stats', 'reserve_port', 'release_port', 'reserve_many',
+    'release_many', 'save_connections',
+])
+# Calls after which the cached snapshot no longer describes the socket table
+_CHANGES_SOCKETS = frozenset(['kill_process', 'kill_processes', 'kill_port', 'start_server', 'stop_server'])
+
+
+class DaemonError(RuntimeError):
+    """Raised by the client when the daemon reports a failed call"""
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One JSON request per line; a client may send several over one connection
+        for line in self.rfile:
+            response = self.server.portmaster.dispatch(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+# socketserver.UnixStreamServer only exists where AF_UNIX does (not on
+# Windows); the client below degrades to "no daemon running" there.
+if hasattr(socket, 'AF_UNIX'):
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+    class PortmasterDaemon:
+        """Serve core operations over a Unix socket from one long-lived PortManagerCore.
+
+        The core keeps its process-name cache, reservation store and firewall
+        inventory warm between calls, and reuses a socket-table snapshot for
+        ``snapshot_ttl`` seconds. Calls are run one at a time.
+        """
+
+        def __init__(self, core, path=DEFAULT_SOCKET, snapshot_ttl=1.0, inventory_ttl=5.0):
+            self.core = core
+            self.path = Path(path)
+            self.core.snapshot_ttl = snapshot_ttl
+            if self.core.firewall.inventory_ttl is None:
+                # Notice rule edits made outside the daemon
+                self.core.firewall.inventory_ttl = inventory_ttl
+            self.started = time.time()
+            self.server = None
+            self._lock = threading.Lock()
+
+        def dispatch(self, line):
+            """Run one encoded request and return the response dict"""
+            try:
+                request = json.loads(line)
+                method = request['method']
+                args, kwargs = request.get('args', []), request.get('kwargs', {})
+            except (ValueError, KeyError, TypeError) as e:
+                return {"error": f"Bad request: {str(e)}"}
+            if method == 'ping':
+                return {"result": {"pid": os.getpid(), "uptime": time.time() - self.started}}
+            if method == 'shutdown':
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {"result": "Daemon stopping"}
+            if method not in RPC_METHODS:
+                return {"error": f"Unknown method: {method}"}
+            with self._lock:
+                try:
+                    result = getattr(self.core, method)(*args, **kwargs)
+                except Exception as e:
+                    self.core.log(f"Daemon call {method} failed: {str(e)}")
+                    return {"error": str(e)}
+                finally:
+                    if method in _CHANGES_SOCKETS:
+                        self.core.invalidate_snapshot()
+            if isinstance(result, tuple):
+                return {"result": list(result), "tuple": True}
+            return {"result": result}
+
+        def bind(self):
+            """Create the listening socket, replacing a stale one left by a dead daemon"""
+            if self.path.exists():
+                if DaemonClient.connect(self.path) is not None:
+                    raise RuntimeError(f"A daemon is already listening on {self.path}")
+                self.path.unlink()
+            # Only the owner may drive the firewall through us; the socket is
+            # created with these permissions rather than tightened afterwards
+            umask = os.umask(0o177)
+            try:
+                self.server = _Server(str(self.path), _Handler)
+            finally:
+                os.umask(umask)
+            self.server.portmaster = self
+
+        def serve_forever(self):
+            if self.server is None:
+                self.bind()
+            self.core.log(f"Daemon listening on {self.path}")
+            try:
+                self.server.serve_forever()
+            finally:
+                self.server.server_close()
+                if self.path.exists():
+                    self.path.unlink()
+                self.core.log("Daemon stopped")
+
+        def shutdown(self):
+            if self.server is not None:
+                self.server.shutdown()
+
+
+class DaemonClient:
+    """Send requests to a running daemon over its Unix socket"""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=60.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(str(path))
+        except OSError:
+            self.sock.close()
+            raise
+        self._file = self.sock.makefile('rb')
+
+    @classmethod
+    def connect(cls, path=DEFAULT_SOCKET, timeout=60.0):
+        """Return a client, or None if no daemon is listening on ``path``"""
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+            return None
+        try:
+            return cls(path, timeout)
+        except OSError:
+            return None
+
+    def call(self, method, *args, **kwargs):
+        """Run ``method`` in the daemon; raises DaemonError if it fails or the daemon does not answer properly"""
+        request = {"method": method, "args": list(args), "kwargs": kwargs}
+        try:
+            self.sock.sendall(json.dumps(request).encode() + b"\n")
+            line = self._file.readline()
+            if not line:
+                raise DaemonError("Daemon closed the connection")
+            response = json.loads(line)
+            if "error" in response:
+                raise DaemonError(response["error"])
+            return tuple(response["result"]) if response.get("tuple") else response["result"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise DaemonError(f"Bad reply from daemon: {str(e)}") from None
+
+    def alive(self, timeout=2.0):
+        """True if the daemon answers a ping within ``timeout`` seconds"""
+        previous = self.sock.gettimeout()
+        self.sock.settimeout(timeout)
+        try:
+            self.call('ping')
+            return True
+        except DaemonError:
+            return False
+        finally:
+            self.sock.settimeout(previous)
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+
+class RemoteCore:
+    """Stand-in for PortManagerCore whose methods run inside the daemon"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        if name not in RPC_METHODS:
+            raise AttributeError(f"{name} is not available through the daemon")
+        return lambda *args, **kwargs: self.client.call(name, *args, **kwargs)
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+
+from connections import ConnectionRecord
+
+
+class Exporter:
+    """Stream ConnectionRecord rows to a text file in bounded chunks.
+
+    Rows are formatted one at a time and written every ``chunk_rows`` rows,
+    so memory stays constant however large the connection table is.
+    """
+
+    def __init__(self, f, chunk_rows=1000):
+        self.f = f
+        self.chunk_rows = chunk_rows
+
+    def write_header(self):
+        pass
+
+    def format_rows(self, records):
+        """Yield one formatted line per record"""
+        raise NotImplementedError
+
+    def export(self, records):
+        """Write the header and every record, returning the number of rows written"""
+        self.write_header()
+        count = 0
+        chunk = []
+        for line in self.format_rows(records):
+            chunk.append(line)
+            count += 1
+            if len(chunk) >= self.chunk_rows:
+                self.f.write(''.join(chunk))
+                chunk.clear()
+        if chunk:
+            self.f.write(''.join(chunk))
+        return count
+
+
+class TextExporter(Exporter):
+    """The fixed-width report layout"""
+
+    def write_header(self):
+        divider = "=" * 120 + "\n"
+        self.f.write("Portmaster Network Connections\n")
+        self.f.write(divider)
+        self.f.write(f"{'Protocol':<10}{'Local Address':<25}{'Remote Address':<25}{'Status':<15}{'PID':<10}{'Process Name'}\n")
+        self.f.write(divider)
+
+    def format_rows(self, records):
+        for r in records:
+            yield f"{r.protocol:<10}{r.local_address:<25}{r.remote_address:<25}{r.display_status:<15}{r.pid or 0:<10}{r.process_name}\n"
+
+
+class CsvExporter(Exporter):
+    def write_header(self):
+        self.f.write(','.join(ConnectionRecord.FIELDS) + '\n')
+
+    def format_rows(self, records):
+        line = io.StringIO()
+        # '\n' terminators so the file can be opened in plain text mode
+        writer = csv.writer(line, lineterminator='\n')
+        for r in records:
+            line.seek(0)
+            line.truncate()
+            writer.writerow(r.values())
+            yield line.getvalue()
+
+
+class JsonLinesExporter(Exporter):
+    def format_rows(self, records):
+        for r in records:
+            yield json.dumps(r.as_dict()) + '\n'
+
+
+EXPORT_FORMATS = {
+    'text': TextExporter,
+    'csv': CsvExporter,
+    'jsonl': JsonLinesExporter,
+}
@@ -0,0 +1,308 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+RULE_PREFIX = "Portmaster_"
+
+
+def rule_name(protocol, port):
+    """Name of the Portmaster rule for a protocol and port"""
+    return f"{RULE_PREFIX}{protocol}_{port}"
+
+
+class FirewallRule:
+    """An inbound Portmaster rule: block or allow a protocol on local port(s), optionally for one program"""
+    __slots__ = ('name', 'action', 'protocol', 'ports', 'program')
+
+    def __init__(self, name, action, protocol, ports, program=None):
+        self.name = name
+        self.action = action
+        self.protocol = protocol
+        self.ports = str(ports)
+        self.program = program
+
+    def _key(self):
+        return (self.name, self.action, self.protocol, self.ports, self.program)
+
+    def __eq__(self, other):
+        return isinstance(other, FirewallRule) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"FirewallRule{self._key()!r}"
+
+
+def port_ranges(ports):
+    """Parse a rule's port field ("8080", "8000-9000", "80,443") into (low, high) pairs"""
+    ranges = []
+    for part in str(ports).split(','):
+        part = part.strip()
+        if not part or not part[0].isdigit():
+            continue  # "Any", "RPC" and other keywords
+        low, _, high = part.partition('-')
+        ranges.append((int(low), int(high or low)))
+    return ranges
+
+
+class RuleInventory:
+    """Installed rules indexed by name and by (protocol, port), built from one ruleset dump"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_name = {}
+        self.by_port = {}
+        self.ranges = []  # (protocol, low, high, rule) for rules spanning several ports
+        for rule in self.rules:
+            self.by_name.setdefault(rule.name, []).append(rule)
+            for low, high in port_ranges(rule.ports):
+                if low == high:
+                    self.by_port.setdefault((rule.protocol, low), []).append(rule)
+                else:
+                    self.ranges.append((rule.protocol, low, high, rule))
+        self.created = time.monotonic()
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.rules)
+
+    def get(self, name):
+        return self.by_name.get(name, [])
+
+    def for_port(self, protocol, port):
+        """Rules whose local ports include ``port`` for ``protocol`` (or for any protocol)"""
+        matches = []
+        for proto in (protocol, 'Any'):
+            matches += self.by_port.get((proto, port), [])
+        matches += [rule for proto, low, high, rule in self.ranges
+                    if proto in (protocol, 'Any') and low <= port <= high]
+        return matches
+
+    def portmaster_rules(self):
+        return [rule for rule in self.rules if rule.name.startswith(RULE_PREFIX)]
+
+
+class FirewallBackend:
+    """Applies batches of rule additions and deletions.
+
+    ``apply`` returns ``(ok, error_text)``. ``atomic`` backends either apply
+    the whole batch or nothing; for the others a failed batch may have been
+    partly applied and callers must roll back themselves.
+
+    Existence checks are answered from a cached RuleInventory. The cache is
+    dropped whenever ``apply`` changes rules, and also after
+    ``inventory_ttl`` seconds if that is set, which catches edits made
+    outside Portmaster.
+    """
+    name = None
+    atomic = False
+    inventory_ttl = None
+    supports_program = True  # False if allow rules cannot be tied to an executable
+
+    def __init__(self):
+        self._inventory = None
+
+    def apply(self, add=(), delete=()):
+        add, delete = list(add), list(delete)
+        if not add and not delete:
+            return True, ""
+        try:
+            return self._apply(add, delete)
+        finally:
+            self._inventory = None
+
+    def _apply(self, add, delete):
+        raise NotImplementedError
+
+    def list_rules(self):
+        """Dump the installed rules"""
+        raise NotImplementedError
+
+    def inventory(self, refresh=False):
+        """Return the cached RuleInventory, dumping the ruleset only when needed"""
+        inventory = self._inventory
+        if (refresh or inventory is None or
+                (self.inventory_ttl is not None and time.monotonic() - inventory.created > self.inventory_ttl)):
+            inventory = self._inventory = RuleInventory(self.list_rules())
+        return inventory
+
+    def rule_exists(self, name):
+        return name in self.inventory()
+
+
+class NetshBackend(FirewallBackend):
+    """Windows Firewall via `netsh advfirewall`.
+
+    A single change runs one netsh command, as before. Larger batches are
+    written to a script and run by one `netsh -f` process.
+    """
+    name = 'netsh'
+
+    @staticmethod
+    def _add_args(rule):
+        args = ['advfirewall', 'firewall', 'add', 'rule', f'name={rule.name}',
+                'dir=in', f'action={rule.action}', f'protocol={rule.protocol}', f'localport={rule.ports}']
+        if rule.program:
+            args.append(f'program={rule.program}')
+        return args
+
+    @staticmethod
+    def _script_line(args):
+        # netsh scripts need quoting for values with spaces (names, program paths)
+        quoted = []
+        for arg in args:
+            key, sep, value = arg.partition('=')
+            quoted.append(f'{key}="{value}"' if sep and key in ('name', 'program') else arg)
+        return ' '.join(quoted)
+
+    def _apply(self, add, delete):
+        commands = [['advfirewall', 'firewall', 'delete', 'rule', f'name={name}'] for name in delete]
+        commands += [self._add_args(rule) for rule in add]
+        if len(commands) == 1:
+            result = subprocess.run(['netsh'] + commands[0], capture_output=True, text=True)
+            ok = result.returncode == 0 and (not delete or "Ok" in result.stdout)
+            return ok, result.stderr
+        with tempfile.NamedTemporaryFile('w', suffix='.netsh', delete=False) as f:
+            f.write("\n".join(self._script_line(args) for args in commands) + "\n")
+        try:
+            result = subprocess.run(['netsh', '-f', f.name], capture_output=True, text=True)
+        finally:
+            os.unlink(f.name)
+        return result.returncode == 0, result.stderr or result.stdout
+
+    def list_rules(self):
+        cmd = ['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all', 'dir=in', 'verbose']
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        return self.parse_rules(result.stdout)
+
+    @staticmethod
+    def parse_rules(output):
+        """Parse `netsh advfirewall firewall show rule ... verbose` output into FirewallRules"""
+        rules = []
+        fields = None
+
+        def finish():
+            if fields and 'Rule Name' in fields:
+                program = fields.get('Program')
+                rules.append(FirewallRule(fields['Rule Name'], fields.get('Action', '').lower(),
+                                          fields.get('Protocol', 'Any'), fields.get('LocalPort', 'Any'),
+                                          None if program in (None, 'Any') else program))
+
+        for line in output.splitlines():
+            key, sep, value = line.partition(':')
+            if not sep or line.startswith('-'):
+                continue
+            key, value = key.strip(), value.strip()
+            if key == 'Rule Name':
+                finish()
+                fields = {}
+            if fields is not None:
+                fields[key] = value
+        finish()
+        return rules
+
+
+class NftablesBackend(FirewallBackend):
+    """Linux nftables. Every batch is one atomic `nft -f -` transaction.
+
+    Rules live in their own ``inet portmaster`` table and carry the rule name
+    as a comment. nftables cannot match the owning program of inbound
+    traffic, so allow rules open the port for everyone.
+    """
+    name = 'nftables'
+    atomic = True
+    supports_program = False
+    TABLE = 'inet portmaster'
+    CHAIN = 'input'
+
+    def __init__(self, nft='nft'):
+        super().__init__()
+        self.nft = nft
+
+    def _rules_json(self):
+        result = subprocess.run([self.nft, '-j', '-a', 'list', 'chain', *self.TABLE.split(), self.CHAIN],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return []  # table not created yet
+        return [item['rule'] for item in json.loads(result.stdout).get('nftables', []) if 'rule' in item]
+
+    def list_rules(self):
+        rules = []
+        for rule in self._rules_json():
+            name = rule.get('comment', '')
+            if not name.startswith(RULE_PREFIX):
+                continue
+            _, protocol, ports = name.split('_', 2)
+            action = 'allow' if any('accept' in expr for expr in rule.get('expr', [])) else 'block'
+            rules.append(FirewallRule(name, action, protocol, ports))
+        return rules
+
+    def _apply(self, add, delete):
+        lines = [f"add table {self.TABLE}",
+                 f"add chain {self.TABLE} {self.CHAIN} {{ type filter hook input priority 0 ; policy accept ; }}"]
+        if delete:
+            handles = {}
+            for rule in self._rules_json():
+                handles.setdefault(rule.get('comment'), []).append(rule['handle'])
+            for name in delete:
+                if name not in handles:
+                    return False, f"No rule named {name}"
+                lines += [f"delete rule {self.TABLE} {self.CHAIN} handle {handle}" for handle in handles[name]]
+        for rule in add:
+            verdict = 'accept' if rule.action == 'allow' else 'drop'
+            lines.append(f'add rule {self.TABLE} {self.CHAIN} {rule.protocol.lower()} dport {rule.ports} '
+                         f'{verdict} comment "{rule.name}"')
+        result = subprocess.run([self.nft, '-f', '-'], input="\n".join(lines) + "\n", capture_output=True, text=True)
+        return result.returncode == 0, result.stderr
+
+
+class FakeFirewallBackend(FirewallBackend):
+    """In-memory firewall for tests and dry runs. Batches are atomic and recorded in ``batches``."""
+    name = 'fake'
+    atomic = True
+
+    def __init__(self, rules=()):
+        super().__init__()
+        self.rules = {rule.name: rule for rule in rules}
+        self.batches = []
+        self.fail_next = None  # set to an error string to make the next batch fail
+        self.dumps = 0
+
+    def _apply(self, add, delete):
+        self.batches.append((add, delete))
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            return False, error
+        missing = [name for name in delete if name not in self.rules]
+        if missing:
+            return False, f"No rule named {missing[0]}"
+        for name in delete:
+            del self.rules[name]
+        for rule in add:
+            self.rules[rule.name] = rule
+        return True, ""
+
+    def list_rules(self):
+        self.dumps += 1
+        return list(self.rules.values())
+
+
+FIREWALL_BACKENDS = {
+    'netsh': NetshBackend,
+    'nftables': NftablesBackend,
+    'fake': FakeFirewallBackend,
+}
+
+
+def get_firewall_backend(name=None):
+    """Return a firewall backend by name; netsh is the default"""
+    if name is None:
+        name = 'netsh'
+    if name not in FIREWALL_BACKENDS:
+        raise ValueError(f"Unknown firewall backend: {name}")
+    return FIREWALL_BACKENDS[name]()
@@ -4,13 +4,29 @@ from PyQt6.QtWidgets import (
     QGridLayout, QGroupBox, QLabel, QLineEdit, QPushButton, QRadioButton,
     QTableWidget, QTableWidgetItem, QHeaderView, QTextEdit, QMessageBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from core import PortManagerCore
 
+class CoreTask(QThread):
+    """Run one blocking core call off the UI thread and emit its (output, rc)"""
+    done = pyqtSignal(str, int)
+
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func, self.args, self.kwargs = func, args, kwargs
+
+    def run(self):
+        try:
+            output, rc = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            output, rc = f"Error: {str(e)}", 1
+        self.done.emit(output, rc)
+
 class PortManagerGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.core = PortManagerCore()
+        self.kill_task = None  # CoreTask running a kill, if any
         self.setWindowTitle("Portmaster - Network Management (PyQt6)")
         self.setGeometry(100, 100, 1100, 750)  # Set a good default size
 
@@ -103,7 +119,7 @@ class PortManagerGUI(QMainWindow):
         kill_layout = QHBoxLayout(kill_group)
         self.pid_entry = QLineEdit()
         self.pid_entry.setPlaceholderText("PID")
-        kill_btn = QPushButton("Kill")
+        self.kill_btn = kill_btn = QPushButton("Kill")
         kill_btn.clicked.connect(self.kill_process)
         kill_layout.addWidget(QLabel("PID:"))
         kill_layout.addWidget(self.pid_entry)
@@ -239,16 +255,18 @@ class PortManagerGUI(QMainWindow):
 
     def list_connections(self):
         try:
-            connections = self.core.list_connections()
+            connections = self.core.list_records()
             self.connections_table.setRowCount(0) # Clear table
+            self.connections_table.setSortingEnabled(False) # Avoid re-sorting on every inserted row
+            self.connections_table.setRowCount(len(connections))
             for row, conn in enumerate(connections):
-                self.connections_table.insertRow(row)
                 for col, value in enumerate(conn.values()):
                     item = QTableWidgetItem(str(value))
                     # For numeric columns, set data for proper sorting
                     if col == 4: # PID column
                         item.setData(Qt.ItemDataRole.DisplayRole, int(value))
                     self.connections_table.setItem(row, col, item)
+            self.connections_table.setSortingEnabled(True)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to list connections: {str(e)}")
 
@@ -268,10 +286,18 @@ class PortManagerGUI(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Please enter a PID")
             return
         if self._confirm_action("Confirm Kill", f"Are you sure you want to terminate PID {pid}?"):
-            output, rc = self.core.kill_process(pid, confirm=True)
-            self.pm_output_text.setText(output)
-            if rc != 0:
-                QMessageBox.critical(self, "Error", output)
+            # Termination can wait several seconds for the process to exit; keep the UI responsive
+            self.kill_btn.setEnabled(False)
+            self.pm_output_text.setText(f"Terminating PID {pid}...")
+            self.kill_task = CoreTask(self.core.kill_process, pid, confirm=True)
+            self.kill_task.done.connect(self._kill_finished)
+            self.kill_task.start()
+
+    def _kill_finished(self, output, rc):
+        self.kill_btn.setEnabled(True)
+        self.pm_output_text.setText(output)
+        if rc != 0:
+            QMessageBox.critical(self, "Error", output)
 
     def block_port(self):
         port = self.block_port_entry.text()
@@ -354,8 +380,17 @@ class PortManagerGUI(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(e)}")
 
-if __name__ == "__main__":
+    def closeEvent(self, event):
+        if self.kill_task is not None:
+            self.kill_task.wait()  # a QThread must not be destroyed while it runs
+        super().closeEvent(event)
+
+def main():
+    """Run the GUI until its window is closed"""
     app = QApplication(sys.argv)
     window = PortManagerGUI()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
+
+if __name__ == "__main__":
+    main()
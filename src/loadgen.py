@@ -0,0 +1,187 @@
+import ipaddress
+import socket
+import threading
+import time
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list (None when empty)"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))  # ceil without floats
+    return values[min(len(values), int(rank)) - 1]
+
+
+def check_loopback(host):
+    """Refuse to generate load against anything but this machine"""
+    try:
+        address = ipaddress.ip_address(socket.gethostbyname(host))
+    except (OSError, ValueError):
+        raise ValueError(f"Cannot resolve {host}") from None
+    if not address.is_loopback:
+        raise ValueError(f"Load generation is limited to localhost, not {host}")
+
+
+class LoadResult:
+    """Counters and latency samples gathered by run_load"""
+
+    def __init__(self, port, protocol, concurrency, payload):
+        self.port = port
+        self.protocol = protocol
+        self.concurrency = concurrency
+        self.payload = payload
+        self.elapsed = 0.0
+        self.requests = self.errors = self.lost = 0
+        self.bytes_sent = self.bytes_received = 0
+        self.connect_times = []
+        self.round_trips = []
+        self._lock = threading.Lock()
+
+    def merge(self, worker):
+        with self._lock:
+            self.requests += worker.requests
+            self.errors += worker.errors
+            self.lost += worker.lost
+            self.bytes_sent += worker.bytes_sent
+            self.bytes_received += worker.bytes_received
+            self.connect_times += worker.connect_times
+            self.round_trips += worker.round_trips
+
+    def summary(self):
+        """Totals, rates and p50/p95/p99 latencies in milliseconds"""
+        connect, rtt = sorted(self.connect_times), sorted(self.round_trips)
+
+        def ms(values, pct):
+            value = percentile(values, pct)
+            return None if value is None else round(value * 1000, 3)
+
+        elapsed = self.elapsed or 1e-9
+        return {
+            "Port": self.port, "Protocol": self.protocol, "Concurrency": self.concurrency,
+            "Payload": self.payload, "Duration": round(self.elapsed, 3),
+            "Requests": self.requests, "Errors": self.errors, "Lost": self.lost,
+            "Requests/s": round(self.requests / elapsed, 1),
+            "MB/s": round((self.bytes_sent + self.bytes_received) / elapsed / 1e6, 3),
+            "Connects": len(connect),
+            "Connect p50": ms(connect, 50), "Connect p95": ms(connect, 95), "Connect p99": ms(connect, 99),
+            "RTT p50": ms(rtt, 50), "RTT p95": ms(rtt, 95), "RTT p99": ms(rtt, 99),
+        }
+
+
+class _WorkerStats:
+    def __init__(self):
+        self.requests = self.errors = self.lost = 0
+        self.bytes_sent = self.bytes_received = 0
+        self.connect_times = []
+        self.round_trips = []
+
+
+def _tcp_worker(host, port, payload, deadline, echo, timeout, stats):
+    data = b"x" * payload
+    buffer = bytearray(payload)
+    view = memoryview(buffer)
+    clock = time.perf_counter
+    while clock() < deadline:
+        start = clock()
+        try:
+            sock = socket.create_connection((host, port), timeout=timeout)
+        except OSError:
+            stats.errors += 1
+            time.sleep(0.01)  # e.g. backlog full; don't spin
+            continue
+        stats.connect_times.append(clock() - start)
+        with sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                while clock() < deadline:
+                    start = clock()
+                    sock.sendall(data)
+                    stats.bytes_sent += payload
+                    if echo:
+                        received = 0
+                        while received < payload:
+                            n = sock.recv_into(view[received:])
+                            if n == 0:
+                                raise ConnectionResetError("server closed the connection")
+                            received += n
+                        stats.bytes_received += received
+                    stats.round_trips.append(clock() - start)
+                    stats.requests += 1
+            except OSError:
+                stats.errors += 1
+
+
+def _udp_worker(host, port, payload, deadline, echo, timeout, stats):
+    # Each datagram starts with a sequence number; a reply that arrives after
+    # its request timed out is skipped rather than taken for the next one's
+    width = min(payload, 8)
+    filler = b"x" * (payload - width)
+    buffer = bytearray(payload)
+    view = memoryview(buffer)
+    clock = time.perf_counter
+    seq = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((host, port))
+        while clock() < deadline:
+            seq += 1
+            tag = (seq % (1 << 8 * width)).to_bytes(width, 'big')
+            start = clock()
+            try:
+                sock.settimeout(timeout)
+                sock.send(tag + filler)
+                stats.bytes_sent += payload
+                while echo:
+                    n = sock.recv_into(buffer)
+                    if n >= width and view[:width] == tag:
+                        stats.bytes_received += n
+                        break
+                    remaining = timeout - (clock() - start)
+                    if remaining <= 0:
+                        raise socket.timeout
+                    sock.settimeout(remaining)
+            except socket.timeout:
+                stats.lost += 1
+                continue
+            except OSError:
+                stats.errors += 1  # e.g. ICMP port unreachable
+                time.sleep(0.01)
+                continue
+            stats.round_trips.append(clock() - start)
+            stats.requests += 1
+
+
+def run_load(port, protocol='TCP', concurrency=8, payload=64, duration=5.0, host='127.0.0.1', echo=True,
+             timeout=1.0):
+    """Drive request/response traffic at a local port from ``concurrency`` threads.
+
+    Each TCP worker connects (timing the handshake), then sends ``payload``
+    bytes and, if ``echo`` is set, waits for them to come back, timing the
+    round trip; it reconnects when the server hangs up. UDP workers do the
+    same with datagrams and count unanswered ones as lost; a reply that
+    turns up after its timeout is discarded, not matched to a later request.
+    """
+    check_loopback(host)
+    if protocol not in ('TCP', 'UDP'):
+        raise ValueError("Protocol must be TCP or UDP")
+    if concurrency < 1 or payload < 1 or duration <= 0:
+        raise ValueError("Concurrency, payload and duration must be positive")
+    result = LoadResult(port, protocol, concurrency, payload)
+    target = _tcp_worker if protocol == 'TCP' else _udp_worker
+    start_gate = threading.Barrier(concurrency + 1)
+
+    def work():
+        stats = _WorkerStats()
+        start_gate.wait()
+        target(host, port, payload, deadline, echo, timeout, stats)
+        result.merge(stats)
+
+    threads = [threading.Thread(target=work, name=f"portmaster-load-{i}", daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    deadline = started + duration
+    start_gate.wait()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
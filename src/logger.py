@@ -0,0 +1,131 @@
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Default log location; override with the PORTMASTER_LOG_FILE environment variable.
+DEFAULT_LOG_FILE = Path(os.environ.get('PORTMASTER_LOG_FILE', Path(__file__).resolve().parent / "port_logs.txt"))
+
+_STOP = object()
+
+
+class LogWriter:
+    """Append timestamped lines to a log file from a background thread.
+
+    ``write`` only formats the line and puts it on an in-memory queue. The
+    writer thread drains everything that has queued up and appends it with a
+    single open/write, so bursts of messages cost one file operation rather
+    than one per message. The file is rotated to ``<name>.1`` ..
+    ``<name>.<backup_count>`` once it would grow past ``max_bytes``.
+    """
+
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3, batch_size=1000):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, message):
+        """Queue a message; the timestamp is taken now, not when it is written"""
+        self._queue.put(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+        if self._thread is None:
+            self._start()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write out pending messages and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="portmaster-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [item for item in items if isinstance(item, str)]
+            if lines:
+                try:
+                    self._append(''.join(lines))
+                except OSError:
+                    pass  # logging must never take the caller down
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in items):
+                return
+
+    def _append(self, data):
+        # Take the size from the open file rather than a running count: the
+        # CLI, the daemon and the GUI may all append to the same log.
+        f = open(self.path, 'a')
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if self.max_bytes and size and size + len(data) > self.max_bytes:
+                f.close()  # Windows cannot rename an open file
+                self._rotate()
+                f = open(self.path, 'a')
+            f.write(data)
+        finally:
+            f.close()
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{index}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backup_count:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(path=None):
+    """Return the shared LogWriter for ``path`` (default: DEFAULT_LOG_FILE)"""
+    path = Path(path or DEFAULT_LOG_FILE).resolve()
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = LogWriter(path)
+        return writer
+
+
+def log_message(message, path=None):
+    """Queue a timestamped message for the given (or default) log file"""
+    get_log_writer(path).write(message)
+
+
+@atexit.register
+def close_all():
+    """Flush and stop every writer; registered to run at interpreter exit"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
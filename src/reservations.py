@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive lock on a sidecar file, held across processes for the duration of a `with` block.
+
+    With ``blocking=False``, acquiring raises BlockingIOError instead of
+    waiting when another holder has the lock.
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = Path(path)
+        self.blocking = blocking
+        self._fd = None
+
+    def acquire(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK if self.blocking else msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    if self.blocking:
+                        raise
+                    raise BlockingIOError(f"{self.path} is locked") from None
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class JsonReservationStore:
+    """Reservations kept in a JSON file of {port: {"protocol", "exe_path"}}.
+
+    Reads are served from an in-memory copy that is reloaded only when the
+    file's inode, mtime or size changes. Writes happen inside
+    ``transaction()``, which holds a cross-process lock and replaces the file
+    atomically (temp file + rename) so readers never see a partial file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._cache = None
+        self._stamp = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        """Return the current reservations, re-reading the file only if it changed"""
+        stamp = self._stat()
+        if self._cache is None or stamp != self._stamp:
+            self._cache = json.loads(self.path.read_text() or '{}') if stamp else {}
+            self._stamp = stamp
+        return self._cache
+
+    def all(self):
+        return {port: dict(entry) for port, entry in self.load().items()}
+
+    def get(self, port):
+        return self.load().get(str(port))
+
+    def __contains__(self, port):
+        return str(port) in self.load()
+
+    def __len__(self):
+        return len(self.load())
+
+    @contextmanager
+    def transaction(self):
+        """Yield a mutable copy of the reservations and persist it on success"""
+        with FileLock(self.lock_path):
+            data = self.all()
+            yield data
+            if data != self._cache:
+                self._write(data)
+
+    def _write(self, data):
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        self._cache = data
+        self._stamp = self._stat()
+
+
+class SqliteReservationStore:
+    """Reservations kept in a SQLite database, for deployments with thousands of them.
+
+    Transactions only write the rows that changed. The in-memory copy is
+    invalidated through ``PRAGMA data_version``, which changes whenever
+    another connection commits.
+    """
+
+    def __init__(self, path):
+        import sqlite3  # only deployments that use a .db store pay for loading it
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations ("
+            "port TEXT PRIMARY KEY, protocol TEXT NOT NULL, exe_path TEXT NOT NULL)")
+        self._cache = None
+        self._version = None
+
+    def load(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._cache is None or version != self._version:
+            rows = self._conn.execute("SELECT port, protocol, exe_path FROM reservations")
+            self._cache = {port: {'protocol': protocol, 'exe_path': exe_path} for port, protocol, exe_path in rows}
+            self._version = version
+        return self._cache
+
+    def all(self):
+        return {port: dict(entry) for port, entry in self.load().items()}
+
+    def get(self, port):
+        return self.load().get(str(port))
+
+    def __contains__(self, port):
+        return str(port) in self.load()
+
+    def __len__(self):
+        return len(self.load())
+
+    @contextmanager
+    def transaction(self):
+        """Yield a mutable copy of the reservations and write back only the differences"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._cache = None  # re-read under the write lock
+            before = self.load()
+            data = self.all()
+            yield data
+            removed = [(port,) for port in before if port not in data]
+            changed = [(port, entry['protocol'], entry['exe_path'])
+                       for port, entry in data.items() if before.get(port) != entry]
+            if removed:
+                self._conn.executemany("DELETE FROM reservations WHERE port = ?", removed)
+            if changed:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO reservations (port, protocol, exe_path) VALUES (?, ?, ?)", changed)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._cache = data
+
+    def close(self):
+        self._conn.close()
+
+
+def open_store(path):
+    """Open the reservation store for ``path``: SQLite for .db/.sqlite files, JSON otherwise"""
+    path = Path(path)
+    if path.suffix in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteReservationStore(path)
+    return JsonReservationStore(path)
@@ -0,0 +1,346 @@
+import multiprocessing
+import queue
+import selectors
+import signal
+import socket
+import threading
+import time
+
+MODES = ('echo', 'sink', 'discard')
+COUNTERS = ('connections', 'active', 'bytes_in', 'bytes_out', 'datagrams')
+_BUFFER_SIZE = 256 * 1024
+# Echo data a peer has not taken yet, past which we stop reading from it
+_PENDING_LIMIT = 4 * _BUFFER_SIZE
+
+
+class Listener:
+    """One bound TCP or UDP socket served by a ServerEngine, with its traffic counters.
+
+    Modes: ``echo`` sends everything back, ``sink`` reads and counts
+    everything, ``discard`` closes TCP connections as soon as they are
+    accepted and reads UDP datagrams only to drop them (arrivals are
+    counted, their bytes are not).
+    """
+
+    def __init__(self, sock, port, protocol, mode, workers=1):
+        self.sock = sock
+        self.port = port
+        self.protocol = protocol
+        self.mode = mode
+        self.workers = workers
+        self.started = time.monotonic()
+        self.connections = self.active = self.bytes_in = self.bytes_out = self.datagrams = 0
+        self.shared = None  # multiprocessing.Array a worker publishes its counters to
+        self.worker_counters = []  # the arrays of this listener's worker processes
+        self.worker_processes = []
+        self.worker_stop = None
+
+    def totals(self):
+        totals = {name: getattr(self, name) for name in COUNTERS}
+        for counters in self.worker_counters:
+            for name, value in zip(COUNTERS, counters):
+                totals[name] += value
+        return totals
+
+    def publish(self):
+        if self.shared is not None:
+            self.shared[:] = [getattr(self, name) for name in COUNTERS]
+
+    def stats(self):
+        totals = self.totals()
+        uptime = time.monotonic() - self.started
+        return {
+            "Port": self.port, "Protocol": self.protocol, "Mode": self.mode, "Workers": self.workers,
+            "Connections": totals['connections'], "Active": totals['active'], "Datagrams": totals['datagrams'],
+            "Bytes In": totals['bytes_in'], "Bytes Out": totals['bytes_out'], "Uptime": round(uptime, 3),
+            "MB/s In": round(totals['bytes_in'] / uptime / 1e6, 3) if uptime else 0.0,
+        }
+
+
+class _Connection:
+    __slots__ = ('sock', 'listener', 'pending')
+
+    def __init__(self, sock, listener):
+        self.sock = sock
+        self.listener = listener
+        self.pending = bytearray()  # echo data the peer has not taken yet
+
+
+class ServerEngine:
+    """Serve any number of TCP/UDP listeners from one selectors event loop.
+
+    The loop runs in a daemon thread that starts with the first listener.
+    ``start`` binds in the calling thread so errors surface immediately; the
+    socket is then handed to the loop. With ``workers > 1`` the port is bound
+    with SO_REUSEPORT and the extra workers are separate processes, each with
+    its own loop, whose counters are added to the listener's.
+    """
+
+    def __init__(self, publish_interval=0.5):
+        self.listeners = {}
+        self.publish_interval = publish_interval
+        self._selector = None
+        self._thread = None
+        self._commands = queue.Queue()
+        self._wake_r = self._wake_w = None
+        self._lock = threading.Lock()
+        self._buffer = bytearray(_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+
+    # -- public API, called from any thread --
+
+    def start(self, port, protocol='TCP', mode='sink', workers=1, host='0.0.0.0', reuse_port=False):
+        """Bind and serve a listener; returns the Listener or raises OSError/ValueError"""
+        if protocol not in ('TCP', 'UDP'):
+            raise ValueError("Protocol must be TCP or UDP")
+        if mode not in MODES:
+            raise ValueError(f"Mode must be one of {', '.join(MODES)}")
+        if workers < 1:
+            raise ValueError("Workers must be at least 1")
+        if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            raise ValueError("Worker processes need SO_REUSEPORT, which this platform lacks")
+        with self._lock:
+            if (protocol, port) in self.listeners:
+                raise ValueError(f"Already serving {protocol} port {port}")
+            sock = self._bind(port, protocol, host, reuse_port or workers > 1)
+            listener = Listener(sock, sock.getsockname()[1], protocol, mode, workers)
+            self.listeners[(protocol, listener.port)] = listener
+        self._call('add', listener)
+        if workers > 1:
+            self._spawn_workers(listener, host)
+        return listener
+
+    def stop(self, port=None, protocol=None):
+        """Close matching listeners (all of them by default) and return them"""
+        with self._lock:
+            stopped = [listener for (proto, lport), listener in self.listeners.items()
+                       if (port is None or lport == port) and (protocol is None or proto == protocol)]
+            for listener in stopped:
+                del self.listeners[(listener.protocol, listener.port)]
+        for listener in stopped:
+            self._call('remove', listener)
+            if listener.worker_stop is not None:
+                listener.worker_stop.set()
+                for process in listener.worker_processes:
+                    process.join(5)
+                    if process.is_alive():
+                        process.terminate()
+        return stopped
+
+    def stats(self, port=None):
+        with self._lock:
+            listeners = list(self.listeners.values())
+        return [listener.stats() for listener in listeners if port is None or listener.port == port]
+
+    def close(self):
+        """Stop every listener and the event loop"""
+        self.stop()
+        thread = self._thread
+        if thread is not None:
+            self._call('quit', None)
+            thread.join(5)
+
+    # -- internals --
+
+    @staticmethod
+    def _bind(port, protocol, host, reuse_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if protocol == 'TCP' else socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((host, port))
+            if protocol == 'TCP':
+                sock.listen(socket.SOMAXCONN)
+            sock.setblocking(False)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _spawn_workers(self, listener, host):
+        # Spawned, not forked: a forked worker would inherit every socket this
+        # process holds (other listeners, the daemon's Unix socket) and keep
+        # them open after we close them.
+        context = multiprocessing.get_context('spawn')
+        listener.worker_stop = context.Event()
+        pending = []
+        for _ in range(listener.workers - 1):
+            counters = context.Array('q', len(COUNTERS))
+            ready = context.Event()
+            process = context.Process(
+                target=_serve_worker, daemon=True,
+                args=(listener.port, listener.protocol, listener.mode, host, counters, ready, listener.worker_stop))
+            process.start()
+            pending.append(ready)
+            listener.worker_counters.append(counters)
+            listener.worker_processes.append(process)
+        if not all(ready.wait(10) for ready in pending):
+            self.stop(listener.port, listener.protocol)
+            raise RuntimeError(f"Worker processes for {listener.protocol} port {listener.port} did not start")
+
+    def _call(self, command, listener):
+        """Hand a command to the loop thread and wait until it has been carried out"""
+        if self._thread is None or not self._thread.is_alive():
+            if command == 'quit':
+                return
+            if command == 'remove':
+                listener.sock.close()
+                return
+            self._start_loop()
+        done = threading.Event()
+        self._commands.put((command, listener, done))
+        self._wake_w.send(b'\0')
+        done.wait(5)
+
+    def _start_loop(self):
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="portmaster-server", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        selector = self._selector
+        next_publish = time.monotonic() + self.publish_interval
+        try:
+            while True:
+                timeout = max(0.0, next_publish - time.monotonic())
+                for key, mask in selector.select(timeout):
+                    if key.data is None:
+                        if not self._drain_commands():
+                            return
+                    elif isinstance(key.data, _Connection):
+                        self._service(key.data, mask)
+                    elif key.data.protocol == 'TCP':
+                        self._accept(key.data)
+                    else:
+                        self._datagram(key.data)
+                if time.monotonic() >= next_publish:
+                    for listener in list(self.listeners.values()):
+                        listener.publish()
+                    next_publish = time.monotonic() + self.publish_interval
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            self._wake_w.close()
+
+    def _drain_commands(self):
+        try:
+            self._wake_r.recv(4096)
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                command, listener, done = self._commands.get_nowait()
+            except queue.Empty:
+                return True
+            if command == 'add':
+                self._selector.register(listener.sock, selectors.EVENT_READ, listener)
+            elif command == 'remove':
+                self._close_listener(listener)
+            done.set()
+            if command == 'quit':
+                return False
+
+    def _close_listener(self, listener):
+        for key in list(self._selector.get_map().values()):
+            if key.data is listener or (isinstance(key.data, _Connection) and key.data.listener is listener):
+                self._selector.unregister(key.fileobj)
+                key.fileobj.close()
+        listener.active = 0
+        listener.publish()
+
+    def _accept(self, listener):
+        while True:
+            try:
+                conn, _ = listener.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # e.g. too many open files; retry on the next readiness event
+            listener.connections += 1
+            if listener.mode == 'discard':
+                conn.close()
+                continue
+            conn.setblocking(False)
+            listener.active += 1
+            self._selector.register(conn, selectors.EVENT_READ, _Connection(conn, listener))
+
+    def _service(self, connection, mask):
+        listener = connection.listener
+        if mask & selectors.EVENT_WRITE and not self._flush(connection):
+            return
+        if not mask & selectors.EVENT_READ or len(connection.pending) >= _PENDING_LIMIT:
+            return
+        try:
+            n = connection.sock.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            n = 0
+        if n == 0:
+            self._drop(connection)
+            return
+        listener.bytes_in += n
+        if listener.mode == 'echo':
+            connection.pending += self._view[:n]
+            self._flush(connection)
+
+    def _flush(self, connection):
+        """Send pending echo data; returns False if the connection was dropped"""
+        try:
+            sent = connection.sock.send(connection.pending)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(connection)
+            return False
+        connection.listener.bytes_out += sent
+        del connection.pending[:sent]
+        # A peer that sends without reading gets no more reads until it
+        # drains its echo; the buffer is bounded instead of growing forever
+        events = selectors.EVENT_READ if len(connection.pending) < _PENDING_LIMIT else 0
+        if connection.pending:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(connection.sock, events, connection)
+        return True
+
+    def _drop(self, connection):
+        self._selector.unregister(connection.sock)
+        connection.sock.close()
+        connection.listener.active -= 1
+
+    def _datagram(self, listener):
+        while True:
+            try:
+                n, addr = listener.sock.recvfrom_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # e.g. ICMP port unreachable reported on Windows
+            listener.datagrams += 1
+            if listener.mode == 'discard':
+                continue
+            listener.bytes_in += n
+            if listener.mode == 'echo':
+                try:
+                    listener.bytes_out += listener.sock.sendto(self._view[:n], addr)
+                except OSError:
+                    pass  # UDP gives no delivery guarantee; drop like a full queue would
+
+
+def _serve_worker(port, protocol, mode, host, counters, ready, stop):
+    """Entry point of a SO_REUSEPORT worker process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the whole group; the parent stops us
+    engine = ServerEngine()
+    listener = engine.start(port, protocol, mode, host=host, reuse_port=True)
+    listener.shared = counters
+    ready.set()
+    try:
+        stop.wait()
+    finally:
+        listener.publish()
+        engine.close()
@@ -0,0 +1,101 @@
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import psutil
+import pytest
+from unittest.mock import MagicMock
+
+from allocator import allocate_ports
+from connections import ConnectionSnapshot
+
+SRC = Path(__file__).resolve().parent
+# Lease a few ports, report them, then hold the lease until stdin closes
+HOLDER = ("import sys; from allocator import allocate_ports; "
+          "lease = allocate_ports({count}, port_range=({start}, {end}), lease_dir=sys.argv[1]); "
+          "print(' '.join(map(str, lease.ports)), flush=True); sys.stdin.read()")
+
+
+def start_holder(code, lease_dir, log_file):
+    env = dict(os.environ, PORTMASTER_LOG_FILE=str(log_file))
+    return subprocess.Popen([sys.executable, '-c', code, str(lease_dir)], cwd=SRC, env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+
+def test_allocates_distinct_ports_in_range(tmp_path):
+    with allocate_ports(5, port_range=(25000, 25999), lease_dir=tmp_path) as lease:
+        assert len(set(lease)) == 5
+        assert all(25000 <= port <= 25999 for port in lease)
+        assert lease.active
+    assert not lease.active
+
+
+def test_leased_ports_are_skipped_until_released(tmp_path):
+    first = allocate_ports(3, port_range=(25000, 25004), lease_dir=tmp_path)
+    with pytest.raises(RuntimeError, match="Only 2 of 3"):
+        allocate_ports(3, port_range=(25000, 25004), lease_dir=tmp_path)
+    # The failed call left nothing leased
+    with allocate_ports(2, port_range=(25000, 25004), lease_dir=tmp_path) as second:
+        assert not set(first) & set(second)
+    first.release()
+    allocate_ports(5, port_range=(25000, 25004), lease_dir=tmp_path).release()
+
+
+def test_skips_ports_in_use(tmp_path, mocker):
+    with socket.socket() as held:
+        held.bind(('127.0.0.1', 0))
+        held.listen(1)
+        bound = held.getsockname()[1]
+        # 25100 shows up in the snapshot; the bound port only fails the bind probe
+        conn = MagicMock(laddr=MagicMock(port=25100), status=psutil.CONN_LISTEN)
+        snapshot = ConnectionSnapshot([conn])
+        mock_scan = mocker.patch('psutil.net_connections')
+        with pytest.raises(RuntimeError, match="Only 0 of 1"):
+            allocate_ports(1, port_range=(25100, 25100), lease_dir=tmp_path, snapshot=snapshot)
+        with pytest.raises(RuntimeError, match="Only 0 of 1"):
+            allocate_ports(1, port_range=(bound, bound), lease_dir=tmp_path, snapshot=ConnectionSnapshot([]))
+        mock_scan.assert_not_called()
+
+
+def test_one_snapshot_per_allocation(tmp_path, mocker):
+    mock_scan = mocker.patch('psutil.net_connections', return_value=[])
+    allocate_ports(10, port_range=(25200, 25299), lease_dir=tmp_path).release()
+    mock_scan.assert_called_once()
+
+
+def test_parallel_processes_never_share_ports(tmp_path, log_file):
+    code = HOLDER.format(count=3, start=25300, end=25339)
+    holders = [start_holder(code, tmp_path, log_file) for _ in range(4)]
+    try:
+        leased = [holder.stdout.readline().split() for holder in holders]
+    finally:
+        for holder in holders:
+            holder.stdin.close()
+            holder.wait(10)
+    ports = [port for ports in leased for port in ports]
+    assert len(ports) == 12 and len(set(ports)) == 12
+
+
+def test_lease_ends_with_its_process(tmp_path, log_file):
+    code = HOLDER.format(count=1, start=25400, end=25400)
+    holder = start_holder(code, tmp_path, log_file)
+    assert holder.stdout.readline().split() == ['25400']
+    with pytest.raises(RuntimeError):
+        allocate_ports(1, port_range=(25400, 25400), lease_dir=tmp_path)
+    holder.kill()
+    holder.wait(10)
+    allocate_ports(1, port_range=(25400, 25400), lease_dir=tmp_path).release()
+
+
+def test_free_ports_fixture(free_ports):
+    tcp, udp = free_ports(2), free_ports(1, protocol='UDP')
+    assert len(set(tcp + udp)) == 3
+
+
+def test_rejects_bad_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        allocate_ports(0, lease_dir=tmp_path)
+    with pytest.raises(ValueError):
+        allocate_ports(1, port_range=(30000, 20000), lease_dir=tmp_path)
@@ -1,8 +1,11 @@
+import os
 import pytest
 from unittest.mock import MagicMock, call
 import psutil
 
-from cleanup_ports import cleanup_ports, log
+from cleanup_ports import cleanup_ports, log, wait_for_time_wait
+from connections import ConnectionSnapshot
+from firewall import FakeFirewallBackend, FirewallRule
 
 @pytest.fixture
 def mock_cleanup_deps(mocker):
@@ -17,32 +20,109 @@ def mock_cleanup_deps(mocker):
     mock_conn = MagicMock()
     mock_conn.laddr = laddr_mock # Use the new address mock
     mock_conn.pid = 5678
+    mock_conn.status = psutil.CONN_ESTABLISHED
     mocker.patch('psutil.net_connections', return_value=[mock_conn])
-    
-    mock_process = MagicMock()
+
+    mock_process = MagicMock(pid=5678)
     mocker.patch('psutil.Process', return_value=mock_process)
+    mocker.patch('psutil.wait_procs', return_value=([mock_process], []))
 
     mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout="Ok."))
-    
+
     return mock_process, mock_run
 
-def test_cleanup_ports(mock_cleanup_deps):
+def test_cleanup_ports(mock_cleanup_deps, tmp_path):
     """Test the main cleanup function."""
     mock_process, mock_run = mock_cleanup_deps
-    
+    firewall = FakeFirewallBackend([
+        FirewallRule("Portmaster_TCP_8081", "allow", "TCP", 8081),
+        FirewallRule("Portmaster_UDP_9999", "block", "UDP", 9999),
+        FirewallRule("Portmaster_TCP_7000", "block", "TCP", 7000),
+    ])
+
     ports_to_clean = [8081, 9999]
-    cleanup_ports(ports=ports_to_clean)
-    
+    assert cleanup_ports(ports=ports_to_clean, firewall=firewall, log_file=tmp_path / "cleanup_log.txt") == []
+
     psutil.Process.assert_called_once_with(5678)
     mock_process.terminate.assert_called_once()
-    
-    assert mock_run.call_count == 4
-    
-    # FINAL FIX: Add the missing keyword arguments to match the actual call in cleanup_ports.py
-    expected_calls = [
-        call(['netsh', 'advfirewall', 'firewall', 'delete', 'rule', 'name=Portmaster_TCP_8081'], capture_output=True, text=True),
-        call(['netsh', 'advfirewall', 'firewall', 'delete', 'rule', 'name=Portmaster_UDP_8081'], capture_output=True, text=True),
-        call(['netsh', 'advfirewall', 'firewall', 'delete', 'rule', 'name=Portmaster_TCP_9999'], capture_output=True, text=True),
-        call(['netsh', 'advfirewall', 'firewall', 'delete', 'rule', 'name=Portmaster_UDP_9999'], capture_output=True, text=True)
-    ]
-    mock_run.assert_has_calls(expected_calls, any_order=True)
\ No newline at end of file
+    mock_process.kill.assert_not_called()
+    assert psutil.net_connections.call_count == 2  # one scan for owners, one TIME_WAIT poll
+
+    # Both matching rules go in one batch; unrelated rules are left alone
+    assert firewall.batches == [([], ["Portmaster_TCP_8081", "Portmaster_UDP_9999"])]
+    assert list(firewall.rules) == ["Portmaster_TCP_7000"]
+
+def test_cleanup_ports_splits_covering_range_rules(mock_cleanup_deps, tmp_path):
+    """A range rule covering a cleaned port is removed; the rest of the range stays blocked."""
+    firewall = FakeFirewallBackend([
+        FirewallRule("Portmaster_TCP_8080-8090", "block", "TCP", "8080-8090"),
+        FirewallRule("Portmaster_UDP_8000-8100", "block", "UDP", "8000-8100"),
+    ])
+
+    cleanup_ports(ports=[8081], firewall=firewall, log_file=tmp_path / "cleanup_log.txt")
+
+    assert sorted(firewall.rules) == ["Portmaster_TCP_8080", "Portmaster_TCP_8082-8090",
+                                      "Portmaster_UDP_8000-8080", "Portmaster_UDP_8082-8100"]
+    assert len(firewall.batches) == 1
+
+def test_cleanup_ports_netsh_single_batch(mock_cleanup_deps, mocker, tmp_path):
+    """With netsh, rule deletion is one listing plus one script run, not two commands per port."""
+    mock_process, mock_run = mock_cleanup_deps
+    mocker.patch('firewall.NetshBackend.list_rules', return_value=[
+        FirewallRule("Portmaster_TCP_8081", "block", "TCP", 8081),
+        FirewallRule("Portmaster_UDP_9999", "block", "UDP", 9999),
+    ])
+
+    cleanup_ports(ports=[8081, 9999], log_file=tmp_path / "cleanup_log.txt")
+
+    assert mock_run.call_count == 1
+    assert mock_run.call_args[0][0][:2] == ['netsh', '-f']
+
+def test_cleanup_ports_escalates_to_kill(mock_cleanup_deps, mocker, tmp_path):
+    mock_process, _ = mock_cleanup_deps
+    wait_procs = mocker.patch('psutil.wait_procs', side_effect=[([], [mock_process]), ([mock_process], [])])
+
+    cleanup_ports(ports=[8081], firewall=FakeFirewallBackend(), timeout=2, log_file=tmp_path / "cleanup_log.txt")
+
+    mock_process.terminate.assert_called_once()
+    mock_process.kill.assert_called_once()
+    assert wait_procs.call_args_list[0] == call([mock_process], timeout=2)
+
+def test_cleanup_ports_uses_given_core(mock_cleanup_deps):
+    core = MagicMock()
+    core.snapshot.side_effect = ConnectionSnapshot.capture
+    core.terminate_processes.return_value = {5678: ('terminated', 'app')}
+    core.clear_plan.return_value = ([], [])
+
+    cleanup_ports(ports=[8081], core=core)
+
+    core.terminate_processes.assert_called_once_with({5678: {8081}}, timeout=5)
+    core.clear_plan.assert_called_once_with([8081], refresh=True)
+
+def test_cleanup_ports_spares_own_process(mock_cleanup_deps, mocker, tmp_path):
+    """Cleaning a port Portmaster itself serves must not signal Portmaster."""
+    mock_process, _ = mock_cleanup_deps
+    psutil.net_connections.return_value[0].pid = os.getpid()
+    mocker.patch('psutil.wait_procs', return_value=([], []))
+
+    cleanup_ports(ports=[8081], firewall=FakeFirewallBackend(), log_file=tmp_path / "cleanup_log.txt")
+
+    psutil.Process.assert_not_called()
+    mock_process.terminate.assert_not_called()
+
+def test_wait_for_time_wait_polls_until_clear(mock_cleanup_deps, mocker):
+    lingering = MagicMock(laddr=MagicMock(ip='127.0.0.1', port=8081), status=psutil.CONN_TIME_WAIT, pid=None)
+    scan = mocker.patch('psutil.net_connections', side_effect=[[lingering], [lingering], []])
+    core = MagicMock()
+    core.snapshot.side_effect = ConnectionSnapshot.capture
+
+    assert wait_for_time_wait(core, [8081], timeout=30, interval=0.1) == []
+    assert scan.call_count == 3
+
+def test_wait_for_time_wait_gives_up_at_deadline(mocker):
+    mocker.patch('time.sleep')
+    mocker.patch('time.monotonic', side_effect=[0, 0, 10])
+    core = MagicMock()
+    core.snapshot.return_value.owners.return_value = [MagicMock(status=psutil.CONN_TIME_WAIT)]
+
+    assert wait_for_time_wait(core, [8081, 8082], timeout=5) == [8081, 8082]
@@ -0,0 +1,247 @@
+import os
+import pytest
+import socket
+import psutil
+from unittest.mock import MagicMock
+
+from connections import (ConnectionRecord, ConnectionSnapshot, ProcessCache, ProcNetBackend, diff_snapshots, get_backend,
+                         remote_matcher)
+
+
+def make_conn(port, pid=1234, status='ESTABLISHED', sock_type=socket.SOCK_STREAM, ip='127.0.0.1'):
+    """Build a psutil-like connection row."""
+    conn = MagicMock()
+    conn.laddr = MagicMock(ip=ip, port=port)
+    conn.raddr = ()
+    conn.type = sock_type
+    conn.status = status
+    conn.pid = pid
+    return conn
+
+
+def test_snapshot_indexes_by_port_pid_and_state():
+    """Every index of the snapshot answers from the same single scan."""
+    conns = [
+        make_conn(8080, pid=1, status='LISTEN'),
+        make_conn(8080, pid=2),
+        make_conn(53, pid=3, status='NONE', sock_type=socket.SOCK_DGRAM),
+    ]
+    snapshot = ConnectionSnapshot(conns)
+
+    assert len(snapshot) == 3
+    assert snapshot.owners(8080) == conns[:2]
+    assert snapshot.owners(9090) == []
+    assert snapshot.in_use(53)
+    assert snapshot.is_listening(8080)
+    assert not snapshot.is_listening(53)
+    assert snapshot.pid_on_port(8080, 2)
+    assert not snapshot.pid_on_port(8080, 3)
+    assert snapshot.for_pid(3) == [conns[2]]
+    assert snapshot.with_state('UDP', 'NONE') == [conns[2]]
+
+
+def test_snapshot_select():
+    established = make_conn(50000, pid=1)
+    established.raddr = MagicMock(ip='10.0.0.1', port=443)
+    conns = [
+        make_conn(8080, pid=1, status='LISTEN'),
+        established,
+        make_conn(53, pid=2, status='NONE', sock_type=socket.SOCK_DGRAM),
+    ]
+    snapshot = ConnectionSnapshot(conns)
+
+    assert snapshot.select() == conns
+    assert snapshot.select(pid=1) == conns[:2]
+    assert snapshot.select(pid=1, state='listen') == [conns[0]]
+    assert snapshot.select(protocol='UDP') == [conns[2]]
+    assert snapshot.select(protocol='TCP', state='ESTABLISHED', port=50000) == [established]
+    assert snapshot.select(remote='10.0.0.1:443') == [established]
+    assert snapshot.select(port=8080, pid=2) == []
+
+@pytest.mark.parametrize("spec, matches", [
+    ("10.0.0.1", True), ("10.0.0.1:443", True), (":443", True), (":80", False),
+    ("10.0.0.2", False), ("[::1]:443", False),
+])
+def test_remote_matcher(spec, matches):
+    conn = make_conn(50000)
+    conn.raddr = MagicMock(ip='10.0.0.1', port=443)
+    assert remote_matcher(spec)(conn) is matches
+    assert remote_matcher(spec)(make_conn(50000)) is False  # no remote end
+
+def test_snapshot_skips_rows_without_local_address():
+    conn = make_conn(8080)
+    conn.laddr = ()
+    snapshot = ConnectionSnapshot([conn])
+    assert len(snapshot) == 0
+    assert not snapshot.in_use(8080)
+
+
+def test_capture_scans_once(mocker):
+    mock_scan = mocker.patch('psutil.net_connections', return_value=[make_conn(8080)])
+    snapshot = ConnectionSnapshot.capture()
+    for port in range(8000, 8100):
+        snapshot.in_use(port)
+    mock_scan.assert_called_once_with(kind='inet')
+
+
+def test_find_free_port_scans_once_across_retries(mocker):
+    """Retries reuse the snapshot instead of re-walking the socket table."""
+    from core import find_free_port
+
+    mocker.patch('core.log_message')
+    sockets = [MagicMock(), MagicMock()]
+    sockets[0].getsockname.return_value = ('127.0.0.1', 8080)
+    sockets[1].getsockname.return_value = ('127.0.0.1', 8081)
+    mocker.patch('socket.socket', side_effect=sockets)
+    mock_scan = mocker.patch('psutil.net_connections',
+                             return_value=[make_conn(8080, status=psutil.CONN_LISTEN)])
+
+    port, sock = find_free_port()
+
+    assert port == 8081
+    assert sock is sockets[1]
+    sockets[0].close.assert_called_once()
+    mock_scan.assert_called_once()
+
+
+def test_connection_record_formats_lazily():
+    conn = make_conn(8080, pid=None, status=psutil.CONN_NONE, sock_type=socket.SOCK_DGRAM)
+    record = ConnectionRecord.from_conn(conn, "System Idle Process")
+
+    assert not hasattr(record, '__dict__')
+    assert record.local_port == 8080
+    assert record.as_dict() == {
+        "Protocol": "UDP", "Local Address": "127.0.0.1:8080", "Remote Address": "N/A",
+        "Status": "N/A", "PID": 0, "Process Name": "System Idle Process",
+    }
+
+
+def test_diff_snapshots():
+    kept = make_conn(8080, status='LISTEN')
+    closing_before = make_conn(50000, status='ESTABLISHED')
+    closing_before.raddr = MagicMock(ip='10.0.0.1', port=443)
+    closing_after = make_conn(50000, status='TIME_WAIT', pid=None)
+    closing_after.raddr = closing_before.raddr
+    gone = make_conn(9090)
+    new = make_conn(7070)
+
+    diff = diff_snapshots(ConnectionSnapshot([kept, closing_before, gone]),
+                          ConnectionSnapshot([kept, closing_after, new]))
+
+    assert diff.added == [new]
+    assert diff.removed == [gone]
+    assert diff.changed == [(closing_before, closing_after)]
+    assert len(diff) == 3
+    assert not diff_snapshots(ConnectionSnapshot([kept]), ConnectionSnapshot([kept]))
+
+
+def make_process(name, create_time=1000.0):
+    process = MagicMock()
+    process.name.return_value = name
+    process.create_time.return_value = create_time
+    return process
+
+
+def test_process_cache_resolves_each_pid_once(mocker):
+    mock_process = mocker.patch('psutil.Process', return_value=make_process('python.exe'))
+    cache = ProcessCache()
+
+    names = cache.names([1234, 1234, 1234, 0])
+    assert names == {1234: 'python.exe', 0: 'System Idle Process'}
+    assert mock_process.return_value.name.call_count == 1
+
+    cache.names([1234])
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 1024}
+
+
+def test_process_cache_detects_recycled_pid(mocker):
+    cache = ProcessCache()
+    mocker.patch('psutil.Process', return_value=make_process('old.exe', create_time=1.0))
+    assert cache.name(42) == 'old.exe'
+    mocker.patch('psutil.Process', return_value=make_process('new.exe', create_time=2.0))
+    assert cache.name(42) == 'new.exe'
+    assert cache.misses == 2
+
+
+def test_process_cache_skips_revalidation_within_a_snapshot(mocker):
+    mock_process = mocker.patch('psutil.Process', return_value=make_process('python.exe'))
+    cache = ProcessCache()
+    first, second = ConnectionSnapshot([]), ConnectionSnapshot([])
+
+    for _ in range(3):
+        assert cache.name(1234, first) == 'python.exe'
+    assert mock_process.call_count == 1  # later lookups in the same snapshot make no system calls
+    cache.name(1234, second)
+    assert mock_process.call_count == 2  # a new snapshot re-checks the create time
+    assert cache.stats()["hits"] == 3
+
+
+def test_process_cache_is_bounded(mocker):
+    mocker.patch('psutil.Process', side_effect=lambda pid: make_process(f"p{pid}"))
+    cache = ProcessCache(maxsize=2)
+    cache.names([1, 2, 3])
+    assert cache.stats()["size"] == 2
+
+
+def test_process_cache_unreadable_process(mocker):
+    mocker.patch('psutil.Process', side_effect=psutil.AccessDenied(7))
+    assert ProcessCache().name(7) == 'N/A'
+
+
+TCP_TABLE = """  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000  1000        0 111 1 0000000000000000 100 0 0 10 0
+   1: 0100007F:1F90 0100007F:D431 01 00000000:00000000 00:00000000 00000000  1000        0 222 1 0000000000000000 20 4 30 10 -1
+   2: 0100007F:D431 0100007F:1F90 06 00000000:00000000 03:00001770 00000000     0        0 0 3 0000000000000000
+"""
+
+UDP6_TABLE = """  sl  local_address                         remote_address                        st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode ref pointer drops
+  0: 00000000000000000000000001000000:0035 00000000000000000000000000000000:0000 07 00000000:00000000 00:00000000 00000000   100        0 333 2 0000000000000000 0
+"""
+
+
+@pytest.fixture
+def fake_proc(tmp_path):
+    """A minimal /proc tree with two sockets owned by PID 4242."""
+    net = tmp_path / "net"
+    net.mkdir()
+    (net / "tcp").write_text(TCP_TABLE)
+    (net / "udp6").write_text(UDP6_TABLE)
+    fd_dir = tmp_path / "4242" / "fd"
+    fd_dir.mkdir(parents=True)
+    (fd_dir / "3").symlink_to("socket:[111]")
+    (fd_dir / "4").symlink_to("socket:[333]")
+    (fd_dir / "5").symlink_to("/dev/null")
+    return tmp_path
+
+
+def test_procnet_backend_parses_tables(fake_proc):
+    rows = ProcNetBackend(root=str(fake_proc)).connections()
+    assert [(r.laddr, tuple(r.raddr), r.status) for r in rows] == [
+        (('127.0.0.1', 8080), (), psutil.CONN_LISTEN),
+        (('127.0.0.1', 8080), ('127.0.0.1', 54321), psutil.CONN_ESTABLISHED),
+        (('127.0.0.1', 54321), ('127.0.0.1', 8080), psutil.CONN_TIME_WAIT),
+        (('::1', 53), (), psutil.CONN_NONE),
+    ]
+    assert rows[3].type == socket.SOCK_DGRAM
+
+
+def test_procnet_backend_resolves_pids_lazily(fake_proc, mocker):
+    scandir = mocker.patch('os.scandir', wraps=os.scandir)
+    snapshot = ConnectionSnapshot.capture(ProcNetBackend(root=str(fake_proc)))
+
+    assert snapshot.is_listening(8080)
+    assert snapshot.in_use(53)
+    scandir.assert_not_called()
+
+    assert [conn.pid for conn in snapshot.owners(8080)] == [4242, None]
+    assert snapshot.owners(54321)[0].pid is None  # TIME_WAIT rows have no inode
+    assert len(snapshot.for_pid(4242)) == 2
+    scandir.assert_called_once()
+
+
+def test_get_backend():
+    assert get_backend().name == 'psutil'
+    assert get_backend('psutil').name == 'psutil'
+    assert get_backend('auto').name in ('psutil', 'procnet')
+    with pytest.raises(ValueError):
+        get_backend('winsock')
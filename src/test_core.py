@@ -4,6 +4,12 @@ from unittest.mock import MagicMock, call, mock_open
 import psutil
 import socket
 import json
+import os
+from pathlib import Path
+from core import parse_ports
+from connections import ConnectionRecord
+from reservations import JsonReservationStore
+from firewall import FakeFirewallBackend, FirewallRule
 
 # FIX: Create a mock address object that has .ip and .port attributes, just like the real psutil object.
 laddr_mock = MagicMock()
@@ -39,6 +45,35 @@ def test_list_connections(mock_core, mocker):
     assert conn['Process Name'] == 'python.exe'
     mock_core.log.assert_called_with("Listed 1 connections")
 
+def test_list_records(mock_core, mocker):
+    """Test that records keep raw fields and match the dict adapter."""
+    mocker.patch('psutil.net_connections', return_value=[MOCK_CONN])
+    mocker.patch('psutil.Process', return_value=MOCK_PROCESS)
+
+    records = mock_core.list_records()
+    assert len(records) == 1
+    record = records[0]
+    assert (record.local_ip, record.local_port, record.remote_port) == ('127.0.0.1', 8080, 12345)
+    assert record.as_dict() == mock_core.list_connections()[0]
+
+def test_list_filters_before_name_lookup(mock_core, mocker):
+    """Only rows passing the socket filters get a process name; --limit stops early."""
+    conns = []
+    for port, pid in [(8080, 1), (8081, 2), (8082, 3), (8083, 3)]:
+        conn = MagicMock(pid=pid, status='LISTEN', type=socket.SOCK_STREAM, raddr=())
+        conn.laddr = MagicMock(ip='127.0.0.1', port=port)
+        conns.append(conn)
+    mocker.patch('psutil.net_connections', return_value=conns)
+    process = mocker.patch('psutil.Process', side_effect=lambda pid: MagicMock(**{'name.return_value': f"app{pid}"}))
+
+    assert [r.local_port for r in mock_core.list_records(pid=3)] == [8082, 8083]
+    assert [call.args[0] for call in process.call_args_list] == [3]
+
+    assert [r.local_port for r in mock_core.list_records(process="APP", limit=2)] == [8080, 8081]
+    assert [r.local_port for r in mock_core.list_records(port=8081, protocol='TCP', state='listen')] == [8081]
+    assert mock_core.list_records(protocol='UDP') == []
+    assert mock_core.list_records(limit=0) == []
+
 @pytest.mark.parametrize("port, in_use, expected_msg", [
     ("8080", True, "Port 8080 is in use by PID 1234 (python.exe)"),
     ("9090", False, "Port 9090 is not in use")
@@ -55,6 +90,61 @@ def test_check_port(mock_core, mocker, port, in_use, expected_msg):
     assert output == expected_msg
     assert rc == 0
 
+@pytest.mark.parametrize("spec, expected", [
+    ("8080", [8080]),
+    ("8000-8003,9443", [8000, 8001, 8002, 8003, 9443]),
+    (["9443", "8001-8002", 8001], [8001, 8002, 9443]),
+])
+def test_parse_ports(spec, expected):
+    assert parse_ports(spec) == expected
+
+@pytest.mark.parametrize("spec", ["abc", "0", "70000", "9-3", "", "1-99999"])
+def test_parse_ports_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_ports(spec)
+
+def test_check_ports(mock_core, mocker):
+    """Test checking a port range from a single scan."""
+    mock_scan = mocker.patch('psutil.net_connections', return_value=[MOCK_CONN])
+    mocker.patch('psutil.Process', return_value=MOCK_PROCESS)
+
+    output, rc = mock_core.check_ports("8079-8081")
+
+    assert rc == 0
+    assert "8080    in use  1234 (python.exe) TCP ESTABLISHED" in output
+    assert "8079    free" in output
+    assert output.endswith("1 of 3 ports in use")
+    mock_scan.assert_called_once()
+
+def test_check_ports_json(mock_core, mocker):
+    mocker.patch('psutil.net_connections', return_value=[MOCK_CONN])
+    mocker.patch('psutil.Process', return_value=MOCK_PROCESS)
+
+    output, rc = mock_core.check_ports(["8080", "9090"], as_json=True)
+
+    assert rc == 0
+    assert json.loads(output) == {
+        "8080": [{"Protocol": "TCP", "Status": "ESTABLISHED", "PID": 1234, "Process Name": "python.exe"}],
+        "9090": [],
+    }
+
+def test_check_ports_invalid(mock_core):
+    output, rc = mock_core.check_ports("9000-8000")
+    assert output.startswith("Error")
+    assert rc == 1
+
+def test_watch(mock_core, mocker):
+    """Test that watch streams only the connections that changed."""
+    mocker.patch('time.sleep')
+    mocker.patch('psutil.Process', return_value=MOCK_PROCESS)
+    mocker.patch('psutil.net_connections', side_effect=[[], [MOCK_CONN], [MOCK_CONN], []])
+
+    events = list(mock_core.watch(interval=0, count=3))
+
+    assert [e["Event"] for e in events] == ["added", "removed"]
+    assert events[0]["Local Address"] == "127.0.0.1:8080"
+    assert events[0]["Process Name"] == "python.exe"
+
 @pytest.mark.parametrize("port, expected_rc", [("abc", 1), ("99999", 1)])
 def test_check_port_invalid(mock_core, port, expected_rc):
     """Test check_port with invalid input."""
@@ -86,6 +176,89 @@ def test_kill_process_not_exist(mock_core, mocker):
     assert "does not exist" in output
     assert rc == 1
 
+def fake_processes(mocker, stubborn=(), denied=()):
+    """psutil.Process stand-ins; PIDs in ``stubborn`` ignore terminate but die on kill."""
+    processes = {}
+
+    def make(pid):
+        if pid in denied:
+            raise psutil.AccessDenied(pid)
+        process = MagicMock(pid=pid)
+        process.name.return_value = f"app{pid}"
+        processes[pid] = process
+        return process
+
+    def wait_procs(procs, timeout=None):
+        gone = [p for p in procs if p.pid not in stubborn or p.kill.called]
+        return gone, [p for p in procs if p not in gone]
+
+    mocker.patch('psutil.Process', side_effect=make)
+    return processes, mocker.patch('psutil.wait_procs', side_effect=wait_procs)
+
+def test_kill_processes_waits_once_and_escalates(mock_core, mocker):
+    processes, wait_procs = fake_processes(mocker, stubborn={102})
+
+    output, rc = mock_core.kill_processes(["101", "102", "103"], confirm=True)
+
+    assert rc == 0
+    assert output.splitlines() == [
+        "PID 101: terminated (app101)",
+        "PID 103: terminated (app103)",
+        "PID 102: killed (app102)",
+        "3 of 3 processes stopped",
+    ]
+    assert wait_procs.call_count == 2  # one wait for everything, one for the straggler
+    assert [p.pid for p in wait_procs.call_args_list[1][0][0]] == [102]
+    processes[101].kill.assert_not_called()
+
+def test_kill_processes_reports_failures(mock_core, mocker):
+    fake_processes(mocker, denied={7})
+
+    output, rc = mock_core.kill_processes([7, 8], confirm=True)
+
+    assert rc == 1
+    assert output.splitlines()[-1] == "1 of 2 processes stopped"
+    assert mock_core.kill_processes([0, 8], confirm=True)[1] == 1
+    assert mock_core.kill_processes([8], confirm=False)[1] == 2
+
+def test_kill_port_uses_one_snapshot(mock_core, mocker):
+    conns = []
+    for port, pid in [(8080, 11), (8081, 11), (8082, 12), (9000, 13)]:
+        conn = MagicMock(pid=pid, status='LISTEN', type=socket.SOCK_STREAM)
+        conn.laddr = MagicMock(ip='127.0.0.1', port=port)
+        conns.append(conn)
+    scan = mocker.patch('psutil.net_connections', return_value=conns)
+    processes, wait_procs = fake_processes(mocker)
+
+    output, rc = mock_core.kill_port(["8080-8082"], confirm=True)
+
+    assert rc == 0
+    assert output.splitlines() == [
+        "PID 11 on port(s) 8080-8081: terminated (app11)",
+        "PID 12 on port(s) 8082: terminated (app12)",
+        "2 of 2 processes stopped",
+    ]
+    scan.assert_called_once()
+    wait_procs.assert_called_once()
+    assert 13 not in processes
+    assert mock_core.kill_port("7000", confirm=True) == ("No process owns port(s) 7000", 0)
+
+def test_kill_port_spares_own_process(mock_core, mocker):
+    conns = []
+    for port, pid in [(8080, os.getpid()), (8081, 21)]:
+        conn = MagicMock(pid=pid, status='LISTEN', type=socket.SOCK_STREAM)
+        conn.laddr = MagicMock(ip='127.0.0.1', port=port)
+        conns.append(conn)
+    mocker.patch('psutil.net_connections', return_value=conns)
+    processes, _ = fake_processes(mocker)
+
+    output, rc = mock_core.kill_port("8080-8081", confirm=True)
+
+    assert rc == 0 and list(processes) == [21]
+    mock_core.invalidate_snapshot()
+    output, rc = mock_core.kill_port("8080", confirm=True)
+    assert rc == 1 and "stop-server" in output
+
 @pytest.mark.parametrize("protocol", ["TCP", "UDP"])
 def test_block_port(mock_core, mocker, protocol):
     """Test blocking a port."""
@@ -118,18 +291,15 @@ def test_unblock_port(mock_core, mocker, protocol):
     ]
     mock_run.assert_called_once_with(expected_cmd, capture_output=True, text=True)
     
-def test_reserve_port(mock_core, mocker):
+def test_reserve_port(mock_core, mocker, tmp_path):
     """Test port reservation logic."""
     # FIX: Ensure the mock returns a success code (0).
     mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0))
-    mock_json_dump = mocker.patch('json.dump')
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
     exe_path = r"C:\Windows\System32\notepad.exe"
     port = "8888"
     protocol = "TCP"
 
-    m = mock_open(read_data='{}')
-    mocker.patch('builtins.open', m)
-
     output, rc = mock_core.reserve_port(port, protocol, exe_path, confirm=True)
     
     assert f"Reserved {protocol} port {port}" in output
@@ -141,38 +311,268 @@ def test_reserve_port(mock_core, mocker):
     ]
     mock_run.assert_called_once_with(expected_cmd, capture_output=True, text=True)
     
-    m.assert_called_with(mock_core.config_file, 'w')
-    mock_json_dump.assert_called_once_with(
-        {port: {'protocol': protocol, 'exe_path': exe_path}},
-        m()
-    )
+    assert json.loads((tmp_path / "port_reservations.json").read_text()) == {
+        port: {'protocol': protocol, 'exe_path': exe_path}
+    }
+
+def test_reserve_port_firewall_failure_not_persisted(mock_core, mocker, tmp_path):
+    mocker.patch('subprocess.run', return_value=MagicMock(returncode=1, stderr="denied"))
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
 
-def test_release_port(mock_core, mocker):
+    output, rc = mock_core.reserve_port("8888", "TCP", "C:\\path.exe", confirm=True)
+
+    assert rc == 1
+    assert not (tmp_path / "port_reservations.json").exists()
+
+def test_release_port(mock_core, mocker, tmp_path):
     """Test releasing a reserved port."""
     port = "8888"
     protocol = "TCP"
-    mock_config = {port: {'protocol': protocol, 'exe_path': 'C:\\path.exe'}}
-    mocker.patch('json.load', return_value=mock_config)
+    store = JsonReservationStore(tmp_path / "port_reservations.json")
+    with store.transaction() as config:
+        config[port] = {'protocol': protocol, 'exe_path': 'C:\\path.exe'}
+    mock_core.reservations = store
     
-    mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout="Ok."))
-    # FIX: Assign the mock_open instance to a variable to reference it later.
-    m = mock_open()
-    mocker.patch('builtins.open', m)
-    mock_json_dump = mocker.patch('json.dump')
+    mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout="Ok."))
 
     output, rc = mock_core.release_port(port, confirm=True)
     
     assert f"Released {protocol} port {port}" in output
     assert rc == 0
-    
-    # FIX: Assert against the mock instance's file handle `m()`.
-    mock_json_dump.assert_called_once_with({}, m())
+    mock_run.assert_called_once_with(
+        ['netsh', 'advfirewall', 'firewall', 'delete', 'rule', f'name=Portmaster_{protocol}_{port}'],
+        capture_output=True, text=True)
+    assert json.loads((tmp_path / "port_reservations.json").read_text()) == {}
+
+def test_release_port_not_reserved(mock_core, tmp_path):
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    output, rc = mock_core.release_port("8888", confirm=True)
+    assert "not reserved" in output
+    assert rc == 1
+
+@pytest.fixture
+def netsh_scripts(mocker):
+    """Capture the script of every batched `netsh -f` call."""
+    scripts = []
+    def run(cmd, **kwargs):
+        assert cmd[:2] == ['netsh', '-f']
+        scripts.append(Path(cmd[2]).read_text().splitlines())
+        return MagicMock(returncode=run.returncodes.pop(0) if run.returncodes else 0, stderr="", stdout="Ok.")
+    run.returncodes = []
+    mocker.patch('subprocess.run', side_effect=run)
+    return scripts, run
+
+def test_reserve_many(mock_core, tmp_path, netsh_scripts):
+    """Test reserving a range with one firewall batch and one config write."""
+    scripts, run = netsh_scripts
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    transaction = MagicMock(wraps=mock_core.reservations.transaction)
+    mock_core.reservations.transaction = transaction
+
+    output, rc = mock_core.reserve_many("8000-8002", "TCP", "/usr/bin/app", confirm=True)
+
+    assert (output, rc) == ("Reserved 3 TCP ports", 0)
+    assert scripts == [[
+        f'advfirewall firewall add rule name="Portmaster_TCP_{port}" dir=in action=allow '
+        f'protocol=TCP localport={port} program="/usr/bin/app"' for port in (8000, 8001, 8002)
+    ]]
+    transaction.assert_called_once()
+    assert sorted(mock_core.reservations.all()) == ["8000", "8001", "8002"]
+
+def test_reserve_many_rolls_back(mock_core, tmp_path, netsh_scripts):
+    scripts, run = netsh_scripts
+    run.returncodes = [1]
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+
+    output, rc = mock_core.reserve_many("8000,8001", "UDP", "/usr/bin/app", confirm=True)
+
+    assert rc == 1
+    assert "rolled back" in output
+    assert scripts[1] == ['advfirewall firewall delete rule name="Portmaster_UDP_8000"',
+                          'advfirewall firewall delete rule name="Portmaster_UDP_8001"']
+    assert len(mock_core.reservations) == 0
+
+def test_reserve_many_validates_up_front(mock_core, tmp_path, netsh_scripts):
+    scripts, run = netsh_scripts
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    with mock_core.reservations.transaction() as config:
+        config["8001"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/other'}
+
+    output, rc = mock_core.reserve_many("8000-8002", "TCP", "/usr/bin/app", confirm=True)
+
+    assert rc == 1
+    assert "8001" in output
+    assert scripts == []
+
+def test_release_many(mock_core, tmp_path, netsh_scripts):
+    scripts, run = netsh_scripts
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    with mock_core.reservations.transaction() as config:
+        config["8000"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+        config["8001"] = {'protocol': 'UDP', 'exe_path': '/usr/bin/app'}
+
+    output, rc = mock_core.release_many("8000-8001", confirm=True)
+
+    assert (output, rc) == ("Released 2 ports", 0)
+    assert scripts == [['advfirewall firewall delete rule name="Portmaster_TCP_8000"',
+                        'advfirewall firewall delete rule name="Portmaster_UDP_8001"']]
+    assert len(mock_core.reservations) == 0
+
+def test_release_many_rolls_back(mock_core, tmp_path, netsh_scripts):
+    scripts, run = netsh_scripts
+    run.returncodes = [1]
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    with mock_core.reservations.transaction() as config:
+        config["8000"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+        config["8001"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+
+    output, rc = mock_core.release_many("8000-8001", confirm=True)
+
+    assert rc == 1
+    assert scripts[1] == [f'advfirewall firewall delete rule name="Portmaster_TCP_{port}"' for port in (8000, 8001)] + [
+        f'advfirewall firewall add rule name="Portmaster_TCP_{port}" dir=in action=allow '
+        f'protocol=TCP localport={port} program="/usr/bin/app"' for port in (8000, 8001)]
+    assert "8000" in mock_core.reservations
+
+def test_reserve_many_fake_firewall_rolls_back_on_config_failure(mock_core, tmp_path, mocker):
+    """A failed config write removes the rules an atomic backend already added."""
+    mock_core.firewall = FakeFirewallBackend()
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    mocker.patch.object(JsonReservationStore, '_write', side_effect=OSError("disk full"))
+
+    output, rc = mock_core.reserve_many("8000-8004", "TCP", "/usr/bin/app", confirm=True)
+
+    assert rc == 1
+    assert "disk full" in output
+    assert mock_core.firewall.list_rules() == []
+    assert len(mock_core.firewall.batches) == 2
+
+def test_block_unblock_with_fake_firewall(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+    assert mock_core.block_port("8080", "UDP", confirm=True) == ("Blocked UDP port 8080", 0)
+    assert mock_core.check_firewall_rule("Portmaster_UDP_8080")
+    assert mock_core.unblock_port("8080", "UDP", confirm=True) == ("Unblocked UDP port 8080", 0)
+    assert not mock_core.check_firewall_rule("Portmaster_UDP_8080")
+    output, rc = mock_core.unblock_port("8080", "UDP", confirm=True)
+    assert rc == 1
+
+def test_block_range_uses_one_rule_per_run(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+
+    output, rc = mock_core.block_port("8000-8999,9000-9999,9443,22", "TCP", confirm=True)
+
+    assert (output, rc) == ("Blocked TCP ports 22,8000-9999", 0)
+    assert sorted(rule.name for rule in mock_core.firewall.list_rules()) == [
+        "Portmaster_TCP_22", "Portmaster_TCP_8000-9999"]
+    assert len(mock_core.firewall.batches) == 1
+    assert [r.name for r in mock_core.blocking_rules(8500, "TCP")] == ["Portmaster_TCP_8000-9999"]
+    assert mock_core.blocking_rules(8500, "UDP") == []
+
+def test_unblock_part_of_range_splits_rule(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+    mock_core.block_port("8000-8010", "UDP", confirm=True)
+
+    output, rc = mock_core.unblock_port("8003-8004,8010", "UDP", confirm=True)
+
+    assert (output, rc) == ("Unblocked UDP ports 8003-8004,8010", 0)
+    assert sorted(rule.ports for rule in mock_core.firewall.list_rules()) == ["8000-8002", "8005-8009"]
+
+def test_unblock_exact_range_rule(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+    mock_core.block_port("8000-8010", "TCP", confirm=True)
+    assert mock_core.unblock_port("8000-8010", "TCP", confirm=True) == ("Unblocked TCP ports 8000-8010", 0)
+    assert mock_core.firewall.dumps == 0  # deleted by name, no ruleset dump
+    assert mock_core.firewall.rules == {}
+
+def test_unblock_unblocked_port(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+    output, rc = mock_core.unblock_port("8080", "TCP", confirm=True)
+    assert rc == 1
+    assert "no Portmaster rule" in output
+
+@pytest.mark.parametrize("port", ["abc", "0", "9000-8000"])
+def test_block_port_invalid(mock_core, port):
+    output, rc = mock_core.block_port(port, "TCP", confirm=True)
+    assert output.startswith("Error")
+    assert rc == 1
+
+def test_list_firewall_rules(mock_core):
+    mock_core.firewall = FakeFirewallBackend()
+    mock_core.block_port("8080", "TCP", confirm=True)
+    output, rc = mock_core.list_firewall_rules(as_json=True)
+    assert rc == 0
+    assert json.loads(output) == [
+        {"Name": "Portmaster_TCP_8080", "Action": "block", "Protocol": "TCP", "Ports": "8080", "Program": None}
+    ]
+
+@pytest.fixture
+def drifted(mock_core, tmp_path):
+    """Reservations for 8080 and 8081; the firewall misses 8081, has a stale 9000 and a wrong 8080."""
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    with mock_core.reservations.transaction() as config:
+        config["8080"] = {"protocol": "TCP", "exe_path": "/usr/bin/app"}
+        config["8081"] = {"protocol": "UDP", "exe_path": "/usr/bin/app"}
+    mock_core.firewall = FakeFirewallBackend([
+        FirewallRule("Portmaster_TCP_8080", "allow", "TCP", 8080, "/usr/bin/old"),
+        FirewallRule("Portmaster_TCP_9000", "allow", "TCP", 9000, "/usr/bin/app"),
+        FirewallRule("Portmaster_TCP_7000", "block", "TCP", 7000),
+    ])
+    return mock_core
+
+def test_reconcile(drifted):
+    output, rc = drifted.reconcile(confirm=True)
+
+    assert rc == 0
+    assert output.endswith("Reconciled: 2 added, 2 deleted")
+    assert len(drifted.firewall.batches) == 1
+    assert sorted(drifted.firewall.rules) == ["Portmaster_TCP_7000", "Portmaster_TCP_8080", "Portmaster_UDP_8081"]
+    assert drifted.firewall.rules["Portmaster_TCP_8080"].program == "/usr/bin/app"
+    assert drifted.reconcile(confirm=True) == ("Firewall rules match reservations", 0)
+
+def test_reconcile_dry_run(drifted):
+    output, rc = drifted.reconcile(dry_run=True)
+
+    assert rc == 0
+    assert output.splitlines() == [
+        "- Portmaster_TCP_8080",
+        "- Portmaster_TCP_9000",
+        "+ Portmaster_TCP_8080 (allow TCP 8080 /usr/bin/app)",
+        "+ Portmaster_UDP_8081 (allow UDP 8081 /usr/bin/app)",
+        "2 to add, 2 to delete",
+    ]
+    assert drifted.firewall.batches == []
+    assert drifted.reconcile()[1] == 2
+
+def test_reconcile_ignores_program_when_backend_cannot_match_it(drifted):
+    drifted.firewall.supports_program = False
+    add, delete = drifted.reconcile_plan()
+    assert [rule.name for rule in add] == ["Portmaster_UDP_8081"]
+    assert delete == ["Portmaster_TCP_9000"]
+
+def test_reconcile_scales(mock_core, tmp_path):
+    """Thousands of reservations reconcile with one dump, one batch and set lookups."""
+    import time
+    mock_core.reservations = JsonReservationStore(tmp_path / "port_reservations.json")
+    with mock_core.reservations.transaction() as config:
+        for port in range(20000, 25000):
+            config[str(port)] = {"protocol": "TCP", "exe_path": "/usr/bin/app"}
+    mock_core.firewall = FakeFirewallBackend(
+        FirewallRule(f"Portmaster_TCP_{port}", "allow", "TCP", port, "/usr/bin/app") for port in range(19000, 24000))
+
+    start = time.perf_counter()
+    output, rc = mock_core.reconcile(confirm=True)
+    elapsed = time.perf_counter() - start
+
+    assert (rc, output.splitlines()[-1]) == (0, "Reconciled: 1000 added, 1000 deleted")
+    assert mock_core.firewall.dumps == 1
+    assert len(mock_core.firewall.batches) == 1
+    assert elapsed < 1.0
 
 def test_save_connections(mock_core, mocker):
     """Test saving connections to a file."""
-    mocker.patch.object(mock_core, 'list_connections', return_value=[
-        {"Protocol": "TCP", "Local Address": "a", "Remote Address": "b", "Status": "c", "PID": 1, "Process Name": "d"}
-    ])
+    mocker.patch.object(mock_core, 'iter_records', return_value=iter([
+        ConnectionRecord("TCP", "127.0.0.1", 8080, "127.0.0.1", 12345, "ESTABLISHED", 1, "d")
+    ]))
     
     m = mock_open()
     mocker.patch('builtins.open', m)
@@ -184,4 +584,29 @@ def test_save_connections(mock_core, mocker):
     assert rc == 0
     m.assert_called_once_with(filename, 'w')
     handle = m()
-    assert handle.write.call_count > 3
\ No newline at end of file
+    assert handle.write.call_count > 3
+
+@pytest.mark.parametrize("fmt, expected", [
+    ("csv", "Protocol,Local Address,Remote Address,Status,PID,Process Name\n"
+            "TCP,127.0.0.1:8080,127.0.0.1:12345,ESTABLISHED,1234,python.exe\n"),
+    ("jsonl", json.dumps({"Protocol": "TCP", "Local Address": "127.0.0.1:8080",
+                          "Remote Address": "127.0.0.1:12345", "Status": "ESTABLISHED",
+                          "PID": 1234, "Process Name": "python.exe"}) + "\n"),
+])
+def test_save_connections_formats(mock_core, mocker, tmp_path, fmt, expected):
+    """Test the streaming csv and jsonl exports."""
+    mocker.stopall()
+    mocker.patch('psutil.net_connections', return_value=[MOCK_CONN])
+    mocker.patch('psutil.Process', return_value=MOCK_PROCESS)
+    mocker.patch.object(mock_core, 'log')
+    filename = tmp_path / f"connections.{fmt}"
+
+    output, rc = mock_core.save_connections(filename, fmt=fmt)
+
+    assert rc == 0
+    assert filename.read_text() == expected
+
+def test_save_connections_invalid_format(mock_core):
+    output, rc = mock_core.save_connections("out.xml", fmt="xml")
+    assert "Error" in output
+    assert rc == 1
@@ -0,0 +1,173 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+from pathlib import Path
+import pytest
+from unittest.mock import MagicMock
+
+if not hasattr(socket, 'AF_UNIX'):
+    pytest.skip("needs Unix domain sockets", allow_module_level=True)
+
+from core import PortManagerCore
+from daemon import DaemonClient, DaemonError, PortmasterDaemon, RemoteCore
+
+
+def make_conn(port, pid):
+    conn = MagicMock(pid=pid, status='LISTEN', type=socket.SOCK_STREAM)
+    conn.laddr = MagicMock(ip='127.0.0.1', port=port)
+    return conn
+
+
+@pytest.fixture
+def daemon(tmp_path, mocker):
+    """A daemon with a fake firewall serving on a temporary socket."""
+    scan = mocker.patch('psutil.net_connections', return_value=[make_conn(8080, 1234)])
+    mocker.patch('psutil.Process', return_value=MagicMock(**{'name.return_value': 'python.exe'}))
+    core = PortManagerCore(config_file=tmp_path / "port_reservations.json", firewall='fake',
+                           log_file=tmp_path / "port_logs.txt")
+    daemon = PortmasterDaemon(core, tmp_path / "pm.sock", snapshot_ttl=60)
+    daemon.bind()
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    daemon.scan = scan
+    yield daemon
+    daemon.shutdown()
+    thread.join(5)
+
+
+def test_forwarded_calls_share_warm_state(daemon):
+    remote = RemoteCore(DaemonClient.connect(daemon.path))
+
+    for _ in range(5):
+        assert remote.check_port(8080) == ("Port 8080 is in use by PID 1234 (python.exe)", 0)
+    assert remote.block_port("9000-9010", "TCP", confirm=True) == ("Blocked TCP ports 9000-9010", 0)
+    assert remote.check_firewall_rule("Portmaster_TCP_9000-9010") is True
+    daemon.scan.assert_called_once()  # five checks, one socket-table scan
+
+
+def test_socket_changing_calls_invalidate_snapshot(daemon):
+    client = DaemonClient.connect(daemon.path)
+    client.call('check_port', 8080)
+    client.call('kill_process', 0, confirm=True)
+    client.call('check_port', 8080)
+    assert daemon.scan.call_count == 2
+
+
+def test_errors_and_unknown_methods(daemon):
+    client = DaemonClient.connect(daemon.path)
+    with pytest.raises(DaemonError, match="Unknown method"):
+        client.call('watch')
+    with pytest.raises(DaemonError):
+        client.call('check_port', 1, 2, 3)
+    assert client.call('ping')["pid"] > 0
+    with pytest.raises(AttributeError):
+        RemoteCore(client).snapshot
+
+
+def test_connect_without_daemon(tmp_path):
+    assert DaemonClient.connect(tmp_path / "missing.sock") is None
+    stale = tmp_path / "stale.sock"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(stale))
+    sock.close()  # socket file left behind, nobody listening
+    assert DaemonClient.connect(stale) is None
+
+
+def test_bind_replaces_stale_socket_but_not_live_daemon(daemon, tmp_path):
+    other = PortmasterDaemon(daemon.core, daemon.path)
+    with pytest.raises(RuntimeError, match="already listening"):
+        other.bind()
+
+    stale = tmp_path / "stale.sock"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(stale))
+    sock.close()
+    replacement = PortmasterDaemon(daemon.core, stale)
+    replacement.bind()
+    replacement.server.server_close()
+
+
+def test_socket_is_private_from_the_start(daemon):
+    assert daemon.path.stat().st_mode & 0o777 == 0o600
+    umask = os.umask(0)
+    os.umask(umask)
+    assert umask != 0o177  # the bind-time umask was put back
+
+
+def fake_daemon(path, replies):
+    """Serve a Unix socket that answers each connection's requests with ``replies``, then hangs up"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen(5)
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                for reply in replies:
+                    conn.recv(4096)
+                    conn.sendall(reply)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def broken_daemon(tmp_path):
+    """A daemon socket answering with garbage, like a crashed daemon's leftover"""
+    path = tmp_path / "broken.sock"
+    server = fake_daemon(path, [b"not json\n"])
+    yield path
+    server.close()
+
+
+def test_bad_replies_raise_daemon_error(broken_daemon):
+    client = DaemonClient.connect(broken_daemon)
+    assert not client.alive()
+    client = DaemonClient.connect(broken_daemon)
+    with pytest.raises(DaemonError, match="Bad reply"):
+        client.call('check_port', 1)
+
+
+def test_cli_falls_back_to_in_process_core(broken_daemon, tmp_path):
+    env = dict(os.environ, PORTMASTER_LOG_FILE=str(tmp_path / "log.txt"))
+    result = subprocess.run([sys.executable, 'cli.py', '--socket', str(broken_daemon), 'check-port', '1'],
+                            cwd=Path(__file__).resolve().parent, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith("Port 1 ")
+
+
+def test_cli_reports_failed_forwarded_call(tmp_path):
+    """The daemon answers the ping, then dies mid-call: one error line, no traceback, no local rerun."""
+    path = tmp_path / "dying.sock"
+    server = fake_daemon(path, [b'{"result": {"pid": 1, "uptime": 1}}\n'])
+    env = dict(os.environ, PORTMASTER_LOG_FILE=str(tmp_path / "log.txt"))
+    try:
+        result = subprocess.run([sys.executable, 'cli.py', '--socket', str(path), 'check-port', '1'],
+                                cwd=Path(__file__).resolve().parent, env=env, capture_output=True, text=True)
+    finally:
+        server.close()
+    assert result.returncode == 1
+    assert result.stdout.startswith("Error: Daemon call failed: ")
+    assert result.stdout.count("\n") == 1
+    assert result.stderr == ""
+
+
+def test_cli_works_without_unix_sockets(tmp_path):
+    """On Windows there is no AF_UNIX: the CLI must still run, just without a daemon."""
+    # psutil itself needs AF_UNIX on Linux, so it is loaded before the attribute goes
+    code = ("import psutil, socket, sys; del socket.AF_UNIX; import cli, daemon; "
+            "assert not hasattr(daemon, 'PortmasterDaemon'); "
+            "assert daemon.DaemonClient.connect() is None; "
+            "sys.argv = ['cli.py', '--firewall', 'fake', '--log-file', sys.argv[1]] + sys.argv[2:]; cli.main()")
+    log_file = str(tmp_path / "log.txt")
+    cwd = Path(__file__).resolve().parent
+    result = subprocess.run([sys.executable, '-c', code, log_file, 'rules'], cwd=cwd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    result = subprocess.run([sys.executable, '-c', code, log_file, 'daemon'], cwd=cwd, capture_output=True, text=True)
+    assert result.returncode == 1 and "Unix domain sockets" in result.stdout
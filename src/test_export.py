@@ -0,0 +1,42 @@
+import io
+from unittest.mock import MagicMock
+
+from connections import ConnectionRecord
+from export import EXPORT_FORMATS, TextExporter
+
+
+def make_records(n):
+    for i in range(n):
+        yield ConnectionRecord("TCP", "127.0.0.1", 1024 + i, None, None, "LISTEN", 1, "python")
+
+
+def test_exporter_writes_in_bounded_chunks():
+    f = MagicMock()
+    count = EXPORT_FORMATS['jsonl'](f, chunk_rows=2).export(make_records(5))
+    assert count == 5
+    assert f.write.call_count == 3  # 2 + 2 + 1 rows
+
+
+def test_text_export_layout():
+    f = io.StringIO()
+    TextExporter(f).export(make_records(1))
+    lines = f.getvalue().splitlines()
+    assert lines[0] == "Portmaster Network Connections"
+    assert lines[2].startswith("Protocol  Local Address")
+    assert lines[4] == f"{'TCP':<10}{'127.0.0.1:1024':<25}{'N/A':<25}{'LISTEN':<15}{1:<10}python"
+
+
+def test_export_consumes_records_lazily():
+    """A generator of records is never materialised as a whole."""
+    consumed = []
+
+    def records():
+        for record in make_records(10):
+            consumed.append(record)
+            yield record
+
+    written = []
+    f = MagicMock()
+    f.write.side_effect = lambda chunk: written.append(len(consumed))
+    EXPORT_FORMATS['csv'](f, chunk_rows=4).export(records())
+    assert written == [0, 4, 8, 10]  # header, then one write per chunk
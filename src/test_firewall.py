@@ -0,0 +1,190 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+
+from firewall import (FakeFirewallBackend, FirewallRule, NetshBackend, NftablesBackend,
+                      RuleInventory, get_firewall_backend, rule_name)
+
+
+def block(port, protocol='TCP'):
+    return FirewallRule(rule_name(protocol, port), 'block', protocol, port)
+
+
+def test_get_firewall_backend():
+    assert isinstance(get_firewall_backend(), NetshBackend)
+    assert isinstance(get_firewall_backend('nftables'), NftablesBackend)
+    with pytest.raises(ValueError):
+        get_firewall_backend('pf')
+
+
+def test_fake_backend_batches_are_atomic():
+    fw = FakeFirewallBackend([block(8080)])
+
+    ok, error = fw.apply(add=[block(9090)], delete=["Portmaster_TCP_8080", "Portmaster_TCP_1"])
+    assert not ok
+    assert "Portmaster_TCP_1" in error
+    assert fw.rule_exists("Portmaster_TCP_8080")
+    assert not fw.rule_exists("Portmaster_TCP_9090")
+
+    assert fw.apply(add=[block(9090)], delete=["Portmaster_TCP_8080"]) == (True, "")
+    assert fw.list_rules() == [block(9090)]
+    assert len(fw.batches) == 2
+
+
+def test_netsh_single_rule_uses_one_command(mocker):
+    mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout="Ok.", stderr=""))
+    rule = FirewallRule("Portmaster_TCP_8888", 'allow', 'TCP', 8888, r"C:\Program Files\app.exe")
+
+    assert NetshBackend().apply(add=[rule]) == (True, "")
+    mock_run.assert_called_once_with(
+        ['netsh', 'advfirewall', 'firewall', 'add', 'rule', 'name=Portmaster_TCP_8888', 'dir=in',
+         'action=allow', 'protocol=TCP', 'localport=8888', r'program=C:\Program Files\app.exe'],
+        capture_output=True, text=True)
+
+
+def test_netsh_batch_uses_one_script(mocker, tmp_path):
+    scripts = []
+
+    def run(cmd, **kwargs):
+        scripts.append(open(cmd[2]).read())
+        return MagicMock(returncode=0, stdout="Ok.", stderr="")
+
+    mock_run = mocker.patch('subprocess.run', side_effect=run)
+    rule = FirewallRule("Portmaster_TCP_8888", 'allow', 'TCP', 8888, r"C:\Program Files\app.exe")
+
+    ok, _ = NetshBackend().apply(add=[rule, block(9090)], delete=["Portmaster_UDP_53"])
+
+    assert ok
+    assert mock_run.call_count == 1
+    assert scripts[0].splitlines() == [
+        'advfirewall firewall delete rule name="Portmaster_UDP_53"',
+        'advfirewall firewall add rule name="Portmaster_TCP_8888" dir=in action=allow protocol=TCP '
+        'localport=8888 program="C:\\Program Files\\app.exe"',
+        'advfirewall firewall add rule name="Portmaster_TCP_9090" dir=in action=block protocol=TCP localport=9090',
+    ]
+
+
+NFT_LISTING = {"nftables": [
+    {"metainfo": {"json_schema_version": 1}},
+    {"chain": {"family": "inet", "table": "portmaster", "name": "input", "handle": 1}},
+    {"rule": {"family": "inet", "table": "portmaster", "chain": "input", "handle": 4,
+              "comment": "Portmaster_TCP_8080", "expr": [{"match": {}}, {"drop": None}]}},
+    {"rule": {"family": "inet", "table": "portmaster", "chain": "input", "handle": 5,
+              "comment": "Portmaster_UDP_5353", "expr": [{"match": {}}, {"accept": None}]}},
+]}
+
+
+def test_nftables_list_rules(mocker):
+    mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout=json.dumps(NFT_LISTING)))
+    assert NftablesBackend().list_rules() == [
+        block(8080),
+        FirewallRule("Portmaster_UDP_5353", 'allow', 'UDP', '5353'),
+    ]
+
+
+def test_nftables_batch_is_one_transaction(mocker):
+    listing = MagicMock(returncode=0, stdout=json.dumps(NFT_LISTING))
+    applied = MagicMock(returncode=0, stderr="")
+    mock_run = mocker.patch('subprocess.run', side_effect=[listing, applied])
+
+    ok, _ = NftablesBackend().apply(add=[block(9090), block(53, 'UDP')], delete=["Portmaster_TCP_8080"])
+
+    assert ok
+    assert mock_run.call_count == 2
+    cmd, kwargs = mock_run.call_args
+    assert cmd[0] == ['nft', '-f', '-']
+    assert kwargs['input'].splitlines()[2:] == [
+        'delete rule inet portmaster input handle 4',
+        'add rule inet portmaster input tcp dport 9090 drop comment "Portmaster_TCP_9090"',
+        'add rule inet portmaster input udp dport 53 drop comment "Portmaster_UDP_53"',
+    ]
+
+
+def test_nftables_add_only_skips_listing(mocker):
+    mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stderr=""))
+    assert NftablesBackend().apply(add=[block(9090)])[0]
+    assert mock_run.call_count == 1
+
+
+def test_nftables_delete_unknown_rule(mocker):
+    mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout=json.dumps(NFT_LISTING)))
+    ok, error = NftablesBackend().apply(delete=["Portmaster_TCP_1"])
+    assert not ok
+
+
+NETSH_SHOW = """
+Rule Name:                            Portmaster_TCP_8080
+----------------------------------------------------------------------
+Enabled:                              Yes
+Direction:                            In
+Protocol:                             TCP
+LocalPort:                            8080
+Program:                              Any
+Action:                               Block
+
+Rule Name:                            Portmaster_UDP_8888
+----------------------------------------------------------------------
+Protocol:                             UDP
+LocalPort:                            8888
+Program:                              C:\\Program Files\\app.exe
+Action:                               Allow
+
+Rule Name:                            Core Networking - DHCP
+----------------------------------------------------------------------
+Protocol:                             UDP
+LocalPort:                            67-68
+Action:                               Allow
+Ok.
+"""
+
+
+def test_netsh_parse_rules():
+    assert NetshBackend.parse_rules(NETSH_SHOW) == [
+        block(8080),
+        FirewallRule("Portmaster_UDP_8888", 'allow', 'UDP', '8888', "C:\\Program Files\\app.exe"),
+        FirewallRule("Core Networking - DHCP", 'allow', 'UDP', '67-68'),
+    ]
+
+
+def test_inventory_indexes_by_name_and_port():
+    inventory = RuleInventory(NetshBackend.parse_rules(NETSH_SHOW))
+    assert "Portmaster_TCP_8080" in inventory
+    assert inventory.for_port('TCP', 8080) == [block(8080)]
+    assert inventory.for_port('UDP', 8080) == []
+    assert [r.name for r in inventory.for_port('UDP', 68)] == ["Core Networking - DHCP"]
+    assert len(inventory.portmaster_rules()) == 2
+
+
+def test_netsh_existence_checks_share_one_dump(mocker):
+    mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout=NETSH_SHOW))
+    fw = NetshBackend()
+    for _ in range(50):
+        assert fw.rule_exists("Portmaster_TCP_8080")
+        assert not fw.rule_exists("Portmaster_TCP_9090")
+    mock_run.assert_called_once_with(
+        ['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all', 'dir=in', 'verbose'],
+        capture_output=True, text=True, encoding='utf-8')
+
+
+def test_inventory_invalidated_by_own_changes():
+    fw = FakeFirewallBackend([block(8080)])
+    assert fw.rule_exists("Portmaster_TCP_8080")
+    assert fw.rule_exists("Portmaster_TCP_8080")
+    assert fw.dumps == 1
+
+    fw.apply(delete=["Portmaster_TCP_8080"])
+    assert not fw.rule_exists("Portmaster_TCP_8080")
+    assert fw.dumps == 2
+
+
+def test_inventory_ttl(mocker):
+    fw = FakeFirewallBackend([block(8080)])
+    fw.inventory_ttl = 10
+    clock = mocker.patch('time.monotonic', return_value=100.0)
+    fw.inventory()
+    clock.return_value = 105.0
+    fw.inventory()
+    assert fw.dumps == 1
+    clock.return_value = 111.0
+    fw.inventory()
+    assert fw.dumps == 2
@@ -2,6 +2,7 @@ import pytest
 from PyQt6.QtWidgets import QApplication, QMessageBox, QPushButton
 from PyQt6.QtCore import Qt
 from gui import PortManagerGUI
+from connections import ConnectionRecord
 
 def find_button_by_text(widget, text):
     """Helper to find a button in a widget's children by its text."""
@@ -28,9 +29,9 @@ def test_gui_list_connections(app, qtbot):
     gui, core = app
     
     mock_data = [
-        {"Protocol": "TCP", "Local Address": "a", "Remote Address": "b", "Status": "c", "PID": 1, "Process Name": "d"}
+        ConnectionRecord("TCP", "127.0.0.1", 8080, "127.0.0.1", 12345, "ESTABLISHED", 1, "d")
     ]
-    core.list_connections.return_value = mock_data
+    core.list_records.return_value = mock_data
     
     # FIX: Find the button by its text using a helper function.
     list_button = find_button_by_text(gui, "List Connections")
@@ -40,8 +41,9 @@ def test_gui_list_connections(app, qtbot):
     
     assert gui.connections_table.rowCount() == 1
     assert gui.connections_table.item(0, 0).text() == "TCP"
+    assert gui.connections_table.item(0, 1).text() == "127.0.0.1:8080"
     assert gui.connections_table.item(0, 5).text() == "d"
-    core.list_connections.assert_called_once()
+    core.list_records.assert_called_once()
 
 def test_gui_check_port(app, qtbot):
     """Test the 'Check Port' functionality."""
@@ -73,7 +75,9 @@ def test_gui_kill_process(app, qtbot):
     assert kill_button is not None
     qtbot.mouseClick(kill_button, Qt.MouseButton.LeftButton)
     
-    assert gui.pm_output_text.toPlainText() == "Process 1234 terminated"
+    # Termination runs in a worker thread so the window stays responsive
+    qtbot.waitUntil(lambda: gui.pm_output_text.toPlainText() == "Process 1234 terminated")
+    assert kill_button.isEnabled()
     core.kill_process.assert_called_once_with("1234", confirm=True)
 
 def test_gui_block_port(app, qtbot):
@@ -0,0 +1,84 @@
+import json
+import socket
+import threading
+import time
+import pytest
+
+from loadgen import check_loopback, percentile, run_load
+from server import ServerEngine
+
+
+@pytest.fixture
+def engine():
+    engine = ServerEngine()
+    yield engine
+    engine.close()
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_only_localhost():
+    check_loopback('127.0.0.1')
+    check_loopback('localhost')
+    with pytest.raises(ValueError, match="localhost"):
+        check_loopback('8.8.8.8')
+
+
+@pytest.mark.parametrize("protocol", ["TCP", "UDP"])
+def test_round_trips_against_echo_listener(engine, protocol):
+    listener = engine.start(0, protocol, mode='echo', host='127.0.0.1')
+
+    summary = run_load(listener.port, protocol, concurrency=2, payload=32, duration=0.2).summary()
+
+    assert summary["Requests"] > 0
+    assert summary["Errors"] == 0
+    assert 0 < summary["RTT p50"] <= summary["RTT p95"] <= summary["RTT p99"]
+    assert summary["Connects"] == (2 if protocol == 'TCP' else 0)
+    assert listener.bytes_in == summary["Requests"] * 32
+
+
+def test_late_udp_reply_is_not_taken_for_the_next_one():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+        server.bind(('127.0.0.1', 0))
+
+        def answer_first_request_late():
+            data, addr = server.recvfrom(64)
+            time.sleep(0.3)
+            server.sendto(data, addr)
+
+        thread = threading.Thread(target=answer_first_request_late, daemon=True)
+        thread.start()
+        summary = run_load(server.getsockname()[1], 'UDP', concurrency=1, payload=16, duration=0.8,
+                           timeout=0.2).summary()
+        thread.join()
+
+    assert summary["Requests"] == 0
+    assert summary["Lost"] >= 2
+
+
+def test_discard_listener_measures_connects(engine):
+    listener = engine.start(0, 'TCP', mode='discard', host='127.0.0.1')
+    summary = run_load(listener.port, 'TCP', concurrency=2, duration=0.2).summary()
+    assert summary["Connects"] > 2  # reconnects after every hang-up
+    assert summary["Connect p99"] is not None
+
+
+def test_core_bench_port_serves_echo(tmp_path):
+    from core import PortManagerCore
+    core = PortManagerCore(config_file=tmp_path / "port_reservations.json", firewall='fake',
+                           log_file=tmp_path / "port_logs.txt")
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    output, rc = core.bench_port(port, 'TCP', concurrency=1, duration=0.1, serve=True, as_json=True)
+
+    assert rc == 0
+    assert json.loads(output)["Requests"] > 0
+    assert core.server.listeners == {}
+    assert core.bench_port(port, 'TCP', duration=0)[1] == 1
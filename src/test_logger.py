@@ -0,0 +1,77 @@
+import pytest
+
+from logger import LogWriter, get_log_writer
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = LogWriter(tmp_path / "port_logs.txt")
+    yield writer
+    writer.close()
+
+
+def test_writes_are_timestamped_and_flushed(writer):
+    writer.write("first")
+    writer.write("second")
+    assert writer.flush()
+    lines = writer.path.read_text().splitlines()
+    assert [line.split(" - ", 1)[1] for line in lines] == ["first", "second"]
+    assert len(lines[0].split(" - ", 1)[0]) == len("2024-01-01 12:00:00")
+
+
+def test_bursts_are_written_in_batches(writer, mocker):
+    """Queued messages are appended with far fewer opens than messages."""
+    real_open = open
+    opens = []
+
+    def counting_open(*args, **kwargs):
+        opens.append(args[0])
+        return real_open(*args, **kwargs)
+
+    mocker.patch('builtins.open', side_effect=counting_open)
+    for i in range(500):
+        writer.write(f"message {i}")
+    writer.flush()
+    assert len(writer.path.read_text().splitlines()) == 500
+    assert 1 <= len(opens) < 50
+
+
+def test_rotation(tmp_path):
+    writer = LogWriter(tmp_path / "port_logs.txt", max_bytes=200, backup_count=2)
+    for i in range(20):
+        writer.write(f"message {i:02d}")
+        writer.flush()
+    writer.close()
+
+    assert (tmp_path / "port_logs.txt.1").exists()
+    assert (tmp_path / "port_logs.txt.2").exists()
+    assert not (tmp_path / "port_logs.txt.3").exists()
+    assert (tmp_path / "port_logs.txt").stat().st_size <= 200
+    assert "message 19" in (tmp_path / "port_logs.txt").read_text()
+
+
+def test_rotation_sees_other_writers(tmp_path):
+    """Writers in different processes share one file; each must rotate on its real size."""
+    first = LogWriter(tmp_path / "port_logs.txt", max_bytes=200, backup_count=1)
+    second = LogWriter(tmp_path / "port_logs.txt", max_bytes=200, backup_count=1)
+    for writer in (first, second, first):
+        writer.write("x" * 50)  # 73 bytes with the timestamp
+        writer.flush()
+    first.close()
+    second.close()
+
+    assert (tmp_path / "port_logs.txt.1").stat().st_size == 146
+    assert (tmp_path / "port_logs.txt").stat().st_size == 73
+
+
+def test_close_drains_queue(tmp_path):
+    writer = LogWriter(tmp_path / "port_logs.txt")
+    for i in range(100):
+        writer.write(f"message {i}")
+    writer.close()
+    assert len((tmp_path / "port_logs.txt").read_text().splitlines()) == 100
+
+
+def test_writers_are_shared_per_path(tmp_path):
+    assert get_log_writer(tmp_path / "a.txt") is get_log_writer(tmp_path / "a.txt")
+    assert get_log_writer(tmp_path / "a.txt") is not get_log_writer(tmp_path / "b.txt")
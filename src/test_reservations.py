@@ -0,0 +1,89 @@
+import json
+import multiprocessing
+import pytest
+
+from reservations import JsonReservationStore, SqliteReservationStore, open_store
+
+
+@pytest.fixture(params=["port_reservations.json", "port_reservations.db"])
+def store(request, tmp_path):
+    store = open_store(tmp_path / request.param)
+    yield store
+    if hasattr(store, 'close'):
+        store.close()
+
+
+def test_open_store_picks_backend(tmp_path):
+    assert isinstance(open_store(tmp_path / "r.json"), JsonReservationStore)
+    sqlite_store = open_store(tmp_path / "r.sqlite")
+    assert isinstance(sqlite_store, SqliteReservationStore)
+    sqlite_store.close()
+
+
+def test_transaction_round_trip(store):
+    with store.transaction() as config:
+        config["8080"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+        config["9090"] = {'protocol': 'UDP', 'exe_path': '/usr/bin/app'}
+    assert store.get(8080) == {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+    assert "9090" in store
+    assert len(store) == 2
+
+    with store.transaction() as config:
+        del config["8080"]
+    assert store.get("8080") is None
+    assert store.all() == {"9090": {'protocol': 'UDP', 'exe_path': '/usr/bin/app'}}
+
+
+def test_failed_transaction_is_not_persisted(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction() as config:
+            config["8080"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+            raise RuntimeError("firewall failed")
+    assert len(store) == 0
+
+
+def test_changes_from_other_writers_are_seen(store):
+    other = open_store(store.path)
+    assert len(store) == 0
+    with other.transaction() as config:
+        config["8080"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+    assert "8080" in store
+    if hasattr(other, 'close'):
+        other.close()
+
+
+def test_json_reads_are_cached(tmp_path, mocker):
+    store = JsonReservationStore(tmp_path / "port_reservations.json")
+    with store.transaction() as config:
+        config["8080"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+    read = mocker.spy(type(store.path), 'read_text')
+    for _ in range(10):
+        store.get(8080)
+    read.assert_not_called()
+
+
+def test_json_write_is_atomic(tmp_path):
+    store = JsonReservationStore(tmp_path / "port_reservations.json")
+    with store.transaction() as config:
+        config["8080"] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+    assert json.loads((tmp_path / "port_reservations.json").read_text()) == store.all()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def _reserve_many(path, start):
+    store = open_store(path)
+    for port in range(start, start + 25):
+        with store.transaction() as config:
+            config[str(port)] = {'protocol': 'TCP', 'exe_path': '/usr/bin/app'}
+
+
+@pytest.mark.parametrize("name", ["port_reservations.json", "port_reservations.db"])
+def test_concurrent_processes_do_not_lose_updates(tmp_path, name):
+    path = tmp_path / name
+    workers = [multiprocessing.Process(target=_reserve_many, args=(path, start))
+               for start in (1000, 2000, 3000, 4000)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert len(open_store(path)) == 100
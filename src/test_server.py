@@ -0,0 +1,181 @@
+import json
+import socket
+import time
+import pytest
+
+from server import _BUFFER_SIZE, _PENDING_LIMIT, ServerEngine
+
+
+@pytest.fixture
+def engine():
+    engine = ServerEngine(publish_interval=0.05)
+    yield engine
+    engine.close()
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_tcp_echo_and_sink_listeners(engine):
+    echo = engine.start(0, 'TCP', mode='echo', host='127.0.0.1')
+    sink = engine.start(0, 'TCP', mode='sink', host='127.0.0.1')
+
+    with socket.create_connection(('127.0.0.1', echo.port)) as client:
+        client.sendall(b"x" * 100000)
+        received = b""
+        while len(received) < 100000:
+            received += client.recv(65536)
+    with socket.create_connection(('127.0.0.1', sink.port)) as client:
+        client.sendall(b"y" * 5000)
+
+    wait_for(lambda: sink.bytes_in == 5000 and sink.active == 0)
+    assert received == b"x" * 100000
+    stats = {s["Port"]: s for s in engine.stats()}
+    assert stats[echo.port]["Bytes Out"] == 100000
+    assert stats[sink.port]["Connections"] == 1
+    assert stats[sink.port]["Bytes Out"] == 0
+
+
+def test_echo_stops_reading_from_a_peer_that_does_not_read(engine):
+    echo = engine.start(0, 'TCP', mode='echo', host='127.0.0.1')
+    chunk = b"e" * 65536
+    sent = 0
+    with socket.create_connection(('127.0.0.1', echo.port)) as client:
+        client.setblocking(False)
+        # Without back-pressure the server would swallow all 64 MB; with it,
+        # sends stay blocked once the buffers on both sides are full
+        stalled = None
+        while sent < 64 * 1024 * 1024 and (stalled is None or time.monotonic() - stalled < 0.5):
+            try:
+                sent += client.send(chunk)
+                stalled = None
+            except BlockingIOError:
+                stalled = stalled or time.monotonic()
+                time.sleep(0.01)
+        assert sent < 64 * 1024 * 1024
+        assert echo.bytes_in - echo.bytes_out <= _PENDING_LIMIT + _BUFFER_SIZE
+
+        client.setblocking(True)
+        client.settimeout(5)
+        received = 0
+        while received < sent:
+            received += len(client.recv(1 << 20))
+    assert received == sent
+
+
+def test_udp_and_discard(engine):
+    udp = engine.start(0, 'UDP', mode='echo', host='127.0.0.1')
+    discard = engine.start(0, 'TCP', mode='discard', host='127.0.0.1')
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+        client.settimeout(5)
+        client.sendto(b"ping", ('127.0.0.1', udp.port))
+        assert client.recvfrom(100)[0] == b"ping"
+    for _ in range(3):
+        with socket.create_connection(('127.0.0.1', discard.port)) as client:
+            assert client.recv(10) == b""  # closed straight away
+
+    wait_for(lambda: discard.connections == 3)
+    assert (udp.datagrams, udp.bytes_in) == (1, 4)
+    assert discard.active == 0
+
+
+def test_stop_by_port_frees_it(engine):
+    first = engine.start(0, 'TCP', host='127.0.0.1')
+    second = engine.start(0, 'UDP', host='127.0.0.1')
+
+    assert engine.stop(first.port) == [first]
+    assert [s["Port"] for s in engine.stats()] == [second.port]
+    with socket.socket() as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind(('127.0.0.1', first.port))
+    with pytest.raises(ValueError):
+        engine.start(second.port, 'UDP', host='127.0.0.1')
+    assert engine.stop() == [second]
+
+
+def test_invalid_arguments(engine):
+    with pytest.raises(ValueError):
+        engine.start(0, 'SCTP')
+    with pytest.raises(ValueError):
+        engine.start(0, 'TCP', mode='mirror')
+    assert engine.listeners == {}
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason="needs SO_REUSEPORT")
+def test_reuseport_workers_add_their_counters(engine):
+    listener = engine.start(0, 'UDP', mode='sink', workers=3, host='127.0.0.1')
+    assert len(listener.worker_processes) == 2
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+        for _ in range(200):
+            client.sendto(b"z" * 10, ('127.0.0.1', listener.port))
+
+    wait_for(lambda: engine.stats()[0]["Datagrams"] == 200)
+    assert engine.stats()[0]["Bytes In"] == 2000
+    engine.stop(listener.port)
+    assert not any(process.is_alive() for process in listener.worker_processes)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason="needs SO_REUSEPORT")
+def test_workers_do_not_inherit_other_listeners(engine):
+    first = engine.start(0, 'TCP', host='127.0.0.1')
+    engine.start(0, 'UDP', mode='sink', workers=2, host='127.0.0.1')
+
+    engine.stop(first.port)
+    # A worker holding a copy of the first socket would keep the port in LISTEN
+    with socket.socket() as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind(('127.0.0.1', first.port))
+        probe.listen(1)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason="needs SO_REUSEPORT")
+def test_core_start_fails_if_a_worker_never_gets_ready(tmp_path, mocker):
+    import multiprocessing
+    from core import PortManagerCore
+    context = multiprocessing.get_context('spawn')
+    stop, never_ready = context.Event(), mocker.Mock(**{'wait.return_value': False})
+    worker = mocker.Mock(**{'is_alive.return_value': True})
+    fake = mocker.Mock(Array=context.Array, Event=mocker.Mock(side_effect=[stop, never_ready]),
+                       Process=mocker.Mock(return_value=worker))
+    mocker.patch('server.multiprocessing.get_context', return_value=fake)
+    core = PortManagerCore(config_file=tmp_path / "port_reservations.json", firewall='fake',
+                           log_file=tmp_path / "port_logs.txt")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    output, rc = core.start_server(port, 'UDP', confirm=True, workers=2)
+    assert rc == 1
+    assert "did not start" in output
+    assert core.server.listeners == {}
+    assert stop.is_set()
+    worker.terminate.assert_called_once()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', port))  # the parent's socket was closed
+    core.server.close()
+
+
+def test_core_start_and_stop_by_port(tmp_path):
+    from core import PortManagerCore
+    core = PortManagerCore(config_file=tmp_path / "port_reservations.json", firewall='fake',
+                           log_file=tmp_path / "port_logs.txt")
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    output, rc = core.start_server(port, 'TCP', confirm=True, mode='echo')
+    assert (output, rc) == (f"Started server on TCP port {port} (echo)", 0)
+    assert core.start_server(port, 'TCP', confirm=True)[1] == 1  # already serving
+    assert core.start_server(port, 'UDP', confirm=True)[1] == 0
+    assert [s["Protocol"] for s in json.loads(core.server_stats(port, as_json=True)[0])] == ['TCP', 'UDP']
+
+    assert core.stop_server(port, 'UDP', confirm=True) == (f"Stopped server on UDP {port}", 0)
+    assert core.stop_server(port + 1 if port < 65535 else 1, confirm=True)[1] == 1
+    assert core.stop_server(confirm=True) == (f"Stopped server on TCP {port}", 0)
+    assert core.stop_server(confirm=True) == ("Error: No server running", 1)
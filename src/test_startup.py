@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+import bench_startup
+
+
+def test_cli_startup_within_budget():
+    """Commands must not load ZeroMQ or PyQt before they need them, and their imports must stay within budget.
+
+    Budgets are doubled here so a busy test machine does not fail the run;
+    bench_startup.py applies them as-is.
+    """
+    for name, ms, budget, loaded, returncode in bench_startup.run(repeat=2, scale=2.0, commands=['help', 'check-port', 'bench-zmq', 'gui']):
+        assert returncode == 0, f"{name} exited with {returncode}"
+        assert loaded == [], f"{name} imported {loaded}"
+        assert ms <= budget, f"{name} spent {ms:.1f} ms importing (budget {budget:.0f} ms)"
+
+
+def test_core_loads_zmq_only_for_the_simulation():
+    code = ("import sys, core; assert 'zmq' not in sys.modules; "
+            "core.simulate_zeromq_pub_sub; assert 'zmq' in sys.modules")
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=bench_startup.CLI.parent)
+
+
+def test_crashing_command_fails_the_run(mocker):
+    """A command that dies early imports little; it must not pass as fast."""
+    mocker.patch.dict(bench_startup.COMMANDS, {'broken': (['no-such-command'], 150)})
+    [(name, ms, budget, loaded, returncode)] = bench_startup.run(repeat=1, commands=['broken'])
+    assert returncode != 0
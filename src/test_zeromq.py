@@ -6,15 +6,16 @@ import os
 from datetime import datetime
 import threading
 from pathlib import Path  # Import Path
-from core import find_free_port, simulate_zeromq_pub_sub
+import logger
+from core import benchmark_zeromq_pub_sub, find_free_port, simulate_zeromq_pub_sub
+import zeromq_sim
 
 # Define the root of the test directory
 TEST_ROOT = Path(__file__).resolve().parent
-LOG_FILE = TEST_ROOT / "test_log_zeromq.txt"
 
 def log(message):
-    """Log message to a local test_log_zeromq.txt"""
-    with open(LOG_FILE, 'a') as f:
+    """Log message to test_log_zeromq.txt next to the (per-test) default log file"""
+    with open(logger.DEFAULT_LOG_FILE.with_name("test_log_zeromq.txt"), 'a') as f:
         f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
 
 def is_port_bound(port, retries=10, delay=0.5):
@@ -68,10 +69,18 @@ def test_zeromq_scenarios(scenario):
     port, temp_socket = find_free_port()  # Get port and socket
     log(f"Testing scenario '{scenario}' on port {port}")
 
-    result = {"success": False, "error": None}
+    result = {"success": False, "error": None, "port_bound": False}
+    def check_bound(bound_port):
+        # Called while the sockets are connected, so the port must be listening now
+        result["port_bound"] = is_port_bound(bound_port, retries=3, delay=0.05)
+
     def run_zeromq():
         try:
-            simulate_zeromq_pub_sub(port, test_mode=True, temp_socket=temp_socket)
+            if scenario == "zeromq_throughput":
+                result["benchmark"] = benchmark_zeromq_pub_sub(port, sizes=(64, 65536), count=2000,
+                                                               temp_socket=temp_socket, on_ready=check_bound)
+            else:
+                simulate_zeromq_pub_sub(port, test_mode=True, temp_socket=temp_socket, on_ready=check_bound)
             result["success"] = True
         except Exception as e:
             result["error"] = str(e)
@@ -79,11 +88,8 @@ def test_zeromq_scenarios(scenario):
 
     zmq_thread = threading.Thread(target=run_zeromq)
     zmq_thread.start()
-
-    time.sleep(2)
-    port_bound = is_port_bound(port)
-
     zmq_thread.join(timeout=15)
+    port_bound = result["port_bound"]
 
     if not port_bound:
         log(f"Test for '{scenario}' failed: Port {port} not bound during test")
@@ -93,7 +99,90 @@ def test_zeromq_scenarios(scenario):
         log(f"Test for '{scenario}' failed: {result['error']}")
         pytest.fail(f"Scenario '{scenario}' failed with error: {result['error']}")
 
+    for row in result.get("benchmark", []):
+        log(f"Throughput on port {port}: {row['Size']} B: {row['Msgs/s']} msg/s, {row['MB/s']} MB/s, lost {row['Lost']}")
+        assert row["Received"] == row["Sent"] and row["Msgs/s"] > 0
+
     log(f"Test for scenario '{scenario}' passed on port {port}")
 
+def test_simulation_is_fast_when_ready():
+    """A healthy run is driven by the subscription handshake, not by sleeps."""
+    port, temp_socket = find_free_port()
+    timings = simulate_zeromq_pub_sub(port, temp_socket=temp_socket)
+    assert timings["Port"] == port
+    assert timings["Total ms"] < 500
+
+def test_simulation_fails_fast_without_subscriber():
+    port, temp_socket = find_free_port()
+    other, other_socket = find_free_port()
+    other_socket.close()
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="Subscriber did not connect"):
+        simulate_zeromq_pub_sub(port, sub_port=other, temp_socket=temp_socket, timeout=0.3)
+    assert time.monotonic() - start < 2
+
+def test_benchmark_reports_each_size():
+    results = benchmark_zeromq_pub_sub(sizes=(16, 70000), count=500, batch=10)
+    assert [(r["Size"], r["Zero Copy"], r["Lost"]) for r in results] == [(16, False, 0), (70000, True, 0)]
+    assert all(r["Msgs/s"] > 0 and r["MB/s"] > 0 for r in results)
+
+def test_benchmark_accounts_for_hwm_drops():
+    """PUB drops at the high-water mark; every message is either received or counted as lost."""
+    results = benchmark_zeromq_pub_sub(sizes=(16384,), count=5000, hwm=1)
+    assert results[0]["Received"] + results[0]["Lost"] == 5000
+
+def test_benchmark_sweeps_counts_and_sizes():
+    results = benchmark_zeromq_pub_sub(sizes=(16, 1024), counts=(100, 300))
+    assert [(r["Sent"], r["Size"]) for r in results] == [(100, 16), (100, 1024), (300, 16), (300, 1024)]
+    assert all(r["Received"] == r["Sent"] for r in results)
+    table = zeromq_sim.format_benchmark(results).splitlines()
+    assert table[0].split()[:2] == ["Count", "Size"] and table[3].split()[:2] == ["300", "16"]
+
+def test_benchmark_timeout_stops_receiver_before_closing(mocker):
+    """ZeroMQ sockets are not thread-safe: the receiver must be done before sub_socket closes."""
+    seen = {}
+
+    def stalled_receiver(sub_socket, idle_timeout, stats, stop):
+        stop.wait()  # a receiver still busy when the round's deadline passes
+        seen["closed while receiving"] = sub_socket.closed
+
+    mocker.patch.object(zeromq_sim, '_receive_round', stalled_receiver)
+    with pytest.raises(RuntimeError, match="did not finish"):
+        benchmark_zeromq_pub_sub(sizes=(16,), count=10, timeout=0.5)
+    assert seen == {"closed while receiving": False}
+
+def test_simulations_share_one_context():
+    port, temp_socket = find_free_port()
+    context = zeromq_sim.shared_context()
+    simulate_zeromq_pub_sub(port, temp_socket=temp_socket)
+    assert zeromq_sim.shared_context() is context and not context.closed
+
+def test_pool_checks_many_ports_concurrently():
+    ports = [find_free_port() for _ in range(24)]
+    threads_before = threading.active_count()
+    with zeromq_sim.SimulationPool(workers=6) as pool:
+        results = pool.run(ports)
+        assert threading.active_count() - threads_before <= 6
+    assert [r["Port"] for r in results] == [port for port, _ in ports]
+    assert all("Error" not in r for r in results), results
+
+def test_pool_reports_failures_per_port():
+    (good, good_socket), (busy, busy_socket) = find_free_port(), find_free_port()
+    busy_socket.listen(1)  # still held, so the publisher cannot bind
+    try:
+        results = zeromq_sim.simulate_many([(good, good_socket), busy], timeout=0.3)
+    finally:
+        busy_socket.close()
+    assert "Error" not in results[0]
+    assert results[1]["Port"] == busy and "Address already in use" in results[1]["Error"]
+
+def test_closed_shared_context_is_recreated():
+    context = zeromq_sim.shared_context()
+    zeromq_sim.close_shared_context()
+    assert context.closed
+    port, temp_socket = find_free_port()
+    simulate_zeromq_pub_sub(port, temp_socket=temp_socket)
+    assert zeromq_sim.shared_context() is not context
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
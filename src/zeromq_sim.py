@@ -0,0 +1,314 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import zmq
+from logger import log_message
+
+# I/O threads of the shared context; one is plenty for localhost checks
+IO_THREADS = 1
+_context = None
+_context_pid = None
+_context_lock = threading.Lock()
+
+def shared_context(io_threads=None):
+    """Return the process-wide ZeroMQ context, creating it on first use.
+
+    Every simulation and benchmark uses this context unless given its own,
+    so concurrent runs share one set of ``io_threads`` I/O threads instead
+    of starting and tearing down a context each. ``io_threads`` only applies
+    when the context is created. A child process started with fork gets a
+    fresh context, since a ZeroMQ context must not cross a fork.
+    """
+    global _context, _context_pid
+    with _context_lock:
+        if _context is None or _context.closed or _context_pid != os.getpid():
+            _context = zmq.Context(io_threads=io_threads or IO_THREADS)
+            _context_pid = os.getpid()
+            log_message(f"Created shared ZeroMQ context with {io_threads or IO_THREADS} I/O thread(s)")
+        return _context
+
+def close_shared_context():
+    """Terminate the shared context; the next shared_context() call creates a new one.
+
+    Blocks until every socket opened on it is closed, so stop any
+    SimulationPool first.
+    """
+    global _context, _context_pid
+    with _context_lock:
+        context, _context, _context_pid = _context, None, None
+    if context is not None and not context.closed:
+        context.term()
+        log_message("Terminated shared ZeroMQ context")
+
+def bind_with_retry(zsocket, port, temp_socket=None, host='*', label='PUB', timeout=2.0):
+    """Bind ``zsocket`` to tcp://host:port, retrying with backoff while the port is still in use.
+
+    ``temp_socket`` is the placeholder that reserved the port (see
+    find_free_port); it is closed once the bind has succeeded. Gives up
+    ``timeout`` seconds after the first attempt.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            zsocket.bind(f"tcp://{host}:{port}")
+            if temp_socket:
+                temp_socket.close()  # Close the temporary socket after successful bind
+            log_message(f"Bound {label} socket to tcp://{host}:{port} on attempt {attempt}")
+            return
+        except zmq.error.ZMQError as e:
+            remaining = deadline - time.monotonic()
+            if e.errno != zmq.EADDRINUSE or remaining <= 0:
+                raise
+            log_message(f"Bind failed for port {port}: {str(e)}, retrying in {delay * 1000:.0f}ms")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.2)
+
+def wait_for_subscriber(xpub_socket, deadline):
+    """Block until an XPUB socket reports a subscription or ``deadline`` (time.monotonic) passes.
+
+    The notification means a subscriber has connected and its filter is
+    installed, so nothing published afterwards is lost to the slow-joiner gap.
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not xpub_socket.poll(max(1, int(remaining * 1000))):
+            raise RuntimeError("Subscriber did not connect in time")
+        event = xpub_socket.recv()
+        if event[:1] == b"\x01":  # \x01 + topic = subscribe, \x00 + topic = unsubscribe
+            return
+
+def simulate_zeromq_pub_sub(pub_port, sub_port=None, test_mode=False, temp_socket=None, timeout=2.0,
+                            on_ready=None, context=None):
+    """Simulate ZeroMQ PUB-SUB binding and connection.
+
+    Readiness is event driven: the publisher is an XPUB socket and sends
+    only after it has seen the subscription, then the subscriber waits for
+    the message against the same ``timeout`` deadline. ``on_ready(port)``
+    is called while both sockets are connected. ``test_mode`` is kept for
+    compatibility; no run sleeps any more. Sockets are opened on ``context``
+    (default: the shared context) and closed afterwards. Returns timings in
+    milliseconds.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    context = context or shared_context()
+    pub_socket = context.socket(zmq.XPUB)
+    sub_socket = context.socket(zmq.SUB)
+    try:
+        pub_socket.setsockopt(zmq.LINGER, 0)
+        bind_with_retry(pub_socket, pub_port, temp_socket, timeout=timeout)
+
+        sub_port = sub_port or pub_port
+        sub_socket.setsockopt(zmq.SUBSCRIBE, b"")
+        sub_socket.setsockopt(zmq.LINGER, 0)
+        sub_socket.connect(f"tcp://localhost:{sub_port}")
+        log_message(f"Connected SUB socket to tcp://localhost:{sub_port}")
+
+        wait_for_subscriber(pub_socket, deadline)
+        ready = time.monotonic()
+        if on_ready:
+            on_ready(pub_port)
+        pub_socket.send(b"Test message")
+        remaining = deadline - time.monotonic()
+        if remaining > 0 and sub_socket.poll(max(1, int(remaining * 1000))):
+            message = sub_socket.recv()
+            log_message(f"Received message: {message.decode()}")
+            if message != b"Test message":
+                raise RuntimeError("Failed to receive correct message")
+        else:
+            raise RuntimeError("Failed to receive message")
+        finished = time.monotonic()
+        log_message(f"PUB/SUB round trip on port {pub_port}: ready in {(ready - started) * 1000:.1f}ms, "
+                    f"done in {(finished - started) * 1000:.1f}ms")
+        return {"Port": pub_port, "Ready ms": round((ready - started) * 1000, 3),
+                "Total ms": round((finished - started) * 1000, 3)}
+    except zmq.error.ZMQError as e:
+        log_message(f"ZeroMQ error: {str(e)}")
+        raise
+    finally:
+        pub_socket.close()
+        sub_socket.close()
+
+class SimulationPool:
+    """Run PUB/SUB simulations for many ports at once on one ZeroMQ context.
+
+    At most ``workers`` simulations run concurrently, each with its own
+    pair of sockets on the shared context (or ``context``). Use it as a
+    context manager, or call close() when done; the context itself stays
+    up for later runs until close_shared_context().
+    """
+
+    def __init__(self, workers=8, timeout=2.0, context=None):
+        if workers < 1:
+            raise ValueError("Workers must be at least 1")
+        self.timeout = timeout
+        self.context = context or shared_context()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="portmaster-zmq")
+
+    def submit(self, port, temp_socket=None, on_ready=None):
+        """Schedule one simulation; returns a Future for its timings"""
+        return self._executor.submit(simulate_zeromq_pub_sub, port, temp_socket=temp_socket, timeout=self.timeout,
+                                     on_ready=on_ready, context=self.context)
+
+    def run(self, ports, on_ready=None):
+        """Simulate every port and return one result per port, in order.
+
+        ``ports`` holds port numbers or (port, temp_socket) pairs as returned
+        by find_free_port. A failed port yields {"Port": port, "Error": message}
+        instead of raising, so one busy port does not hide the others.
+        """
+        pending = []
+        for item in ports:
+            port, temp_socket = item if isinstance(item, tuple) else (item, None)
+            pending.append((port, self.submit(port, temp_socket, on_ready)))
+        results = []
+        for port, future in pending:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                log_message(f"ZeroMQ simulation on port {port} failed: {str(e)}")
+                results.append({"Port": port, "Error": str(e)})
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def simulate_many(ports, workers=8, timeout=2.0):
+    """Simulate PUB/SUB on every port concurrently; see SimulationPool.run"""
+    with SimulationPool(workers, timeout) as pool:
+        return pool.run(ports)
+
+# Payloads at least this large are sent as zero-copy frames
+ZERO_COPY_THRESHOLD = 64 * 1024
+_END = b"PORTMASTER-END"
+
+# How often a waiting receiver checks whether it has been told to stop
+_STOP_POLL_MS = 100
+
+def _receive_round(sub_socket, idle_timeout, stats, stop):
+    """Count payload frames until the end marker, ``idle_timeout`` seconds of silence or ``stop`` is set"""
+    received = nbytes = 0
+    last = None
+    idle_ms = 0
+    while not stop.is_set():
+        if not sub_socket.poll(_STOP_POLL_MS):
+            idle_ms += _STOP_POLL_MS
+            if idle_ms >= idle_timeout * 1000:
+                break
+            continue
+        idle_ms = 0
+        frames = sub_socket.recv_multipart(copy=False)
+        if len(frames) == 1 and frames[0].bytes == _END:
+            break
+        last = time.perf_counter()
+        received += len(frames)
+        nbytes += sum(len(frame) for frame in frames)
+    stats.update(received=received, bytes=nbytes, last=last)
+
+def benchmark_zeromq_pub_sub(pub_port=None, sizes=(64, 1024, 16384, 131072), count=5000, hwm=100000, batch=1,
+                             temp_socket=None, zero_copy_threshold=ZERO_COPY_THRESHOLD, timeout=10.0,
+                             on_ready=None, context=None, counts=None):
+    """Measure PUB/SUB throughput over localhost TCP for each message count and payload size.
+
+    Sends each of ``counts`` (default: just ``count``) payloads per size,
+    ``batch`` payloads per multipart message, with send/receive high-water
+    marks of ``hwm``. Payloads of at least ``zero_copy_threshold`` bytes go out as zero-copy frames
+    (``copy=False``). PUB sockets drop rather than block at the HWM, so
+    ``Lost`` reports what the subscriber never saw. ``pub_port=None`` binds
+    a random free port. Sending starts once the XPUB publisher has seen the
+    subscription; ``on_ready(port)`` is called at that point. Runs on the
+    shared context unless given ``context``. Returns one result dict per
+    count and size, counts outermost. A round that overruns ``timeout``
+    raises RuntimeError once its receiver thread has stopped.
+    """
+    counts = list(counts or (count,))
+    if min(counts) < 1 or batch < 1 or hwm < 0:
+        raise ValueError("Count and batch must be positive and HWM non-negative")
+    context = context or shared_context()
+    pub_socket = context.socket(zmq.XPUB)
+    sub_socket = context.socket(zmq.SUB)
+    results = []
+    stop = threading.Event()
+    receiver = None
+    try:
+        for zsocket in (pub_socket, sub_socket):
+            zsocket.setsockopt(zmq.LINGER, 0)
+        pub_socket.setsockopt(zmq.SNDHWM, hwm)
+        sub_socket.setsockopt(zmq.RCVHWM, hwm)
+        if pub_port is None:
+            pub_port = pub_socket.bind_to_random_port("tcp://127.0.0.1")
+        else:
+            bind_with_retry(pub_socket, pub_port, temp_socket, host='127.0.0.1')
+        sub_socket.setsockopt(zmq.SUBSCRIBE, b"")
+        sub_socket.connect(f"tcp://127.0.0.1:{pub_port}")
+        wait_for_subscriber(pub_socket, time.monotonic() + timeout)
+        if on_ready:
+            on_ready(pub_port)
+
+        for count, size in itertools.product(counts, sizes):
+            zero_copy = size >= zero_copy_threshold
+            payload = b"\x01" * size
+            message = [payload] * batch
+            full, rest = divmod(count, batch)
+            stats = {}
+            receiver = threading.Thread(target=_receive_round, args=(sub_socket, 1.0, stats, stop),
+                                        name="portmaster-zmq-receiver", daemon=True)
+            receiver.start()
+            start = time.perf_counter()
+            for _ in range(full):
+                pub_socket.send_multipart(message, copy=not zero_copy)
+            if rest:
+                pub_socket.send_multipart(message[:rest], copy=not zero_copy)
+            sent_at = time.perf_counter()
+            pub_socket.send(_END)
+            receiver.join(timeout)
+            if receiver.is_alive():
+                raise RuntimeError(f"Receiver for {size}-byte messages did not finish within {timeout}s")
+            elapsed = max((stats['last'] or sent_at) - start, 1e-9)
+            result = {
+                "Port": pub_port, "Size": size, "Batch": batch, "HWM": hwm, "Zero Copy": zero_copy,
+                "Sent": count, "Received": stats['received'], "Lost": count - stats['received'],
+                "Seconds": round(elapsed, 4),
+                "Msgs/s": round(stats['received'] / elapsed, 1),
+                "MB/s": round(stats['bytes'] / elapsed / 1e6, 2),
+            }
+            log_message(f"ZeroMQ benchmark port {pub_port}: {size} B x {count}: {result['Msgs/s']} msg/s, "
+                        f"{result['MB/s']} MB/s, lost {result['Lost']}")
+            results.append(result)
+    finally:
+        if receiver is not None and receiver.is_alive():
+            # ZeroMQ sockets are not thread-safe: the receiver must be off sub_socket before it closes
+            stop.set()
+            receiver.join()
+        pub_socket.close()
+        sub_socket.close()
+    return results
+
+def format_benchmark(results):
+    """Render benchmark_zeromq_pub_sub results as a table"""
+    lines = [f"{'Count':>9}{'Size':>9}{'Batch':>7}{'Zero copy':>11}{'Lost':>8}{'Msgs/s':>13}{'MB/s':>10}"]
+    for r in results:
+        lines.append(f"{r['Sent']:>9}{r['Size']:>9}{r['Batch']:>7}{'yes' if r['Zero Copy'] else 'no':>11}"
+                     f"{r['Lost']:>8}{r['Msgs/s']:>13.1f}{r['MB/s']:>10.2f}")
+    return "\n".join(lines)
+
+def format_simulations(results):
+    """Render simulate_many results as a table"""
+    lines = [f"{'Port':>7}{'Ready ms':>11}{'Total ms':>11}  Status"]
+    for r in results:
+        if "Error" in r:
+            lines.append(f"{r['Port']:>7}{'-':>11}{'-':>11}  {r['Error']}")
+        else:
+            lines.append(f"{r['Port']:>7}{r['Ready ms']:>11.1f}{r['Total ms']:>11.1f}  ok")
+    return "\n".join(lines)